@@ -1,12 +1,12 @@
 import os
-import fitz  # PyMuPDF
 import pandas as pd
+from collections import Counter
 from datetime import datetime
+from manifesto import triar_corpus, legivel
+from configuracao import DIRETORIO_RAIZ
 
 # --- CONFIGURAÇÕES ---
-# Coloque aqui a pasta "Mãe". O script vai olhar tudo que tem dentro dela.
-DIRETORIO_RAIZ = os.getenv("DIRETORIO_RAIZ")  
-
+# A pasta "Mãe" (DIRETORIO_RAIZ no .env, lida em configuracao.py). O script vai olhar tudo que tem dentro dela.
 CUSTO_MEDIO_POR_IMAGEM_USD = 0.0645       # Estimativa Claude 3.5 Sonnet
 TAXA_DOLAR = 6.00                         # Cotação
 
@@ -20,6 +20,7 @@ def calcular_custo_recursivo():
     total_docs = 0
     total_paginas_reais = 0
     total_fotos_ia = 0
+    ilegiveis = Counter()
     
     relatorio = []
 
@@ -27,54 +28,58 @@ def calcular_custo_recursivo():
     print(f"{'ARQUIVO (Nome)':<50} | {'PÁGS':<6} | {'FOTOS':<6} | {'CUSTO (R$)':<10}")
     print("-" * 85)
 
-    # --- O SEGREDO ESTÁ AQUI: os.walk ---
-    # Ele navega por todas as pastas, subpastas e arquivos a partir da raiz
-    for root, dirs, files in os.walk(DIRETORIO_RAIZ):
-        for arquivo in files:
-            if arquivo.lower().endswith('.pdf'):
-                
-                # Monta o caminho completo (Ex: C:\pasta\subpasta\arquivo.pdf)
-                caminho_completo = os.path.join(root, arquivo)
-                
-                try:
-                    doc = fitz.open(caminho_completo)
-                    num_paginas = len(doc)
-                    
-                    # --- LÓGICA DE ECONOMIA ---
-                    # > 6 págs = 5 fotos (2 início + 3 fim)
-                    # <= 6 págs = todas as fotos
-                    if num_paginas > 6:
-                        fotos_necessarias = 5
-                    else:
-                        fotos_necessarias = num_paginas
-                    
-                    custo_usd = fotos_necessarias * CUSTO_MEDIO_POR_IMAGEM_USD
-                    custo_brl = custo_usd * TAXA_DOLAR
-                    
-                    # Adiciona aos totais
-                    total_docs += 1
-                    total_paginas_reais += num_paginas
-                    total_fotos_ia += fotos_necessarias
-                    
-                    # Exibe no console (trunca nome se for muito longo para não quebrar a tabela)
-                    nome_exibicao = arquivo[:45] + "..." if len(arquivo) > 45 else arquivo
-                    print(f"{nome_exibicao:<50} | {num_paginas:<6} | {fotos_necessarias:<6} | R$ {custo_brl:.2f}")
-                    
-                    # Salva dados completos para o Excel (incluindo o caminho da subpasta)
-                    relatorio.append({
-                        "Caminho_Completo": caminho_completo,
-                        "Pasta_Origem": root,
-                        "Nome_Arquivo": arquivo,
-                        "Paginas_Reais": num_paginas,
-                        "Fotos_IA_Processadas": fotos_necessarias,
-                        "Custo_Est_USD": round(custo_usd, 4),
-                        "Custo_Est_BRL": round(custo_brl, 2)
-                    })
-                    
-                    doc.close()
-                    
-                except Exception as e:
-                    print(f"❌ Erro ao ler {arquivo}: {e}")
+    # --- O SEGREDO ESTÁ AQUI: mesma descoberta recursiva dos extratores ---
+    # Navega por todas as pastas e subpastas, com os mesmos filtros de inclusão/exclusão,
+    # para que o orçamento cubra exatamente os arquivos que serão processados.
+    # Páginas vêm do manifesto do corpus: a triagem abre cada PDF uma vez e os extratores reaproveitam.
+    for entrada in triar_corpus(DIRETORIO_RAIZ):
+        caminho_completo = entrada["caminho"]
+        root = os.path.dirname(caminho_completo)
+        arquivo = entrada["arquivo"]
+
+        # Criptografados/corrompidos não entram no orçamento (nem na extração)
+        if not legivel(entrada):
+            ilegiveis[entrada["status"]] += 1
+            print(f"❌ {arquivo}: {entrada['status']} ({entrada['erro']})")
+            continue
+        
+        try:
+            num_paginas = entrada["paginas"]
+            
+            # --- LÓGICA DE ECONOMIA ---
+            # > 6 págs = 5 fotos (2 início + 3 fim)
+            # <= 6 págs = todas as fotos
+            if num_paginas > 6:
+                fotos_necessarias = 5
+            else:
+                fotos_necessarias = num_paginas
+            
+            custo_usd = fotos_necessarias * CUSTO_MEDIO_POR_IMAGEM_USD
+            custo_brl = custo_usd * TAXA_DOLAR
+            
+            # Adiciona aos totais
+            total_docs += 1
+            total_paginas_reais += num_paginas
+            total_fotos_ia += fotos_necessarias
+            
+            # Exibe no console (trunca nome se for muito longo para não quebrar a tabela)
+            nome_exibicao = arquivo[:45] + "..." if len(arquivo) > 45 else arquivo
+            print(f"{nome_exibicao:<50} | {num_paginas:<6} | {fotos_necessarias:<6} | R$ {custo_brl:.2f}")
+            
+            # Salva dados completos para o Excel (incluindo o caminho da subpasta)
+            relatorio.append({
+                "Caminho_Completo": caminho_completo,
+                "Pasta_Origem": root,
+                "Nome_Arquivo": arquivo,
+                "Paginas_Reais": num_paginas,
+                "Camada_Texto": entrada["tipo"],
+                "Fotos_IA_Processadas": fotos_necessarias,
+                "Custo_Est_USD": round(custo_usd, 4),
+                "Custo_Est_BRL": round(custo_brl, 2)
+            })
+            
+        except Exception as e:
+            print(f"❌ Erro ao ler {arquivo}: {e}")
 
     # --- TOTAIS FINAIS ---
     if total_docs == 0:
@@ -90,6 +95,8 @@ def calcular_custo_recursivo():
     print(f"   📑 Total de Documentos:      {total_docs}")
     print(f"   📄 Páginas Totais (PDFs):    {total_paginas_reais}")
     print(f"   📸 Fotos enviadas p/ IA:     {total_fotos_ia} (Economia de {total_paginas_reais - total_fotos_ia} págs)")
+    if ilegiveis:
+        print(f"   🚫 Fora da extração:         {sum(ilegiveis.values())} ({', '.join(f'{k}: {v}' for k, v in sorted(ilegiveis.items()))})")
     print("   -------------------------------------------------")
     print(f"   💵 Custo Total (USD):        US$ {custo_total_usd:.2f}")
     print(f"   🇧🇷 Custo Total (BRL):        R$  {custo_total_brl:.2f}")
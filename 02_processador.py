@@ -1,24 +1,24 @@
 import os
 import json
-import re
-import time
+import sqlite3
 import pandas as pd
+from collections import Counter
 from datetime import datetime
-from openai import OpenAI
-from dotenv import load_dotenv
-
-load_dotenv()
+from configuracao import DIR_ENTRADA_LAKE, PASTA_SAIDA_FINAL, cliente_openrouter, garantir_pasta
+from resiliencia import executar_com_retry, ErroRecuperavel
+from esquema_contrato import extrair_json, validar_lote
+from normalizacao import normalizar_lote
+from pre_classificador import campos_confiaveis
+from assinatura_pdf import campos_da_assinatura
+from relatorio_streaming import EscritorRelatorioStreaming
+import dataset_resultados
+from consulta_contratos import obter_base
 
 # --- CONFIGURAÇÕES ---
-PASTA_ENTRADA = os.getenv("DIR_ENTRADA")
-PASTA_SAIDA_FINAL = os.getenv("PASTA_SAIDA_FINAL")
-
-# Configuração API (Usando OpenRouter para acessar Gemini)
-CLIENTE_API = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    default_headers={"HTTP-Referer": "https://merca.com.br", "X-Title": "Auditor Gemini Flash"}
-)
+PASTA_ENTRADA = DIR_ENTRADA_LAKE
+
+# Configuração API (Usando OpenRouter para acessar Gemini) - cliente criado na primeira chamada
+TITULO_API = "Auditor Gemini Flash"
 # Modelo Rápido e Inteligente
 MODELO_RACINIO = "xiaomi/mimo-v2-flash:free" # Ou "google/gemini-2.0-flash-001" dependendo da disp.
 
@@ -26,15 +26,12 @@ MODELO_RACINIO = "xiaomi/mimo-v2-flash:free" # Ou "google/gemini-2.0-flash-001"
 DATA_LEI = datetime(2025, 1, 16)
 INICIO_VIGENCIA_CBS = datetime(2027, 1, 1)
 
-def limpar_json_cirurgico(texto_cru):
-    if not texto_cru: return {}
-    texto_limpo = texto_cru.replace("```json", "").replace("```", "")
-    match = re.search(r'\{.*\}', texto_limpo, re.DOTALL)
-    if match:
-        try: return json.loads(match.group(0))
-        except: pass
-    try: return json.loads(texto_limpo)
-    except: return {}
+def limpar_json_cirurgico(texto_cru, origem=""):
+    dados, motivo = extrair_json(texto_cru)
+    if dados is None:
+        print(f" Resposta sem JSON aproveitável em {origem}: {motivo}")
+        return {}
+    return dados
 
 def normalizar_data(data_str):
     if not data_str: return None
@@ -229,112 +226,179 @@ return only json below
 
 }"""
 
-    for tentativa in range(3):
+    def chamar(timeout):
+        response = cliente_openrouter(TITULO_API).chat.completions.create(
+            model=MODELO_RACINIO,
+            messages=[
+                {"role": "system", "content": prompt_system},
+                {"role": "user", "content": f"Analise estes dados: {resumo_dados}"}
+            ],
+            temperature=0.0,
+            response_format={"type": "json_object"},
+            timeout=timeout
+        )
+        raw = response.choices[0].message.content
         try:
-            response = CLIENTE_API.chat.completions.create(
-                model=MODELO_RACINIO,
-                messages=[
-                    {"role": "system", "content": prompt_system},
-                    {"role": "user", "content": f"Analise estes dados: {resumo_dados}"}
-                ],
-                temperature=0.0,
-                response_format={"type": "json_object"}
-            )
-            raw = response.choices[0].message.content
             return json.loads(raw)
-        except Exception as e:
-            time.sleep(1)
-            
-    # Fallback se a IA falhar (usa lógica simples Python)
-    return {"acao_recomendada": "MANUAL", "motivo_estrategico": "Erro na análise IA"}
-
-def processar_inteligente():
-    if not os.path.exists(PASTA_ENTRADA):
-        print("Pasta de dados brutos não encontrada.")
-        return
+        except (TypeError, ValueError) as e:
+            # Resposta malformada do modelo: nova tentativa pode resolver
+            raise ErroRecuperavel(f"JSON inválido do modelo: {e}")
 
-    arquivos_json = [f for f in os.listdir(PASTA_ENTRADA) if f.endswith('_RAW.json')]
-    print(f" Iniciando Auditoria Inteligente com Gemini 2.0 Flash em {len(arquivos_json)} arquivos...")
-    
-    resultados_finais = []
-    
-    for i, arq in enumerate(arquivos_json):
+    try:
+        return executar_com_retry(chamar, provedor="openrouter", descricao="estrategia")
+    except Exception:
+        # Fallback se a IA falhar (usa lógica simples Python)
+        return {"acao_recomendada": "MANUAL", "motivo_estrategico": "Erro na análise IA"}
+
+# Colunas do relatório final (ordem das colunas no Excel)
+COLUNAS_RELATORIO = [
+    "ARQUIVO", "ACAO_RECOMENDADA", "MOTIVO_GEMINI", "STATUS_VISUAL", "EVIDENCIA",
+    "INICIO_VIGENCIA", "FIM_VIGENCIA", "DATA_PROVA", "LOCATARIO",
+    "CUSTO_REGISTRO", "VALOR_ALUGUEL", "MEMORIA_CALCULO", "CAMPOS_INVALIDOS",
+]
+# Quantos _RAW.json são lidos/normalizados por vez (limita a memória do processo)
+TAMANHO_LOTE = int(os.getenv("TAMANHO_LOTE_PROCESSADOR", "5000"))
+
+def _data_ou_none(valor):
+    return None if pd.isna(valor) else valor
+
+def ler_pacotes(arquivos_json):
+    """Lê os pacotes do Data Lake (nomes em PASTA_ENTRADA ou caminhos completos)."""
+    lidos = []
+    for arq in arquivos_json:
         caminho = os.path.join(PASTA_ENTRADA, arq)
         try:
-            print(f"[{i+1}/{len(arquivos_json)}] Analisando: {arq}...")
-            
             with open(caminho, 'r', encoding='utf-8') as f:
                 pacote = json.load(f)
+        except Exception as e:
+            print(f" Erro ao ler {arq}: {e}")
+            continue
+
+        dados = limpar_json_cirurgico(pacote.get("resposta_ia_raw", ""), arq)
+        if dados:
+            # Campos re-extraídos pelo extrator substituem os inválidos da resposta original
+            dados.update(pacote.get("campos_corrigidos") or {})
+            # Status/data de alta confiança do pré-classificador local prevalecem
+            dados.update(campos_confiaveis(pacote.get("pre_classificacao")))
+            # Assinatura digital embutida no PDF é leitura exata: prevalece sobre tudo
+            dados.update(campos_da_assinatura(pacote.get("assinaturas_pdf")))
+            lidos.append((arq, pacote, dados))
+    return lidos
+
+def analisar_lote(lidos, contagem_erros):
+    """Valida, normaliza em bloco e decide a estratégia de cada contrato do lote."""
+    if not lidos:
+        return
+
+    # Validação em lote contra o esquema do registro
+    limpos, erros_por_registro, contagem = validar_lote([dados for _, _, dados in lidos])
+    contagem_erros.update(contagem)
+
+    # Normalização colunar (datas e valores do lote inteiro de uma vez)
+    df_norm = normalizar_lote(pd.DataFrame(limpos))
+    valores_aluguel = df_norm["valor_aluguel_mensal_float"].tolist()
+    custos_registro = df_norm["custo_registro_cartorio_float"].tolist()
+    datas_ini = list(df_norm["data_inicio_contrato_dt"].dt.to_pydatetime())
+    datas_fim = list(df_norm["data_fim_contrato_dt"].dt.to_pydatetime())
+    datas_prova = list(df_norm["data_evidencia_dt"].dt.to_pydatetime())
+
+    for i, ((arq, pacote, _), dados, erros) in enumerate(zip(lidos, limpos, erros_por_registro)):
+        try:
+            print(f" Analisando: {arq}...")
             
-            # 1. Limpeza e Tratamento Numérico (Python)
-            texto_ia = pacote.get("resposta_ia_raw", "")
-            dados = limpar_json_cirurgico(texto_ia)
+            # Dados já normalizados antes de enviar pro Gemini
+            dados["valor_aluguel_mensal_float"] = valores_aluguel[i]
+            dados["custo_registro_cartorio_float"] = custos_registro[i]
             
-            if dados:
-                # Normaliza dados antes de enviar pro Gemini
-                dados["valor_aluguel_mensal_float"] = sanitizar_valor_monetario(dados.get("valor_aluguel_mensal_float"))
-                dados["custo_registro_cartorio_float"] = sanitizar_valor_monetario(dados.get("custo_registro_cartorio_float"))
+            # O Gemini 2.0 Flash decide a estratégia
+            decisao_ia = consultar_gemini_estrategia(dados)
+            
+            yield {
+                "ARQUIVO": pacote.get("arquivo_origem"),
+                
+                # Inteligência Gemini
+                "ACAO_RECOMENDADA": decisao_ia.get("acao_recomendada", "ERRO").upper(),
+                "MOTIVO_GEMINI": decisao_ia.get("motivo_estrategico"),
                 
-                # 2. O Gemini 2.0 Flash decide a estratégia
-                decisao_ia = consultar_gemini_estrategia(dados)
+                # Dados Base (datas nulas não derrubam mais o registro)
+                "STATUS_VISUAL": dados.get("status"),
+                "EVIDENCIA": dados.get("descricao_prova"),
+                "INICIO_VIGENCIA": _data_ou_none(datas_ini[i]),
+                "FIM_VIGENCIA": _data_ou_none(datas_fim[i]),
+                "DATA_PROVA": _data_ou_none(datas_prova[i]),
+                "LOCATARIO": dados.get("locatario"),
                 
-                # Datas para Excel
-                dt_ini = normalizar_data(dados.get("data_inicio_contrato"))
-                dt_fim = normalizar_data(dados.get("data_fim_contrato"))
-                dt_evid = normalizar_data(dados.get("data_evidencia"))
-
-                registro = {
-                    "ARQUIVO": pacote.get("arquivo_origem"),
-                    
-                    # Inteligência Gemini
-                    "ACAO_RECOMENDADA": decisao_ia.get("acao_recomendada", "ERRO").upper(),
-                    "MOTIVO_GEMINI": decisao_ia.get("motivo_estrategico"),
-                    
-                    # Dados Base
-                    "STATUS_VISUAL": dados.get("status"),
-                    "EVIDENCIA": dados.get("descricao_prova"),
-                    "INICIO_VIGENCIA": dt_ini, 
-                    "FIM_VIGENCIA": dt_fim.strftime("%d/%m/%Y"),
-                    "DATA_PROVA": dt_evid.strftime("%d/%m/%Y"),
-                    "LOCATARIO": dados.get("locatario"),
-                    
-                    # Financeiro
-                    "CUSTO_REGISTRO": dados.get("custo_registro_cartorio_float"),
-                    "VALOR_ALUGUEL": dados.get("valor_aluguel_mensal_float"),
-                    "MEMORIA_CALCULO": dados.get("memoria_calculo")
-                }
-                resultados_finais.append(registro)
+                # Financeiro
+                "CUSTO_REGISTRO": dados.get("custo_registro_cartorio_float"),
+                "VALOR_ALUGUEL": dados.get("valor_aluguel_mensal_float"),
+                "MEMORIA_CALCULO": dados.get("memoria_calculo"),
+
+                # Qualidade da extração
+                "CAMPOS_INVALIDOS": ", ".join(erros) or None,
+
+                # Fora das colunas do Excel (dataset Parquet / base de consulta)
+                "PASTA_ORIGEM": pacote.get("pasta_origem"),
+                "LOCADOR": dados.get("locador")
+            }
                 
         except Exception as e:
             print(f" Erro em {arq}: {e}")
 
-    # GERA O EXCEL
-    if resultados_finais:
-        os.makedirs(PASTA_SAIDA_FINAL, exist_ok=True)
-        df = pd.DataFrame(resultados_finais)
-        
-        # Ordenação
-        df.sort_values(by="CUSTO_REGISTRO", ascending=False, inplace=True)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-        caminho_excel = os.path.join(PASTA_SAIDA_FINAL, f"Relatorio_{timestamp}.xlsx")
-        
-        writer = pd.ExcelWriter(caminho_excel, engine='xlsxwriter')
-        df.to_excel(writer, index=False, sheet_name='Auditoria')
-        workbook = writer.book
-        worksheet = writer.sheets['Auditoria']
-        
-        money_fmt = workbook.add_format({'num_format': 'R$ #,##0.00'})
-        date_fmt = workbook.add_format({'num_format': 'dd/mm/yyyy'})
-        
-        worksheet.set_column('E:G', 12, date_fmt)  # Datas
-        worksheet.set_column('H:I', 18, money_fmt) # Financeiro
-        worksheet.set_column('A:A', 40)
-        worksheet.set_column('B:B', 30) # Acao
-        worksheet.set_column('C:C', 50) # Motivo Gemini
-        
-        writer.close()
+def atualizar_consulta(registros, run_id):
+    """Upsert na base do serviço de consulta (cli.py serve); falha aqui não derruba o relatório."""
+    try:
+        obter_base().atualizar(registros, run_id)
+    except sqlite3.Error as e:
+        print(f" Base de consulta não atualizada: {e}")
+
+def processar_inteligente():
+    if not os.path.exists(PASTA_ENTRADA):
+        print("Pasta de dados brutos não encontrada.")
+        return
+
+    arquivos_json = [f for f in os.listdir(PASTA_ENTRADA) if f.endswith('_RAW.json')]
+    print(f" Iniciando Auditoria Inteligente com Gemini 2.0 Flash em {len(arquivos_json)} arquivos...")
+
+    garantir_pasta(PASTA_SAIDA_FINAL)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M")
+    caminho_excel = os.path.join(PASTA_SAIDA_FINAL, f"Relatorio_{timestamp}.xlsx")
+    contagem_erros = Counter()
+    run_id = dataset_resultados.novo_run_id()
+
+    # Linhas vão direto para o disco (memória constante); a ordenação por
+    # CUSTO_REGISTRO é feita por intercalação externa no fechamento.
+    with EscritorRelatorioStreaming(caminho_excel, COLUNAS_RELATORIO, chave="CUSTO_REGISTRO", run_id=run_id) as escritor:
+        for inicio in range(0, len(arquivos_json), TAMANHO_LOTE):
+            lote = arquivos_json[inicio:inicio + TAMANHO_LOTE]
+            print(f" Lote {inicio // TAMANHO_LOTE + 1}: arquivos {inicio + 1}-{inicio + len(lote)}")
+            registros_lote = []
+            for registro in analisar_lote(ler_pacotes(lote), contagem_erros):
+                escritor.adicionar(registro)
+                registros_lote.append(registro)
+            # Mesmo lote vai para o dataset Parquet (consultas de portfólio sem abrir Excel)
+            dataset_resultados.gravar_lote(registros_lote, run_id)
+            atualizar_consulta(registros_lote, run_id)
+
+    if contagem_erros:
+        resumo = ", ".join(f"{campo}={qtd}" for campo, qtd in contagem_erros.most_common())
+        print(f" Campos inválidos: {resumo}")
+
+    if escritor.total_linhas:
         print(f"\n Relatório Gemini Flash gerado: {caminho_excel}")
+        print(f" Dataset de resultados atualizado: {dataset_resultados.DIR_DATASET} (execução {run_id})")
+
+def processar_incremental(caminhos_raw):
+    """
+    Atualização incremental (modo vigia): decide só os RAW informados e acrescenta
+    ao dataset da execução mais recente, sem reprocessar o lake inteiro.
+    """
+    run_id = dataset_resultados.ultimo_run_id() or dataset_resultados.novo_run_id()
+    registros = list(analisar_lote(ler_pacotes(caminhos_raw), Counter()))
+    dataset_resultados.gravar_lote(registros, run_id)
+    atualizar_consulta(registros, run_id)
+    for registro in registros:
+        print(f"   -> {registro['ARQUIVO']}: {registro['ACAO_RECOMENDADA']}")
+    return registros
 
 if __name__ == "__main__":
-    processar_inteligente()
\ No newline at end of file
+    processar_inteligente()
@@ -0,0 +1,177 @@
+import re
+from datetime import datetime, timedelta, timezone
+
+import fitz  # PyMuPDF
+
+# --- INSPEÇÃO DE ASSINATURAS DIGITAIS EMBUTIDAS (PAdES / PKCS#7) ---
+# Lê os dicionários de assinatura do próprio PDF: horário (/M), assinante (CN do certificado)
+# e se a cadeia é ICP-Brasil. Não valida criptograficamente: apenas lê o que está gravado.
+DIGITAL = "DIGITAL (GOV/ICP)"
+
+_OID_CN = bytes.fromhex("0603550403")                         # 2.5.4.3 commonName
+_OID_ORG = bytes.fromhex("060355040a")                        # 2.5.4.10 organizationName
+_OID_SIGNING_TIME = bytes.fromhex("06092a864886f70d010905")   # 1.2.840.113549.1.9.5
+_OID_ICP_BRASIL = bytes.fromhex("604c01")                     # arco 2.16.76.1 (políticas ICP-Brasil)
+_TIPOS_STRING = {0x0C: "utf-8", 0x13: "latin-1", 0x14: "latin-1", 0x16: "latin-1", 0x1E: "utf-16-be"}
+_RE_DATA_PDF = re.compile(r"D:(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?([Zz+-])?(\d{2})?'?(\d{2})?")
+_RE_AC = re.compile(r"^(AC |Autoridade Certificadora)|\bCA\b|Root|Raiz", re.IGNORECASE)
+
+
+def _ler_tamanho(der, pos):
+    """Comprimento DER a partir de pos. Retorna (tamanho, posição do conteúdo)."""
+    primeiro = der[pos]
+    if primeiro < 0x80:
+        return primeiro, pos + 1
+    n = primeiro & 0x7F
+    return int.from_bytes(der[pos + 1:pos + 1 + n], "big"), pos + 1 + n
+
+
+def _strings_apos_oid(der, oid):
+    """Valores string que seguem cada ocorrência do OID (varredura mínima, sem parser ASN.1 completo)."""
+    valores = []
+    pos = der.find(oid)
+    while pos != -1:
+        inicio = pos + len(oid)
+        if inicio + 2 <= len(der) and der[inicio] in _TIPOS_STRING:
+            tamanho, conteudo = _ler_tamanho(der, inicio + 1)
+            try:
+                valores.append(der[conteudo:conteudo + tamanho].decode(_TIPOS_STRING[der[inicio]]))
+            except UnicodeDecodeError:
+                pass
+        pos = der.find(oid, pos + 1)
+    return valores
+
+
+def _signing_time_cms(der):
+    """Atributo signingTime do CMS (usado quando o dicionário não tem /M)."""
+    pos = der.find(_OID_SIGNING_TIME)
+    if pos == -1:
+        return None
+    # SET { UTCTime | GeneralizedTime }
+    pos += len(_OID_SIGNING_TIME)
+    try:
+        if der[pos] != 0x31:
+            return None
+        _, pos = _ler_tamanho(der, pos + 1)
+        tag = der[pos]
+        tamanho, conteudo = _ler_tamanho(der, pos + 1)
+        texto = der[conteudo:conteudo + tamanho].decode("ascii", "ignore").rstrip("Z")
+        if tag == 0x17:
+            return datetime.strptime(texto[:12], "%y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+        if tag == 0x18:
+            return datetime.strptime(texto[:14], "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+    except (ValueError, IndexError):
+        return None
+    return None
+
+
+def data_pdf(valor):
+    """Converte uma data PDF (D:AAAAMMDDHHmmSS-03'00') em datetime com fuso."""
+    match = _RE_DATA_PDF.search(valor or "")
+    if not match:
+        return None
+    partes = [int(p) if p else padrao for p, padrao in zip(match.groups()[:6], (0, 1, 1, 0, 0, 0))]
+    fuso = None
+    if match.group(7) in ("+", "-"):
+        deslocamento = timedelta(hours=int(match.group(8) or 0), minutes=int(match.group(9) or 0))
+        fuso = timezone(deslocamento if match.group(7) == "+" else -deslocamento)
+    elif match.group(7) in ("Z", "z"):
+        fuso = timezone.utc
+    try:
+        return datetime(*partes, tzinfo=fuso)
+    except ValueError:
+        return None
+
+
+def _valor_chave(doc, xref, chave):
+    tipo, valor = doc.xref_get_key(xref, chave)
+    if tipo == "null":
+        return None
+    if tipo == "string":
+        return valor
+    return valor.strip("()/")
+
+
+def _conteudo_der(doc, xref):
+    """/Contents do dicionário de assinatura (hex) como bytes DER."""
+    objeto = doc.xref_object(xref, compressed=True)
+    match = re.search(r"/Contents\s*<([0-9A-Fa-f\s]+)>", objeto)
+    if not match:
+        return b""
+    try:
+        return bytes.fromhex(re.sub(r"\s", "", match.group(1)))
+    except ValueError:
+        return b""
+
+
+def _ler_assinatura(doc, xref_sig, campo):
+    der = _conteudo_der(doc, xref_sig)
+    nomes = _strings_apos_oid(der, _OID_CN)
+    signatarios = [n for n in nomes if not _RE_AC.search(n)]
+    organizacoes = _strings_apos_oid(der, _OID_ORG)
+    horario = data_pdf(_valor_chave(doc, xref_sig, "M")) or _signing_time_cms(der)
+    return {
+        "campo": campo,
+        "assinante": signatarios[0] if signatarios else (_valor_chave(doc, xref_sig, "Name") or (nomes[0] if nomes else None)),
+        "data": horario.isoformat() if horario else None,
+        "subfilter": _valor_chave(doc, xref_sig, "SubFilter"),
+        "motivo": _valor_chave(doc, xref_sig, "Reason"),
+        "icp_brasil": _OID_ICP_BRASIL in der or any("ICP-Brasil" in o for o in organizacoes),
+    }
+
+
+def _resultado_vazio():
+    return {"assinaturas": [], "campos_vazios": 0, "status": None, "data_evidencia": None, "descricao_prova": None}
+
+
+def inspecionar_documento(doc):
+    """Mesma inspeção sobre um documento já aberto (ex: triagem do manifesto, que abre cada PDF uma vez)."""
+    resultado = _resultado_vazio()
+    vistos = set()
+    for pagina in doc:
+        for widget in pagina.widgets() or []:
+            if widget.field_type != fitz.PDF_WIDGET_TYPE_SIGNATURE:
+                continue
+            tipo, valor = doc.xref_get_key(widget.xref, "V")
+            if tipo != "xref":
+                resultado["campos_vazios"] += 1
+                continue
+            xref_sig = int(valor.split()[0])
+            vistos.add(xref_sig)
+            resultado["assinaturas"].append(_ler_assinatura(doc, xref_sig, widget.field_name))
+
+    # Dicionários de assinatura fora dos widgets (campos ocultos, formulários malformados)
+    for xref in range(1, doc.xref_length()):
+        if xref in vistos:
+            continue
+        try:
+            if doc.xref_get_key(xref, "ByteRange")[0] == "null":
+                continue
+        except Exception:
+            continue  # entrada livre ou corrompida na tabela xref
+        resultado["assinaturas"].append(_ler_assinatura(doc, xref, None))
+
+    if not resultado["assinaturas"]:
+        return resultado
+
+    resultado["status"] = DIGITAL
+    datas = [datetime.fromisoformat(a["data"]) for a in resultado["assinaturas"] if a["data"]]
+    if datas:
+        # Vale a última assinatura (data em que o contrato ficou completo), no fuso local do documento
+        resultado["data_evidencia"] = max(datas, key=lambda d: d.timestamp()).strftime("%d/%m/%Y")
+    resultado["descricao_prova"] = "; ".join(
+        f"Assinatura digital{' ICP-Brasil' if a['icp_brasil'] else ''} de {a['assinante'] or 'assinante desconhecido'}"
+        f"{' em ' + a['data'] if a['data'] else ''}"
+        for a in resultado["assinaturas"]
+    )
+    return resultado
+
+
+def campos_da_assinatura(inspecao):
+    """Campos (no formato do RAW) resolvidos pelas assinaturas embutidas."""
+    if not inspecao or not inspecao.get("status"):
+        return {}
+    campos = {"status": inspecao["status"], "descricao_prova": inspecao["descricao_prova"]}
+    if inspecao.get("data_evidencia"):
+        campos["data_evidencia"] = inspecao["data_evidencia"]
+    return campos
@@ -0,0 +1,338 @@
+import os
+import json
+import time
+import math
+import logging
+import importlib
+from datetime import datetime
+
+import pandas as pd
+
+from configuracao import garantir_pasta, configurar_logging
+from esquema_contrato import extrair_json, validar_lote
+from normalizacao import normalizar_lote
+from resiliencia import Prazo
+
+# --- BENCHMARK DE BACKENDS (acerto x latência x custo) ---
+# Roda cada backend sobre um conjunto rotulado de contratos (gabarito) e compara campo a campo.
+# As respostas ficam gravadas por hash do arquivo: rodar de novo (ou offline) reaproveita a
+# gravação, então trocar a regra de pontuação ou o gabarito não paga nenhuma chamada.
+#
+# DIR_BENCHMARK/
+#   gabarito.jsonl              uma linha por contrato: {"arquivo": "contratos/x.pdf", "status": ..., ...}
+#   gravacoes/<backend>/<sha256>.json
+#   resultados/benchmark_<data>.json
+DIR_BENCHMARK = os.getenv("DIR_BENCHMARK", os.path.join("outputs", "benchmark"))
+LLAMAPARSE_USD_POR_PAGINA = float(os.getenv("LLAMAPARSE_USD_POR_PAGINA", "0.003"))
+TOLERANCIA_DINHEIRO = 0.01   # 1%: "R$ 2.500,00" x 2500.0 x 2499.99 contam como acerto
+
+# Preço de tabela (US$ por milhão de tokens: entrada, saída). Modelos :free custam zero.
+PRECOS_USD_POR_MILHAO = {
+    "anthropic/claude-3.5-sonnet": (3.00, 15.00),
+    "nvidia/nemotron-nano-12b-v2-vl:free": (0.0, 0.0),
+    "xiaomi/mimo-v2-flash:free": (0.0, 0.0),
+    "gemini-2.5-flash-preview-09-2025": (0.30, 2.50),
+}
+
+CAMPOS_PONTUADOS = [
+    "status", "data_evidencia", "data_inicio_contrato", "data_fim_contrato",
+    "valor_aluguel_mensal_float", "custo_registro_cartorio_float", "acao_recomendada",
+]
+
+# Mesma árvore de decisão do prompt do 02_processador (pilares Constitucional, Imposto_2027, Integridade)
+DATA_LEI = datetime(2025, 1, 16)
+INICIO_VIGENCIA_CBS = datetime(2027, 1, 1)
+STATUS_COM_FE_PUBLICA = {"DIGITAL (GOV/ICP)", "FÍSICA (COM FIRMA)"}
+
+
+# --- BACKENDS ---
+# Cada um recebe o caminho do contrato e devolve (resposta crua, métricas da chamada).
+
+def _visao_openrouter(nome_modulo, mosaico=False):
+    def rodar(caminho):
+        modulo = importlib.import_module(nome_modulo)
+        metricas, metricas_render = {}, {}
+        imagens = modulo.converter_pdf_para_vision(caminho, metricas_render=metricas_render, mosaico=mosaico)
+        metricas["imagens"] = len(imagens)
+        if mosaico:
+            metricas["mosaico"] = metricas_render
+        resposta = modulo.consultar_claude_raw(imagens, os.path.basename(caminho), prazo=Prazo(), metricas=metricas)
+        metricas["modelo"] = modulo.MODELO_IA
+        return resposta, metricas
+    return rodar
+
+
+def _visao_gemini(caminho):
+    import gemini_google
+
+    metricas = {}
+    imagens = gemini_google.converter_pdf_para_imagens_b64(caminho)
+    metricas["imagens"] = len(imagens)
+    resposta = gemini_google.consultar_gemini_vision(imagens, os.path.basename(caminho), prazo=Prazo(), metricas=metricas)
+    metricas["modelo"] = gemini_google.MODELO_GEMINI
+    return resposta, metricas
+
+
+def _texto_llamaparse(modelo=None):
+    def rodar(caminho):
+        import llama
+        from ingestao_llama import carregar_markdown
+        from contexto_relevante import montar_contexto
+
+        metricas = {}
+        paginas = carregar_markdown(llama.obter_parser(), caminho)
+        texto, metricas_contexto = montar_contexto("\n\n".join(paginas))
+        metricas.update({"paginas_llamaparse": len(paginas), "tokens_enviados": metricas_contexto["tokens_enviados"]})
+        resposta = llama.consultar_claude_raw(texto, os.path.basename(caminho), prazo=Prazo(),
+                                              metricas=metricas, modelo=modelo)
+        metricas["modelo"] = modelo or llama.MODELO_IA
+        return resposta, metricas
+    return rodar
+
+
+BACKENDS = {
+    "claude-3.5-sonnet": _visao_openrouter("3_claude_open_router"),
+    "nemotron-nano-12b-v2-vl": _visao_openrouter("modelos_aleatorios"),
+    # Mesmos modelos com as páginas de cada bloco compostas numa imagem só (mosaico.py)
+    "claude-3.5-sonnet+mosaico": _visao_openrouter("3_claude_open_router", mosaico=True),
+    "nemotron-nano-12b-v2-vl+mosaico": _visao_openrouter("modelos_aleatorios", mosaico=True),
+    "gemini-2.5-flash": _visao_gemini,
+    "mimo-v2-flash": _texto_llamaparse(),
+    "llamaparse-claude": _texto_llamaparse("anthropic/claude-3.5-sonnet"),
+}
+
+
+# --- GABARITO E GRAVAÇÕES ---
+
+def carregar_gabarito(dir_benchmark=DIR_BENCHMARK):
+    """Lê gabarito.jsonl; o caminho de cada contrato é relativo à pasta do benchmark."""
+    caminho = os.path.join(dir_benchmark, "gabarito.jsonl")
+    rotulos = []
+    with open(caminho, encoding="utf-8") as f:
+        for n, linha in enumerate(f, 1):
+            if not linha.strip():
+                continue
+            rotulo = json.loads(linha)
+            if "arquivo" not in rotulo:
+                raise ValueError(f"{caminho}:{n}: falta a chave 'arquivo'")
+            rotulo["caminho"] = os.path.join(dir_benchmark, rotulo["arquivo"])
+            rotulos.append(rotulo)
+    return rotulos
+
+
+def _caminho_gravacao(dir_benchmark, backend, caminho_contrato):
+    from manifesto import hash_arquivo
+
+    return os.path.join(dir_benchmark, "gravacoes", backend, f"{hash_arquivo(caminho_contrato)}.json")
+
+
+def executar_backend(backend, caminho, modo="auto", dir_benchmark=DIR_BENCHMARK):
+    """
+    Resposta de um backend para um contrato.
+    modo "auto": usa a gravação se existir, senão chama e grava; "gravar": sempre chama;
+    "replay": só gravações (offline), devolve None quando falta.
+    Falhas (exceção ou resposta vazia) não são gravadas: o próximo "auto" chama de novo.
+    """
+    destino = _caminho_gravacao(dir_benchmark, backend, caminho)
+    if modo != "gravar" and os.path.exists(destino):
+        with open(destino, encoding="utf-8") as f:
+            gravacao = json.load(f)
+        # Gravações de falha de versões anteriores: em "auto" valem como ausentes
+        if gravacao.get("resposta_ia_raw") is not None or modo == "replay":
+            return gravacao
+    elif modo == "replay":
+        return None
+
+    inicio = time.monotonic()
+    try:
+        resposta, metricas = BACKENDS[backend](caminho)
+    except Exception as e:
+        logging.error(f"Benchmark: {backend} falhou em {caminho}: {e}")
+        resposta, metricas = None, {"erro": str(e)}
+    gravacao = {
+        "backend": backend,
+        "arquivo": os.path.basename(caminho),
+        "timestamp": datetime.now().isoformat(),
+        "latencia_s": round(time.monotonic() - inicio, 3),
+        "metricas_chamada": metricas,
+        "resposta_ia_raw": resposta,
+    }
+    if resposta is None:
+        return gravacao
+    garantir_pasta(os.path.dirname(destino))
+    with open(destino, "w", encoding="utf-8") as f:
+        json.dump(gravacao, f, indent=4, ensure_ascii=False)
+    return gravacao
+
+
+# --- PONTUAÇÃO ---
+
+def decidir_acao(status, fim, evidencia):
+    """Ação final pela regra do 02_processador, aplicada aos campos extraídos (sem LLM)."""
+    if status in STATUS_COM_FE_PUBLICA and evidencia is not None and evidencia <= DATA_LEI:
+        return "ARQUIVO (SEGURO)"
+    if fim is not None and fim < INICIO_VIGENCIA_CBS:
+        return "NAO_REGISTRAR (ECONOMIA)"
+    if status == "NÃO ASSINADO":
+        return "NAO_REGISTRAR (SEM_VALIDADE)"
+    return "REGISTRAR (PROTECAO_LONGO_PRAZO)"
+
+
+def _data(valor):
+    return None if pd.isna(valor) else valor.to_pydatetime()
+
+
+def normalizar_registros(registros):
+    """Mesmo caminho do 02_processador: validação do esquema + normalização colunar em lote."""
+    limpos, _, _ = validar_lote(registros)
+    df = normalizar_lote(pd.DataFrame(limpos, columns=sorted({c for r in limpos for c in r} | {"status"})))
+    normalizados = []
+    for i, limpo in enumerate(limpos):
+        registro = {"status": limpo.get("status")}
+        for campo in ("data_evidencia", "data_inicio_contrato", "data_fim_contrato"):
+            registro[campo] = _data(df[f"{campo}_dt"].iloc[i])
+        for campo in ("valor_aluguel_mensal_float", "custo_registro_cartorio_float"):
+            registro[campo] = float(df[campo].iloc[i]) if df[f"{campo}_valida"].iloc[i] else None
+        registro["acao_recomendada"] = decidir_acao(
+            registro["status"], registro["data_fim_contrato"], registro["data_evidencia"])
+        normalizados.append(registro)
+    return normalizados
+
+
+def _igual(campo, esperado, obtido):
+    if esperado is None or obtido is None:
+        return esperado is None and obtido is None
+    if campo.endswith("_float"):
+        return abs(esperado - obtido) <= TOLERANCIA_DINHEIRO * max(abs(esperado), 1.0)
+    return esperado == obtido
+
+
+def _percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, math.ceil(p * len(ordenados)) - 1)]
+
+
+def custo_usd(metricas, backend):
+    """None quando o modelo é pago e os tokens não vieram (stream cortado antes do chunk de uso)."""
+    entrada, saida = PRECOS_USD_POR_MILHAO.get(metricas.get("modelo"), (0.0, 0.0))
+    if (entrada or saida) and (metricas.get("tokens_entrada") is None or metricas.get("tokens_saida") is None):
+        return None
+    custo = ((metricas.get("tokens_entrada") or 0) * entrada + (metricas.get("tokens_saida") or 0) * saida) / 1e6
+    return custo + (metricas.get("paginas_llamaparse") or 0) * LLAMAPARSE_USD_POR_PAGINA
+
+
+def avaliar_backend(backend, rotulos, modo="auto", dir_benchmark=DIR_BENCHMARK):
+    """Roda (ou reproduz) um backend sobre o gabarito e devolve acerto por campo, latência, tokens e custo."""
+    # A ação esperada vem do gabarito quando rotulada; senão, da regra sobre os campos rotulados
+    esperados = normalizar_registros(rotulos)
+    for rotulo, esperado in zip(rotulos, esperados):
+        if rotulo.get("acao_recomendada"):
+            esperado["acao_recomendada"] = rotulo["acao_recomendada"].strip().upper()
+
+    gravacoes, extraidos = [], []
+    for i, rotulo in enumerate(rotulos, 1):
+        gravacao = executar_backend(backend, rotulo["caminho"], modo, dir_benchmark)
+        if gravacao is None:
+            print(f"    [{backend}] sem gravação para {rotulo['arquivo']} (replay)")
+        else:
+            print(f"    [{backend}] {i}/{len(rotulos)} {rotulo['arquivo']} ({gravacao['latencia_s']:.1f}s)")
+        dados, _ = extrair_json((gravacao or {}).get("resposta_ia_raw") or "")
+        gravacoes.append(gravacao)
+        extraidos.append(dados or {})
+    obtidos = normalizar_registros(extraidos)
+
+    acertos = {}
+    for campo in CAMPOS_PONTUADOS:
+        # Só conta o campo nos contratos em que ele foi rotulado; sem resposta é erro em todos os
+        # campos (senão None == None e a ação padrão REGISTRAR dariam acerto a quem não respondeu)
+        pares = [(bool(d), e[campo], o[campo]) for r, d, e, o in zip(rotulos, extraidos, esperados, obtidos)
+                 if campo in r or campo == "acao_recomendada"]
+        acertos[campo] = round(sum(respondeu and _igual(campo, e, o) for respondeu, e, o in pares) / len(pares), 4) if pares else None
+
+    medidas = [g for g in gravacoes if g is not None]
+    latencias = [g["latencia_s"] for g in medidas]
+    # Tokens desconhecidos ficam fora das médias (contá-los como 0 baratearia o backend)
+    tokens = [g["metricas_chamada"]["tokens_entrada"] + g["metricas_chamada"]["tokens_saida"] for g in medidas
+              if g["metricas_chamada"].get("tokens_entrada") is not None and g["metricas_chamada"].get("tokens_saida") is not None]
+    custos = [custo_usd(g["metricas_chamada"], backend) for g in medidas]
+    custos = [c for c in custos if c is not None]
+    imagens = [g["metricas_chamada"]["imagens"] for g in medidas if "imagens" in g["metricas_chamada"]]
+    pontuados = [a for a in acertos.values() if a is not None]
+    return {
+        "backend": backend,
+        "contratos": len(rotulos),
+        "respondidos": sum(1 for d in extraidos if d),
+        "acerto_por_campo": acertos,
+        "acerto_medio": round(sum(pontuados) / len(pontuados), 4) if pontuados else 0.0,
+        "latencia_p50_s": _percentil(latencias, 0.50),
+        "latencia_p95_s": _percentil(latencias, 0.95),
+        "tokens_medios": round(sum(tokens) / len(tokens)) if tokens else None,
+        "imagens_medias": round(sum(imagens) / len(imagens), 1) if imagens else None,
+        "usd_por_contrato": round(sum(custos) / len(custos), 5) if custos else None,
+        "custos_desconhecidos": len(medidas) - len(custos),
+        # Um trabalhador, sem pausas de rate limit: o teto que o backend permite
+        "contratos_por_minuto": round(60 * len(latencias) / sum(latencias), 2) if latencias and sum(latencias) else None,
+    }
+
+
+def recomendar(resultados, acuracia_minima):
+    """O backend mais rápido (p50) entre os que atingem a acurácia média mínima."""
+    aptos = [r for r in resultados if r["acerto_medio"] >= acuracia_minima and r["latencia_p50_s"] is not None]
+    return min(aptos, key=lambda r: (r["latencia_p50_s"], r["usd_por_contrato"] or 0.0), default=None)
+
+
+def imprimir_tabela(resultados):
+    linhas = []
+    for r in resultados:
+        linha = {"backend": r["backend"], "resp.": f"{r['respondidos']}/{r['contratos']}"}
+        linha.update({c: r["acerto_por_campo"][c] for c in CAMPOS_PONTUADOS})
+        linha.update({
+            "médio": r["acerto_medio"], "p50 s": r["latencia_p50_s"], "p95 s": r["latencia_p95_s"],
+            "tokens": r["tokens_medios"], "imagens": r["imagens_medias"], "US$/contr.": r["usd_por_contrato"],
+            "s/ custo": r["custos_desconhecidos"], "contr./min": r["contratos_por_minuto"],
+        })
+        linhas.append(linha)
+    tabela = pd.DataFrame(linhas).rename(columns=lambda c: c.replace("_contrato", "").replace("_mensal_float", "")
+                                                            .replace("_cartorio_float", "").replace("_recomendada", ""))
+    print(tabela.to_string(index=False))
+
+
+def executar_benchmark(backends=None, modo="auto", acuracia_minima=None, dir_benchmark=DIR_BENCHMARK):
+    configurar_logging("benchmark")
+    rotulos = carregar_gabarito(dir_benchmark)
+    backends = backends or list(BACKENDS)
+    print(f" Benchmark: {len(rotulos)} contratos rotulados x {len(backends)} backends (modo {modo})")
+
+    resultados = []
+    for backend in backends:
+        print(f"\n >> {backend}")
+        resultados.append(avaliar_backend(backend, rotulos, modo, dir_benchmark))
+
+    print()
+    imprimir_tabela(resultados)
+    escolhido = recomendar(resultados, acuracia_minima) if acuracia_minima is not None else None
+    if acuracia_minima is not None:
+        if escolhido:
+            print(f"\n Mais rápido com acerto médio >= {acuracia_minima:.0%}: {escolhido['backend']} "
+                  f"(p50 {escolhido['latencia_p50_s']:.1f}s, US$ {escolhido['usd_por_contrato']:.4f}/contrato)")
+        else:
+            print(f"\n Nenhum backend atingiu acerto médio >= {acuracia_minima:.0%}.")
+
+    pasta_resultados = os.path.join(dir_benchmark, "resultados")
+    garantir_pasta(pasta_resultados)
+    destino = os.path.join(pasta_resultados, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(destino, "w", encoding="utf-8") as f:
+        json.dump({"modo": modo, "acuracia_minima": acuracia_minima,
+                   "recomendado": escolhido["backend"] if escolhido else None,
+                   "resultados": resultados}, f, indent=4, ensure_ascii=False)
+    print(f" Resultados salvos em: {destino}")
+    return resultados
+
+
+if __name__ == "__main__":
+    try:
+        executar_benchmark()
+    except KeyboardInterrupt:
+        print("\n Interrompido pelo usuário.")
@@ -0,0 +1,176 @@
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+from collections import Counter
+
+from manifesto import obter_manifesto, hash_arquivo
+
+# --- CACHE DE RENDERIZAÇÃO (imagens de página em disco, compartilhadas entre backends) ---
+# Chave = hash do conteúdo do PDF + página + zoom + codificação. Claude, Nemotron e Gemini usam
+# as mesmas páginas em zoom 2.0: a segunda passada de modelo sobre o corpus não rasteriza nada.
+# O tamanho total é limitado (CACHE_RENDER_MAX_MB); passando do teto, saem as imagens usadas há
+# mais tempo (o mtime é renovado a cada acerto).
+CACHE_RENDER_ATIVO = os.getenv("CACHE_RENDER_ATIVO", "1") == "1"
+DIR_CACHE_RENDER = os.getenv("DIR_CACHE_RENDER", os.path.join("outputs", "cache_render"))
+LIMITE_BYTES = int(float(os.getenv("CACHE_RENDER_MAX_MB", "2048")) * 1024 * 1024)
+FRACAO_APOS_DESPEJO = 0.9      # despeja até 90% do teto, para não despejar a cada gravação
+FORMATO_PADRAO = "jpeg"
+VERSAO = 1                     # mude quando a forma de codificar as imagens mudar
+
+_HASHES = {}   # (caminho, tamanho, mtime) -> sha256 do conteúdo
+
+
+def hash_pdf(caminho):
+    """
+    Hash do conteúdo, memorizado por (caminho, tamanho, mtime). Vem do manifesto, que já leu o
+    arquivo na triagem: com o cache quente o PDF não é relido. Só relê se a triagem não o hasheou.
+    """
+    info = os.stat(caminho)
+    chave = (os.path.abspath(caminho), info.st_size, info.st_mtime_ns)
+    if chave not in _HASHES:
+        _HASHES[chave] = obter_manifesto().obter(caminho).get("hash") or hash_arquivo(caminho)
+    return _HASHES[chave]
+
+
+def chave_imagem(hash_conteudo, pagina, zoom, formato=FORMATO_PADRAO, extra=""):
+    assinatura = f"v{VERSAO}|{hash_conteudo}|{pagina}|{zoom:g}|{formato}|{extra}"
+    return hashlib.sha256(assinatura.encode("utf-8")).hexdigest()
+
+
+class CacheRender:
+    """Blobs em disco, dois níveis de pasta, gravação atômica e despejo por uso menos recente."""
+    def __init__(self, dir_cache=DIR_CACHE_RENDER, limite_bytes=LIMITE_BYTES):
+        self.dir_cache = dir_cache
+        self.limite_bytes = limite_bytes
+        self.contagem = Counter()
+        self._tamanho = None   # bytes em disco; varrido na primeira gravação
+        self._trava = threading.Lock()
+
+    def _caminho(self, chave):
+        return os.path.join(self.dir_cache, chave[:2], f"{chave}.bin")
+
+    def ler(self, chave):
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "rb") as f:
+                dados = f.read()
+            os.utime(caminho)  # uso recente: fica de fora do próximo despejo
+        except OSError:
+            self._contar("faltas")
+            return None
+        self._contar("acertos")
+        return dados
+
+    def gravar(self, chave, dados):
+        destino = self._caminho(chave)
+        try:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            temporario = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporario, "wb") as f:
+                f.write(dados)
+            os.replace(temporario, destino)  # atômico: outro processo nunca lê uma imagem pela metade
+        except OSError as e:
+            logging.warning(f"Cache de render: não gravou {destino}: {e}")
+            return
+        with self._trava:
+            if self._tamanho is None:
+                self._tamanho = self._varrer_tamanho()
+            else:
+                self._tamanho += len(dados)
+            passou_do_teto = self._tamanho > self.limite_bytes
+        if passou_do_teto:
+            self.despejar()
+
+    def _varrer_tamanho(self):
+        total = 0
+        for raiz, _, arquivos in os.walk(self.dir_cache):
+            for nome in arquivos:
+                try:
+                    total += os.path.getsize(os.path.join(raiz, nome))
+                except OSError:
+                    pass
+        return total
+
+    def despejar(self):
+        """Remove as imagens menos usadas até ficar abaixo de FRACAO_APOS_DESPEJO do teto."""
+        with self._trava:
+            entradas = []
+            for raiz, _, arquivos in os.walk(self.dir_cache):
+                for nome in arquivos:
+                    caminho = os.path.join(raiz, nome)
+                    try:
+                        info = os.stat(caminho)
+                    except OSError:
+                        continue  # outro processo já despejou
+                    entradas.append((info.st_mtime, info.st_size, caminho))
+            total = sum(tamanho for _, tamanho, _ in entradas)
+            alvo = FRACAO_APOS_DESPEJO * self.limite_bytes
+            for _, tamanho, caminho in sorted(entradas):
+                if total <= alvo:
+                    break
+                try:
+                    os.remove(caminho)
+                except OSError:
+                    continue
+                total -= tamanho
+                self.contagem["despejos"] += 1
+            self._tamanho = total
+
+    def _contar(self, chave):
+        with self._trava:
+            self.contagem[chave] += 1
+
+    def resumo(self):
+        c = self.contagem
+        consultas = c["acertos"] + c["faltas"]
+        taxa = 100 * c["acertos"] / consultas if consultas else 0.0
+        return (f"Cache de render: {c['acertos']} páginas reaproveitadas, {c['faltas']} rasterizadas "
+                f"({taxa:.0f}% de acerto) | {c['despejos']} despejadas | teto {self.limite_bytes / 1024 ** 2:.0f} MB")
+
+
+CACHE = CacheRender()
+
+
+def paginas_jpeg(caminho_pdf, indices, zoom=2.0, doc=None):
+    """
+    JPEG de cada página escolhida, na ordem de indices. Só as páginas ausentes do cache
+    são rasterizadas; o PDF só é aberto pelo fitz se faltar alguma (quando doc não vem pronto).
+    """
+    import fitz  # PyMuPDF
+
+    indices = list(indices)
+    if not CACHE_RENDER_ATIVO:
+        doc = doc if doc is not None else fitz.open(caminho_pdf)
+        return [doc.load_page(i).get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes(FORMATO_PADRAO) for i in indices]
+
+    hash_conteudo = hash_pdf(caminho_pdf)
+    imagens = []
+    for i in indices:
+        chave = chave_imagem(hash_conteudo, i, zoom)
+        img_bytes = CACHE.ler(chave)
+        if img_bytes is None:
+            doc = doc if doc is not None else fitz.open(caminho_pdf)
+            img_bytes = doc.load_page(i).get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes(FORMATO_PADRAO)
+            CACHE.gravar(chave, img_bytes)
+        imagens.append(img_bytes)
+    return imagens
+
+
+def ler_composto(chave):
+    """Várias imagens + medidas num só blob (ex: página em modo ROI). Retorna (imagens, medidas) ou None."""
+    dados = CACHE.ler(chave)
+    if dados is None:
+        return None
+    try:
+        pacote = json.loads(dados)
+        return [base64.b64decode(i) for i in pacote["imagens"]], pacote["medidas"]
+    except (ValueError, KeyError):
+        return None
+
+
+def gravar_composto(chave, imagens, medidas):
+    pacote = {"imagens": [base64.b64encode(i).decode("ascii") for i in imagens], "medidas": medidas}
+    CACHE.gravar(chave, json.dumps(pacote).encode("utf-8"))
@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+import argparse
+import importlib
+
+# --- PONTO DE ENTRADA ÚNICO ---
+# python cli.py triage | budget | extract | process | report | benchmark | serve
+# Nada pesado (openai, llama_parse, fitz, pandas, pyarrow) é importado aqui: cada subcomando
+# carrega só o módulo de que precisa, na hora de rodar. --help e --dry-run abrem em milissegundos.
+_INICIO = time.perf_counter()
+
+# Backend -> (módulo, função principal, extensões aceitas)
+EXTRATORES = {
+    "claude": ("3_claude_open_router", "executar_extracao", (".pdf",)),
+    "modelos": ("modelos_aleatorios", "executar_extracao", (".pdf",)),
+    "gemini": ("gemini_google", "executar_producao", (".pdf",)),
+    "llama": ("llama", "executar_extracao", (".pdf",)),
+    "converter": ("converter", "processar_arquivos", (".pdf", ".docx")),
+}
+
+
+def comando_triage(args):
+    import manifesto
+
+    manifesto.executar_triagem(args.raiz)
+
+
+def comando_budget(args):
+    importlib.import_module("01_custos").calcular_custo_recursivo()
+
+
+def comando_extract(args):
+    modulo, funcao, extensoes = EXTRATORES[args.backend]
+    if args.priorizar:
+        # Lido no import dos módulos (priorizacao.PRIORIZAR)
+        os.environ["PRIORIZAR_EXTRACAO"] = "1"
+    if args.dry_run:
+        # Só descoberta + índice do lake: nenhum SDK, cliente ou pasta é criado
+        from configuracao import PASTA_ENTRADA, PASTA_SAIDA_EXTRATOR
+        from descoberta import arquivos_pendentes
+
+        estatisticas = {}
+        pendentes = arquivos_pendentes(PASTA_ENTRADA, PASTA_SAIDA_EXTRATOR[args.backend] or "",
+                                       extensoes=extensoes, estatisticas=estatisticas)
+        if args.priorizar:
+            from priorizacao import priorizar
+
+            for (caminho, _), pontos in priorizar(pendentes):
+                print(f"{pontos:>14.2f}  {caminho}")
+        else:
+            for caminho, _ in pendentes:
+                print(caminho)
+        print(f" {estatisticas['pendentes']} pendentes, {estatisticas['pulados']} já no lake ({args.backend}).",
+              file=sys.stderr)
+        return
+
+    extrator = importlib.import_module(modulo)
+    if args.vigiar or args.trabalhador:
+        # Só o pipeline de visão do OpenRouter (extrator_openrouter.py) tem esses modos
+        if args.backend not in ("claude", "modelos"):
+            sys.exit("--vigiar/--trabalhador só existem nos backends claude e modelos.")
+        funcao = "executar_vigia" if args.vigiar else "executar_como_trabalhador"
+    getattr(extrator, funcao)()
+
+
+def comando_process(args):
+    processador = importlib.import_module("02_processador")
+    if args.raw:
+        processador.processar_incremental(args.raw)
+    else:
+        processador.processar_inteligente()
+
+
+def comando_report(args):
+    import dataset_resultados
+
+    tabela = dataset_resultados.agregados(tuple(args.agrupar), execucao=None if args.todas else "ultima")
+    if not tabela.num_rows:
+        print(" Nenhuma execução no dataset de resultados.")
+        return
+    print(tabela.to_pandas().sort_values("CUSTO_REGISTRO_TOTAL", ascending=False).to_string(index=False))
+
+
+def comando_benchmark(args):
+    import benchmark
+
+    benchmark.executar_benchmark(args.backends, modo=args.modo, acuracia_minima=args.acuracia_minima)
+
+
+def comando_serve(args):
+    import consulta_contratos
+
+    if args.reconstruir:
+        total = consulta_contratos.reconstruir_do_dataset()
+        print(f" Base de consulta carregada do dataset de resultados: {total} contratos")
+    consulta_contratos.servir(args.host, args.porta)
+
+
+def montar_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Auditoria de contratos de locação.")
+    parser.add_argument("--tempo", action="store_true", help="mostra o tempo de inicialização e total")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("triage", help="manifesto do corpus: hash, páginas, camada de texto, assinaturas, erros")
+    p.add_argument("--raiz", help="pasta a triar (padrão: PASTA_ENTRADA)")
+    p.set_defaults(funcao=comando_triage)
+
+    p = sub.add_parser("budget", help="orçamento de imagens/custo do corpus (01_custos)")
+    p.set_defaults(funcao=comando_budget)
+
+    p = sub.add_parser("extract", help="extração dos contratos para o lake RAW")
+    p.add_argument("--backend", choices=sorted(EXTRATORES), default="claude")
+    modo = p.add_mutually_exclusive_group()
+    modo.add_argument("--dry-run", action="store_true", help="lista os pendentes sem chamar nenhuma API")
+    modo.add_argument("--vigiar", action="store_true", help="modo contínuo sobre PASTA_ENTRADA")
+    modo.add_argument("--trabalhador", action="store_true", help="consome a fila SQLite compartilhada")
+    p.add_argument("--priorizar", action="store_true",
+                   help="aluguel alto e vigência após 2027 primeiro (PRIORIZAR_EXTRACAO=1)")
+    p.set_defaults(funcao=comando_extract)
+
+    p = sub.add_parser("process", help="decisão estratégica + relatório Excel/Parquet (02_processador)")
+    p.add_argument("raw", nargs="*", help="_RAW.json específicos (atualização incremental)")
+    p.set_defaults(funcao=comando_process)
+
+    p = sub.add_parser("report", help="totais da última execução no dataset de resultados")
+    p.add_argument("--agrupar", nargs="+", default=["ACAO_RECOMENDADA"])
+    p.add_argument("--todas", action="store_true", help="todas as execuções, não só a última")
+    p.set_defaults(funcao=comando_report)
+
+    p = sub.add_parser("benchmark", help="acerto/latência/custo de cada backend sobre o gabarito rotulado")
+    p.add_argument("--backends", nargs="+", help="padrão: todos (ver benchmark.BACKENDS)")
+    p.add_argument("--modo", choices=["auto", "gravar", "replay"], default="auto",
+                   help="replay = offline, só respostas gravadas; gravar = sempre chama as APIs")
+    p.add_argument("--acuracia-minima", type=float, help="recomenda o backend mais rápido acima deste acerto (0-1)")
+    p.set_defaults(funcao=comando_benchmark)
+
+    p = sub.add_parser("serve", help="serviço HTTP/JSON local de consulta aos contratos processados")
+    p.add_argument("--host", default=None, help="padrão: HOST_CONSULTA (127.0.0.1)")
+    p.add_argument("--porta", type=int, default=None, help="padrão: PORTA_CONSULTA (8765)")
+    p.add_argument("--reconstruir", action="store_true",
+                   help="antes de servir, carrega o snapshot mais recente do dataset Parquet")
+    p.set_defaults(funcao=comando_serve)
+    return parser
+
+
+def main(argv=None):
+    args = montar_parser().parse_args(argv)
+    if args.tempo:
+        print(f" Inicialização: {(time.perf_counter() - _INICIO) * 1000:.0f} ms", file=sys.stderr)
+    try:
+        args.funcao(args)
+    except KeyboardInterrupt:
+        print("\n Interrompido pelo usuário.")
+    if args.tempo:
+        print(f" Total: {time.perf_counter() - _INICIO:.2f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
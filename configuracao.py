@@ -0,0 +1,54 @@
+import os
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+# --- CONFIGURAÇÃO CENTRAL ---
+# Um só lugar para .env, pastas, clientes de API e logging. Importar este módulo (ou qualquer
+# script) não cria cliente, pasta nem handler: tudo acontece na primeira chamada que precisa.
+load_dotenv()
+
+# Pastas (mesmas variáveis do .env que cada script já lia)
+PASTA_ENTRADA = os.getenv("PASTA_ENTRADA")
+PASTA_SAIDA_JSON = os.getenv("PASTA_SAIDA_JSON")
+PASTA_SAIDA_FINAL = os.getenv("PASTA_SAIDA_FINAL")
+DIR_ENTRADA_LAKE = os.getenv("DIR_ENTRADA")                 # lake lido pelo 02_processador
+DIRETORIO_RAIZ = os.getenv("DIRETORIO_RAIZ")                # orçamento (01_custos)
+DIR_LOGS = os.getenv("DIR_LOGS", os.path.join("outputs", "logs"))
+
+# Pasta do lake gravada por cada extrator
+PASTA_SAIDA_EXTRATOR = {
+    "claude": os.getenv("ALEATORIOS_TESTE_JSON"),
+    "modelos": PASTA_SAIDA_FINAL,
+    "gemini": os.getenv("TESTE_GEMINI_JSON"),
+    "llama": PASTA_SAIDA_JSON,
+    "converter": PASTA_SAIDA_JSON,
+}
+
+URL_OPENROUTER = "https://openrouter.ai/api/v1"
+REFERER = "https://merca.com.br"
+
+
+@lru_cache(maxsize=None)
+def cliente_openrouter(titulo=None, chave_env="OPENROUTER_API_KEY"):
+    """Cliente OpenAI apontado para o OpenRouter, criado (e importado) só no primeiro uso."""
+    from openai import OpenAI
+
+    cabecalhos = {"HTTP-Referer": REFERER, "X-Title": titulo} if titulo else None
+    return OpenAI(base_url=URL_OPENROUTER, api_key=os.getenv(chave_env), default_headers=cabecalhos)
+
+
+def garantir_pasta(caminho):
+    if caminho:
+        os.makedirs(caminho, exist_ok=True)
+    return caminho
+
+
+def configurar_logging(nome="extracao"):
+    """
+    JSON lines rotativo em DIR_LOGS/<nome>.jsonl + console, gravados por uma thread própria
+    (log_estruturado): logar nunca bloqueia um trabalhador. Idempotente: só a primeira chamada vale.
+    """
+    from log_estruturado import configurar
+
+    return configurar(nome, DIR_LOGS)
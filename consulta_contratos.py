@@ -0,0 +1,322 @@
+import os
+import json
+import time
+import sqlite3
+import unicodedata
+from datetime import date, datetime
+from urllib.parse import urlsplit, parse_qs, urlencode
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# --- CONSULTA DE CONTRATOS (base SQLite indexada + serviço HTTP/JSON local) ---
+# O 02_processador grava cada lote decidido aqui, além do Excel e do Parquet (upsert por
+# pasta/arquivo): a base acompanha o pipeline, inclusive o modo vigia, sem recarga completa.
+# Jurídico e financeiro consultam por locatário, ação, status e vigência em milissegundos,
+# sem abrir o Excel do dia nem varrer o lake de _RAW.json. Só biblioteca padrão.
+#
+#   python cli.py serve                      -> http://127.0.0.1:8765
+#   GET /contratos?locatario=acme&acao=REGISTRAR&fim_de=2027-01-01&limite=50&pagina=2
+#   GET /contratos?status=FÍSICA (SEM FIRMA)&fim_de=2027-01-02&ordem=-valor_aluguel
+#   GET /contrato?arquivo=contrato_123.pdf   GET /resumo   GET /saude
+CAMINHO_BASE_CONSULTA = os.getenv("BASE_CONSULTA", os.path.join("outputs", "consulta_contratos.sqlite"))
+HOST_CONSULTA = os.getenv("HOST_CONSULTA", "127.0.0.1")
+PORTA_CONSULTA = int(os.getenv("PORTA_CONSULTA", "8765"))
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 1000
+
+# Base local (não fica em pasta de rede como a fila de trabalho): WAL deixa o serviço ler
+# enquanto o processador grava.
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS contratos (
+    chave TEXT PRIMARY KEY,            -- pasta_origem/arquivo
+    arquivo TEXT NOT NULL,
+    pasta_origem TEXT,
+    locador TEXT,
+    locatario TEXT,
+    locatario_busca TEXT,              -- minúsculo e sem acento (busca por prefixo)
+    status TEXT,
+    inicio TEXT,                       -- datas em ISO (AAAA-MM-DD): comparam e ordenam como texto
+    fim TEXT,
+    data_prova TEXT,
+    valor_aluguel REAL,
+    custo_registro REAL,
+    acao TEXT,
+    motivo TEXT,
+    campos_invalidos TEXT,
+    run_id TEXT,
+    atualizado_em REAL
+);
+CREATE INDEX IF NOT EXISTS idx_contratos_locatario ON contratos (locatario_busca);
+CREATE INDEX IF NOT EXISTS idx_contratos_acao ON contratos (acao, fim);
+CREATE INDEX IF NOT EXISTS idx_contratos_fim ON contratos (fim);
+CREATE INDEX IF NOT EXISTS idx_contratos_status ON contratos (status, fim);
+CREATE INDEX IF NOT EXISTS idx_contratos_arquivo ON contratos (arquivo);
+CREATE INDEX IF NOT EXISTS idx_contratos_atualizacao ON contratos (atualizado_em);
+"""
+
+# Colunas devolvidas pela API, na ordem
+COLUNAS = [
+    "arquivo", "pasta_origem", "locador", "locatario", "status", "inicio", "fim", "data_prova",
+    "valor_aluguel", "custo_registro", "acao", "motivo", "campos_invalidos", "run_id", "atualizado_em",
+]
+# ?ordem=campo ou -campo (decrescente)
+ORDENS = {"fim", "inicio", "data_prova", "valor_aluguel", "custo_registro", "arquivo", "locatario", "atualizado_em"}
+
+
+def normalizar_busca(texto):
+    """"Açaí Comércio LTDA" -> "acai comercio ltda": a busca não depende de acento nem de caixa."""
+    if not texto:
+        return None
+    sem_acento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return " ".join(sem_acento.lower().split())
+
+
+def _data_iso(valor):
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return None
+
+
+def _linha_do_registro(registro, run_id, agora):
+    """Registro do 02_processador (chaves do relatório) -> linha da tabela."""
+    arquivo = registro.get("ARQUIVO") or ""
+    pasta = registro.get("PASTA_ORIGEM") or ""
+    return (
+        f"{pasta}/{arquivo}" if pasta else arquivo, arquivo, pasta,
+        registro.get("LOCADOR"), registro.get("LOCATARIO"), normalizar_busca(registro.get("LOCATARIO")),
+        registro.get("STATUS_VISUAL"),
+        _data_iso(registro.get("INICIO_VIGENCIA")), _data_iso(registro.get("FIM_VIGENCIA")),
+        _data_iso(registro.get("DATA_PROVA")),
+        registro.get("VALOR_ALUGUEL"), registro.get("CUSTO_REGISTRO"),
+        registro.get("ACAO_RECOMENDADA") or "ERRO", registro.get("MOTIVO_GEMINI"),
+        registro.get("CAMPOS_INVALIDOS"), run_id, agora,
+    )
+
+
+class BaseContratos:
+    """Upsert dos registros decididos e consultas paginadas sobre os índices."""
+    def __init__(self, caminho=CAMINHO_BASE_CONSULTA):
+        self.caminho = caminho
+        pasta = os.path.dirname(os.path.abspath(caminho))
+        os.makedirs(pasta, exist_ok=True)
+        conexao = sqlite3.connect(caminho, timeout=30)
+        try:
+            conexao.execute("PRAGMA journal_mode = WAL")
+            conexao.executescript(_ESQUEMA)
+        finally:
+            conexao.close()
+
+    def _conectar(self):
+        # Uma conexão por operação: o servidor atende cada requisição numa thread
+        conexao = sqlite3.connect(self.caminho, timeout=30)
+        conexao.row_factory = sqlite3.Row
+        return conexao
+
+    def atualizar(self, registros, run_id=None):
+        """Grava (ou substitui) os registros de um lote. Retorna quantos entraram."""
+        if not registros:
+            return 0
+        agora = time.time()
+        linhas = [_linha_do_registro(r, run_id, agora) for r in registros]
+        conexao = self._conectar()
+        try:
+            with conexao:
+                conexao.executemany(
+                    "INSERT INTO contratos (chave, arquivo, pasta_origem, locador, locatario, locatario_busca, "
+                    "status, inicio, fim, data_prova, valor_aluguel, custo_registro, acao, motivo, "
+                    "campos_invalidos, run_id, atualizado_em) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(chave) DO UPDATE SET arquivo = excluded.arquivo, pasta_origem = excluded.pasta_origem, "
+                    "locador = COALESCE(excluded.locador, contratos.locador), locatario = excluded.locatario, "
+                    "locatario_busca = excluded.locatario_busca, status = excluded.status, inicio = excluded.inicio, "
+                    "fim = excluded.fim, data_prova = excluded.data_prova, valor_aluguel = excluded.valor_aluguel, "
+                    "custo_registro = excluded.custo_registro, acao = excluded.acao, motivo = excluded.motivo, "
+                    "campos_invalidos = excluded.campos_invalidos, run_id = excluded.run_id, "
+                    "atualizado_em = excluded.atualizado_em",
+                    linhas,
+                )
+        finally:
+            conexao.close()
+        return len(linhas)
+
+    def buscar(self, locatario=None, acao=None, status=None, fim_de=None, fim_ate=None,
+               inicio_de=None, inicio_ate=None, pasta=None, ordem="fim", limite=LIMITE_PADRAO, pagina=1):
+        """
+        Filtros combinados com E. locatario é prefixo do nome normalizado e acao é prefixo da
+        ação ("REGISTRAR" pega "REGISTRAR (PROTECAO_LONGO_PRAZO)"); status é exato.
+        Datas em ISO, intervalos fechados. Retorna {"total", "pagina", "limite", "itens"}.
+        """
+        condicoes, parametros = [], []
+        # Prefixo como intervalo [p, p + U+FFFF): usa o índice, ao contrário de LIKE
+        for coluna, prefixo in (("locatario_busca", normalizar_busca(locatario)), ("acao", acao)):
+            if prefixo:
+                condicoes.append(f"{coluna} >= ? AND {coluna} < ?")
+                parametros += [prefixo, prefixo + "\uffff"]
+        for coluna, valor in (("status", status), ("pasta_origem", pasta)):
+            if valor:
+                condicoes.append(f"{coluna} = ?")
+                parametros.append(valor)
+        for coluna, operador, valor in (("fim", ">=", fim_de), ("fim", "<=", fim_ate),
+                                        ("inicio", ">=", inicio_de), ("inicio", "<=", inicio_ate)):
+            if valor:
+                condicoes.append(f"{coluna} {operador} ?")
+                parametros.append(valor)
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+
+        campo = ordem.lstrip("-")
+        if campo not in ORDENS:
+            raise ValueError(f"ordem inválida: {ordem} (use {', '.join(sorted(ORDENS))}, com - para decrescente)")
+        direcao = "DESC" if ordem.startswith("-") else "ASC"
+        limite = max(1, min(int(limite), LIMITE_MAXIMO))
+        pagina = max(1, int(pagina))
+
+        conexao = self._conectar()
+        try:
+            total = conexao.execute(f"SELECT COUNT(*) FROM contratos {where}", parametros).fetchone()[0]
+            # Primeiro só os rowids da página (a ordem sai do índice, sem ordenar linhas inteiras),
+            # depois as linhas. rowid desempata: a paginação é estável. Sem data vem antes no crescente.
+            ids = [linha[0] for linha in conexao.execute(
+                f"SELECT rowid FROM contratos {where} ORDER BY {campo} {direcao}, rowid {direcao} LIMIT ? OFFSET ?",
+                parametros + [limite, (pagina - 1) * limite],
+            )]
+            por_id = {linha["rowid"]: linha for linha in conexao.execute(
+                f"SELECT rowid, {', '.join(COLUNAS)} FROM contratos WHERE rowid IN ({', '.join('?' * len(ids))})", ids
+            )} if ids else {}
+            linhas = [{c: por_id[i][c] for c in COLUNAS} for i in ids]
+        finally:
+            conexao.close()
+        return {"total": total, "pagina": pagina, "limite": limite, "itens": linhas}
+
+    def por_arquivo(self, arquivo):
+        conexao = self._conectar()
+        try:
+            linhas = conexao.execute(f"SELECT {', '.join(COLUNAS)} FROM contratos WHERE arquivo = ?",
+                                     (arquivo,)).fetchall()
+        finally:
+            conexao.close()
+        return [dict(l) for l in linhas]
+
+    def resumo(self):
+        """Contratos, custo de registro e aluguel por ação recomendada."""
+        conexao = self._conectar()
+        try:
+            linhas = conexao.execute(
+                "SELECT acao, COUNT(*) AS contratos, SUM(custo_registro) AS custo_registro_total, "
+                "SUM(valor_aluguel) AS valor_aluguel_total FROM contratos GROUP BY acao ORDER BY acao"
+            ).fetchall()
+        finally:
+            conexao.close()
+        return [dict(l) for l in linhas]
+
+    def saude(self):
+        conexao = self._conectar()
+        try:
+            total, ultima = conexao.execute("SELECT COUNT(*), MAX(atualizado_em) FROM contratos").fetchone()
+        finally:
+            conexao.close()
+        return {
+            "contratos": total,
+            "ultima_atualizacao": datetime.fromtimestamp(ultima).isoformat(timespec="seconds") if ultima else None,
+            "base": os.path.abspath(self.caminho),
+        }
+
+
+_BASES = {}
+
+
+def obter_base(caminho=CAMINHO_BASE_CONSULTA):
+    if caminho not in _BASES:
+        _BASES[caminho] = BaseContratos(caminho)
+    return _BASES[caminho]
+
+
+def reconstruir_do_dataset(base=None):
+    """Carga inicial a partir do snapshot mais recente do dataset Parquet (contratos já processados)."""
+    import dataset_resultados
+
+    base = base or obter_base()
+    tabela = dataset_resultados.consultar()
+    if not tabela.num_rows:
+        return 0
+    registros = tabela.to_pylist()
+    run_id = registros[0].get("RUN_ID")
+    return base.atualizar(registros, run_id)
+
+
+# --- SERVIDOR HTTP ---
+
+_FILTROS = ("locatario", "acao", "status", "fim_de", "fim_ate", "inicio_de", "inicio_ate", "pasta")
+_FILTROS_DATA = ("fim_de", "fim_ate", "inicio_de", "inicio_ate")
+
+
+def _parametros_busca(consulta):
+    parametros = {nome: consulta[nome][0] for nome in _FILTROS if consulta.get(nome)}
+    for nome in _FILTROS_DATA:
+        if nome in parametros:
+            date.fromisoformat(parametros[nome])  # ValueError -> 400
+    for nome in ("ordem", "limite", "pagina"):
+        if consulta.get(nome):
+            parametros[nome] = consulta[nome][0]
+    return parametros
+
+
+class _Tratador(BaseHTTPRequestHandler):
+    base = None   # definido em servir()
+
+    def do_GET(self):
+        inicio = time.perf_counter()
+        url = urlsplit(self.path)
+        consulta = parse_qs(url.query)
+        try:
+            if url.path == "/contratos":
+                parametros = _parametros_busca(consulta)
+                resposta = self.base.buscar(**parametros)
+                if resposta["pagina"] * resposta["limite"] < resposta["total"]:
+                    proxima = {**{k: v[0] for k, v in consulta.items()}, "pagina": resposta["pagina"] + 1}
+                    resposta["proxima"] = f"/contratos?{urlencode(proxima)}"
+            elif url.path == "/contrato" and consulta.get("arquivo"):
+                resposta = {"itens": self.base.por_arquivo(consulta["arquivo"][0])}
+            elif url.path == "/resumo":
+                resposta = {"acoes": self.base.resumo()}
+            elif url.path == "/saude":
+                resposta = self.base.saude()
+            else:
+                self._responder(404, {"erro": "rota inexistente", "rotas": ["/contratos", "/contrato?arquivo=", "/resumo", "/saude"]})
+                return
+        except ValueError as e:
+            self._responder(400, {"erro": str(e)})
+            return
+        except sqlite3.Error as e:
+            self._responder(503, {"erro": f"base indisponível: {e}"})
+            return
+        resposta["tempo_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        self._responder(200, resposta)
+
+    def _responder(self, codigo, corpo):
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, formato, *args):
+        pass  # uma linha por requisição no console atrapalharia mais do que ajuda
+
+
+def servir(host=None, porta=None, base=None):
+    host, porta = host or HOST_CONSULTA, porta or PORTA_CONSULTA
+    _Tratador.base = base or obter_base()
+    servidor = ThreadingHTTPServer((host, porta), _Tratador)
+    print(f" Consulta de contratos em http://{host}:{porta}/contratos ({_Tratador.base.saude()['contratos']} contratos)")
+    try:
+        servidor.serve_forever()
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    try:
+        servir()
+    except KeyboardInterrupt:
+        print("\n Interrompido pelo usuário.")
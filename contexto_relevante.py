@@ -0,0 +1,168 @@
+import os
+import re
+import math
+import unicodedata
+from collections import Counter
+
+# --- CONTEXTO RELEVANTE (compressão do markdown antes do LLM) ---
+# Em vez de truncar no caractere 90.000 (que pode cortar o manifesto de assinatura no fim),
+# o texto é dividido em seções, pontuado com BM25 para cada grupo de campos e remontado
+# dentro de um orçamento de tokens, sempre com o começo e o fim do documento.
+ORCAMENTO_TOKENS = int(os.getenv("CONTEXTO_ORCAMENTO_TOKENS", "12000"))
+FRACAO_CABECA = 0.15          # qualificação das partes, objeto, valor costuma estar no início
+FRACAO_CAUDA = 0.20           # assinaturas, selos, manifestos digitais ficam no final
+CARACTERES_POR_TOKEN = 3.5    # estimativa para português (sem depender de tokenizer)
+TAMANHO_MAXIMO_SECAO = 1500   # caracteres; seções maiores são quebradas em parágrafos
+AMOSTRA_AVALIACAO = float(os.getenv("CONTEXTO_AMOSTRA_AVALIACAO", "0"))  # fração comparada com o texto inteiro
+BM25_K1, BM25_B = 1.5, 0.75
+
+# Grupos de campos do contrato -> termos de busca (sem acento, minúsculos)
+CONSULTAS = {
+    "valor": "aluguel mensal valor r$ reais pagamento locativo importancia mensalidade",
+    "vigencia": "prazo vigencia inicio termino meses vigorar data inicio fim renovacao",
+    "partes": "locador locadora locatario locataria cpf cnpj inscrito qualificado residente sede",
+    "assinatura": "assinado digitalmente assinatura gov br icp brasil reconheco firma tabeliao "
+                  "tabelionato cartorio selo dou fe testemunha testemunhas carimbo verifique",
+}
+
+_RE_SEPARADOR_SECAO = re.compile(
+    r"\n(?=#{1,6}\s)|\n(?=\s*(?:CL[AÁ]USULA|CAP[IÍ]TULO|PAR[AÁ]GRAFO)\b)|\n\s*(?:-{3,}|\*{3,})\s*\n",
+    re.IGNORECASE,
+)
+_RE_PALAVRA = re.compile(r"[a-z0-9$]+")
+
+
+def estimar_tokens(texto):
+    return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+
+
+def _termos(texto):
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return _RE_PALAVRA.findall(texto)
+
+
+def dividir_secoes(texto):
+    """Seções por títulos markdown, cláusulas e separadores; as longas viram blocos de parágrafos."""
+    secoes = []
+    for bloco in _RE_SEPARADOR_SECAO.split(texto):
+        if not bloco or not bloco.strip():
+            continue
+        if len(bloco) <= TAMANHO_MAXIMO_SECAO:
+            secoes.append(bloco)
+            continue
+        atual = ""
+        for paragrafo in re.split(r"(\n\s*\n)", bloco):
+            if atual and len(atual) + len(paragrafo) > TAMANHO_MAXIMO_SECAO:
+                secoes.append(atual)
+                atual = ""
+            # Parágrafo gigante (tabela, OCR sem quebras): corte duro
+            while len(paragrafo) > TAMANHO_MAXIMO_SECAO:
+                secoes.append(paragrafo[:TAMANHO_MAXIMO_SECAO])
+                paragrafo = paragrafo[TAMANHO_MAXIMO_SECAO:]
+            atual += paragrafo
+        if atual.strip():
+            secoes.append(atual)
+    return secoes
+
+
+class IndiceBM25:
+    """BM25 mínimo sobre as seções de um único documento."""
+    def __init__(self, documentos):
+        self.frequencias = [Counter(_termos(d)) for d in documentos]
+        self.tamanhos = [sum(f.values()) for f in self.frequencias]
+        self.media = (sum(self.tamanhos) / len(self.tamanhos)) if self.tamanhos else 0.0
+        df = Counter()
+        for f in self.frequencias:
+            df.update(f.keys())
+        n = len(documentos)
+        self.idf = {t: math.log(1 + (n - q + 0.5) / (q + 0.5)) for t, q in df.items()}
+
+    def pontuar(self, consulta):
+        termos = _termos(consulta)
+        pontuacoes = []
+        for f, tamanho in zip(self.frequencias, self.tamanhos):
+            norma = BM25_K1 * (1 - BM25_B + BM25_B * tamanho / (self.media or 1))
+            pontuacoes.append(sum(
+                self.idf.get(t, 0.0) * f[t] * (BM25_K1 + 1) / (f[t] + norma)
+                for t in termos if t in f
+            ))
+        return pontuacoes
+
+
+def montar_contexto(texto, orcamento_tokens=ORCAMENTO_TOKENS):
+    """
+    Retorna (texto_compacto, relatorio). Textos que já cabem no orçamento passam inteiros.
+    Trechos omitidos viram "[...]" para o modelo saber que houve corte.
+    """
+    tokens_originais = estimar_tokens(texto or "")
+    relatorio = {"tokens_originais": tokens_originais, "tokens_enviados": tokens_originais,
+                 "secoes_total": 0, "secoes_mantidas": 0, "cobertura": {}}
+    if not texto or tokens_originais <= orcamento_tokens:
+        return texto, relatorio
+
+    secoes = dividir_secoes(texto)
+    custos = [estimar_tokens(s) for s in secoes]
+    mantidas = set()
+    gasto = 0
+
+    def manter(i):
+        nonlocal gasto
+        if i in mantidas or gasto + custos[i] > orcamento_tokens:
+            return False
+        mantidas.add(i)
+        gasto += custos[i]
+        return True
+
+    # Cabeça e cauda garantidas
+    limite_cabeca = orcamento_tokens * FRACAO_CABECA
+    for i in range(len(secoes)):
+        if gasto >= limite_cabeca or not manter(i):
+            break
+    limite_cauda = gasto + orcamento_tokens * FRACAO_CAUDA
+    for i in reversed(range(len(secoes))):
+        if gasto >= limite_cauda or not manter(i):
+            break
+
+    # Meio: rodízio entre os grupos de campos, melhor seção de cada grupo por vez
+    indice = IndiceBM25(secoes)
+    rankings = {}
+    for grupo, consulta in CONSULTAS.items():
+        pontuacoes = indice.pontuar(consulta)
+        rankings[grupo] = [i for i in sorted(range(len(secoes)), key=lambda i: -pontuacoes[i]) if pontuacoes[i] > 0]
+    posicoes = {grupo: 0 for grupo in rankings}
+    while any(posicoes[g] < len(rankings[g]) for g in rankings):
+        for grupo, ranking in rankings.items():
+            while posicoes[grupo] < len(ranking):
+                i = ranking[posicoes[grupo]]
+                posicoes[grupo] += 1
+                if i not in mantidas:
+                    manter(i)  # se não couber, tenta a próxima seção deste grupo na volta seguinte
+                    break
+
+    partes, anterior = [], -1
+    for i in sorted(mantidas):
+        if i != anterior + 1:
+            partes.append("[...]")
+        partes.append(secoes[i].strip("\n"))
+        anterior = i
+    if anterior != len(secoes) - 1:
+        partes.append("[...]")
+    compacto = "\n\n".join(partes)
+
+    relatorio.update({
+        "tokens_enviados": estimar_tokens(compacto),
+        "secoes_total": len(secoes),
+        "secoes_mantidas": len(mantidas),
+        # Das 3 seções mais relevantes de cada grupo, quantas foram mantidas
+        "cobertura": {g: round(sum(i in mantidas for i in r[:3]) / len(r[:3]), 2) if r else None
+                      for g, r in rankings.items()},
+    })
+    return compacto, relatorio
+
+
+def comparar_campos(dados_compacto, dados_completo, campos):
+    """Concordância campo a campo entre a resposta com contexto compacto e com o texto inteiro."""
+    if not dados_compacto or not dados_completo:
+        return {}
+    return {c: dados_compacto.get(c) == dados_completo.get(c) for c in campos}
@@ -1,32 +1,52 @@
 import os
 import json
 import re  # Importante para a correção de datas
-import pandas as pd
+import random
 from datetime import datetime
-from dotenv import load_dotenv
-from llama_parse import LlamaParse
-from openai import OpenAI
+from ingestao_llama import parsear_em_paralelo
+from contexto_relevante import ORCAMENTO_TOKENS, AMOSTRA_AVALIACAO, montar_contexto, comparar_campos
+from configuracao import PASTA_ENTRADA, PASTA_SAIDA_JSON, PASTA_SAIDA_FINAL, cliente_openrouter, garantir_pasta
+from resiliencia import executar_com_retry
+from descoberta import descobrir_arquivos
+from assinatura_pdf import campos_da_assinatura
+from manifesto import obter_manifesto, filtrar_legiveis
+from leitor_docx import paginas_docx
+from log_estruturado import etapa
+from pre_classificador import PRE_CLASSIFICADOR_ATIVO, ECONOMIA, classificar_texto, campos_confiaveis
+
+# --- CONFIGURAÇÕES --- (pastas e cliente da API vêm de configuracao.py)
+CAMPOS_AVALIADOS = ["status_assinatura", "data_comprovada_str", "locador", "locatario"]
+# Campos locais (formato do RAW) -> chaves do registro forense
+CAMPOS_LOCAIS_FORENSE = {
+    "status": "status_assinatura",
+    "descricao_prova": "evidencia_encontrada",
+    "data_evidencia": "data_comprovada_str",
+}
+
+# Status e data já resolvidos localmente: o LLM só extrai as partes e a data escrita
+PROMPT_PARTES = """
+    Você é um assistente jurídico. Extraia do contrato de locação abaixo as partes e a data escrita.
 
-# Carrega variáveis de ambiente
-load_dotenv()
-
-# --- CONFIGURAÇÕES ---
-PASTA_ENTRADA = os.getenv("PASTA_ENTRADA")
-PASTA_SAIDA_JSON = os.getenv("PASTA_SAIDA_JSON")
-PASTA_SAIDA_FINAL = os.getenv("PASTA_SAIDA_FINAL")
-
-
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1", api_key=os.getenv("OPENROUTER_API_KEY")
-)
+    ### SAÍDA JSON OBRIGATÓRIA:
+    {
+        "locador": "Nome ou null",
+        "locatario": "Nome ou null",
+        "data_contrato_escrita": "DD/MM/AAAA" (Data digitada no cabeçalho/rodapé do contrato, ou null)
+    }
+    """
 
 
-def estruturar_dados_forense(texto_markdown, nome_arquivo):
+def estruturar_dados_forense(texto_markdown, nome_arquivo, metricas_contexto=None, orcamento_tokens=ORCAMENTO_TOKENS,
+                             campos_locais=None):
     """
     Usa GPT-4o com Prompt Ajustado para detectar Gov.br e Selos Físicos.
+    Com status e data já resolvidos localmente (campos_locais), pede só partes e data escrita
+    e sobrepõe os campos locais ao resultado.
     """
+    campos_locais = campos_locais or {}
+    so_partes = "data_evidencia" in campos_locais
 
-    prompt_system = """
+    prompt_system = PROMPT_PARTES if so_partes else """
     Você é um PERITO FORENSE DOCUMENTAL. Sua missão é validar assinaturas para a Lei Complementar 214/2025.
     
     ### SUAS REGRAS DE OURO:
@@ -49,17 +69,22 @@ def estruturar_dados_forense(texto_markdown, nome_arquivo):
     }
     """
 
-    # Aumentado para 90k caracteres para pegar páginas finais de contratos longos
+    # Seções relevantes (valor, vigência, partes, assinatura) + começo e fim, dentro do orçamento:
+    # o manifesto de assinatura no final nunca é cortado
+    texto_contexto, relatorio = montar_contexto(texto_markdown, orcamento_tokens)
+    if metricas_contexto is not None:
+        metricas_contexto.update(relatorio)
+
     prompt_user = f"""
     Analise este documento: {nome_arquivo}
     
     --- INÍCIO DO CONTEÚDO ---
-    {texto_markdown[:90000]} 
+    {texto_contexto} 
     --- FIM DO CONTEÚDO ---
     """
 
-    try:
-        response = client.chat.completions.create(
+    def chamar(timeout):
+        return cliente_openrouter().chat.completions.create(
             model="anthropic/claude-3.5-sonnet",
             messages=[
                 {"role": "system", "content": prompt_system},
@@ -67,11 +92,23 @@ def estruturar_dados_forense(texto_markdown, nome_arquivo):
             ],
             response_format={"type": "json_object"},
             temperature=0.0,
+            timeout=timeout,
         )
-        return json.loads(response.choices[0].message.content)
+
+    try:
+        response = executar_com_retry(chamar, provedor="openrouter", descricao=nome_arquivo)
+        dados = json.loads(response.choices[0].message.content)
     except Exception as e:
         print(f" Erro na estruturação LLM: {e}")
-        return None
+        if not so_partes:
+            return None
+        # Status/data locais bastam para a decisão: o registro sai, só sem as partes
+        dados = {"locador": None, "locatario": None, "data_contrato_escrita": None}
+
+    for campo, chave in CAMPOS_LOCAIS_FORENSE.items():
+        if campos_locais.get(campo):
+            dados[chave] = campos_locais[campo]
+    return dados
 
 
 def calcular_decisao_final(dados):
@@ -140,10 +177,12 @@ def processar_arquivos():
         print("Pasta de entrada não encontrada.")
         return
 
-    arquivos = [
-        f for f in os.listdir(PASTA_ENTRADA) if f.lower().endswith((".pdf", ".docx"))
-    ]
-    print(f"Iniciando auditoria forense V3 em {len(arquivos)} arquivos...")
+    # Varredura recursiva sob demanda (PDF e DOCX, sem diferenciar maiúsculas)
+    arquivos = descobrir_arquivos(PASTA_ENTRADA, extensoes=(".pdf", ".docx"))
+    print(f"Iniciando auditoria forense V3 em {PASTA_ENTRADA}...")
+
+    # SDKs pesados só quando há o que processar
+    from llama_parse import LlamaParse
 
     # Instrução reforçada para o LlamaParse pegar páginas de assinatura
     parser = LlamaParse(
@@ -154,17 +193,61 @@ def processar_arquivos():
     )
 
     lista_final = []
-    os.makedirs(PASTA_SAIDA_JSON, exist_ok=True)
+    garantir_pasta(PASTA_SAIDA_JSON)
+
+    def triagem():
+        # PDF ilegível sai aqui; assinatura digital embutida (lida na triagem do manifesto) dá
+        # status/data exatos, mas o texto ainda é lido para as partes e a data escrita
+        for caminho in filtrar_legiveis(arquivos, caminho_de=lambda c: c):
+            inspecao = obter_manifesto().obter(caminho)["assinaturas"] if caminho.lower().endswith(".pdf") else None
+            yield caminho, campos_da_assinatura(inspecao)
+
+    # Parses concorrentes (aload_data) com cache de markdown: re-rodar com outro modelo não re-parseia.
+    # DOCX não vai para o LlamaParse: é lido localmente no laço abaixo
+    parseados = parsear_em_paralelo(
+        parser, triagem(), caminho_de=lambda item: item[0],
+        pular=lambda item: item[0].lower().endswith(".docx"),
+    )
 
-    for arq in arquivos:
+    for (caminho, campos_assinatura), paginas in parseados:
+        arq = os.path.basename(caminho)
         print(f"Periciando: {arq}...")
         try:
-            docs = parser.load_data(os.path.join(PASTA_ENTRADA, arq))
-            texto = "\n".join([d.text for d in docs])
-
-            dados = estruturar_dados_forense(texto, arq)
-
+            if caminho.lower().endswith(".docx"):
+                # XML do próprio DOCX (corpo, cabeçalhos, rodapés, tabelas) -> markdown, sem rede
+                paginas = paginas_docx(caminho)
+            if paginas is None:
+                print(f"Erro: não foi possível ler o texto de {arq}")
+                continue
+            texto = "\n".join(paginas)
+
+            # Veredito forense (status + data) resolvido pelos marcadores sai do pedido ao LLM;
+            # a assinatura embutida é leitura exata e prevalece sobre eles
+            pre = classificar_texto(texto) if PRE_CLASSIFICADOR_ATIVO else None
+            campos_locais = {**campos_confiaveis(pre), **campos_assinatura}
+            ECONOMIA.registrar(pre, campos_locais)
+            origem = "ASSINATURA PDF" if campos_assinatura else "PRÉ-CLASSIFICADOR"
+
+            # Status/data resolvidos localmente saem do pedido; partes e data escrita seguem no LLM
+            metricas_contexto = {}
+            with etapa("api", arquivo=arq):
+                dados = estruturar_dados_forense(texto, arq, metricas_contexto, campos_locais=campos_locais)
             if dados:
+                if "data_evidencia" in campos_locais:
+                    ECONOMIA.campos_fora_do_llm(campos_locais)
+                    dados["origem_classificacao"] = f"{origem} + LLM (partes)"
+                else:
+                    dados["origem_classificacao"] = "LLM"
+                dados["tokens_originais"] = metricas_contexto.get("tokens_originais")
+                dados["tokens_enviados"] = metricas_contexto.get("tokens_enviados")
+                print(f"   Contexto: {metricas_contexto.get('tokens_enviados')}/{metricas_contexto.get('tokens_originais')} tokens")
+                # Amostra de controle: mesmo documento com o texto inteiro, para medir a perda de acerto
+                if metricas_contexto.get("secoes_total") and random.random() < AMOSTRA_AVALIACAO:
+                    completo = estruturar_dados_forense(texto, arq, orcamento_tokens=float("inf"),
+                                                        campos_locais=campos_locais)
+                    dados["concordancia_contexto"] = comparar_campos(dados, completo, CAMPOS_AVALIADOS)
+                    print(f"   Concordância com texto inteiro: {dados['concordancia_contexto']}")
+
                 acao, motivo = calcular_decisao_final(dados)
 
                 dados["DECISAO_FINAL"] = acao
@@ -183,6 +266,8 @@ def processar_arquivos():
             print(f"Erro: {e}")
 
     if lista_final:
+        import pandas as pd
+
         df = pd.DataFrame(lista_final)
         # Ordenação inteligente das colunas
         cols = [
@@ -191,6 +276,9 @@ def processar_arquivos():
             "status_assinatura",
             "data_comprovada_str",
             "MOTIVO_DECISAO",
+            "origem_classificacao",
+            "tokens_originais",
+            "tokens_enviados",
             "evidencia_encontrada",
             "locador",
             "locatario",
@@ -198,10 +286,12 @@ def processar_arquivos():
         df = df[[c for c in cols if c in df.columns]]
 
         path_excel = os.path.join(PASTA_SAIDA_FINAL, "Relatorio_Forense_Final.xlsx")
-        os.makedirs(PASTA_SAIDA_FINAL, exist_ok=True)
+        garantir_pasta(PASTA_SAIDA_FINAL)
         df.to_excel(path_excel, index=False)
         print(f"\nRelatório Final gerado: {path_excel}")
 
+    print(ECONOMIA.resumo())
+
 
 if __name__ == "__main__":
     processar_arquivos()
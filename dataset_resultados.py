@@ -0,0 +1,178 @@
+import os
+import glob
+import uuid
+from datetime import datetime, date
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# --- DATASET COLUNAR DE RESULTADOS (Parquet particionado) ---
+# Layout: <DIR_DATASET>/ACAO_RECOMENDADA=<acao>/DATA_EXECUCAO=<AAAA-MM-DD>/parte-*.parquet
+#         <DIR_DATASET>/_agregados/<run_id>.parquet (totais pré-calculados por execução)
+DIR_DATASET = os.getenv("DIR_DATASET_RESULTADOS", os.path.join("outputs", "dataset_resultados"))
+
+ESQUEMA = pa.schema([
+    ("ARQUIVO", pa.string()),
+    ("PASTA_ORIGEM", pa.string()),
+    ("STATUS_VISUAL", pa.string()),
+    ("LOCATARIO", pa.string()),
+    ("INICIO_VIGENCIA", pa.date32()),
+    ("FIM_VIGENCIA", pa.date32()),
+    ("DATA_PROVA", pa.date32()),
+    ("CUSTO_REGISTRO", pa.float64()),
+    ("VALOR_ALUGUEL", pa.float64()),
+    ("MOTIVO_GEMINI", pa.string()),
+    ("RUN_ID", pa.string()),
+    ("ACAO_RECOMENDADA", pa.string()),
+    ("DATA_EXECUCAO", pa.date32()),
+])
+PARTICIONAMENTO = ds.partitioning(
+    pa.schema([("ACAO_RECOMENDADA", pa.string()), ("DATA_EXECUCAO", pa.date32())]),
+    flavor="hive",
+)
+DIMENSOES_AGREGADAS = ["ACAO_RECOMENDADA", "DATA_EXECUCAO", "PASTA_ORIGEM", "STATUS_VISUAL", "ANO_FIM"]
+# A ação vira nome de diretório (partição Hive): só valores conhecidos, o resto cai em ERRO
+ACOES_CONHECIDAS = (
+    "ARQUIVO (SEGURO)",
+    "NAO_REGISTRAR (ECONOMIA)",
+    "NAO_REGISTRAR (SEM_VALIDADE)",
+    "REGISTRAR (PROTECAO_LONGO_PRAZO)",
+    "MANUAL",
+)
+
+
+def _como_data(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return None
+
+
+def _como_float(valor):
+    return float(valor) if isinstance(valor, (int, float)) else None
+
+
+def _acao_particao(valor):
+    """Ação do modelo -> valor de ACOES_CONHECIDAS (aceita texto explicativo após a ação) ou ERRO."""
+    acao = str(valor or "").strip().upper()
+    for conhecida in ACOES_CONHECIDAS:
+        if acao == conhecida or acao.startswith(conhecida + " "):
+            return conhecida
+    return "ERRO"
+
+
+def novo_run_id():
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def data_do_run(run_id):
+    return datetime.strptime(run_id[:8], "%Y%m%d").date()
+
+
+def gravar_lote(registros, run_id, data_execucao=None, dir_dataset=DIR_DATASET):
+    """Acrescenta um lote de registros ao dataset (incrementais entram no snapshot do run_id)."""
+    if not registros:
+        return
+    data_execucao = data_execucao or data_do_run(run_id)
+    colunas = {
+        "ARQUIVO": [r.get("ARQUIVO") for r in registros],
+        "PASTA_ORIGEM": [r.get("PASTA_ORIGEM") or "" for r in registros],
+        "STATUS_VISUAL": [r.get("STATUS_VISUAL") for r in registros],
+        "LOCATARIO": [r.get("LOCATARIO") for r in registros],
+        "INICIO_VIGENCIA": [_como_data(r.get("INICIO_VIGENCIA")) for r in registros],
+        "FIM_VIGENCIA": [_como_data(r.get("FIM_VIGENCIA")) for r in registros],
+        "DATA_PROVA": [_como_data(r.get("DATA_PROVA")) for r in registros],
+        "CUSTO_REGISTRO": [_como_float(r.get("CUSTO_REGISTRO")) for r in registros],
+        "VALOR_ALUGUEL": [_como_float(r.get("VALOR_ALUGUEL")) for r in registros],
+        "MOTIVO_GEMINI": [r.get("MOTIVO_GEMINI") for r in registros],
+        "RUN_ID": [run_id] * len(registros),
+        "ACAO_RECOMENDADA": [_acao_particao(r.get("ACAO_RECOMENDADA")) for r in registros],
+        "DATA_EXECUCAO": [data_execucao] * len(registros),
+    }
+    tabela = pa.table(colunas, schema=ESQUEMA)
+
+    ds.write_dataset(
+        tabela, dir_dataset, format="parquet", partitioning=PARTICIONAMENTO,
+        basename_template=f"parte-{run_id}-{uuid.uuid4().hex[:8]}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    _gravar_agregados(tabela, run_id, dir_dataset)
+
+
+def _gravar_agregados(tabela, run_id, dir_dataset):
+    """Totais por (ação, execução, pasta, status, ano de fim) — respostas instantâneas para o financeiro."""
+    ano_fim = pc.year(tabela["FIM_VIGENCIA"])
+    base = tabela.append_column("ANO_FIM", ano_fim)
+    agregados = base.group_by(DIMENSOES_AGREGADAS).aggregate([
+        ("ARQUIVO", "count"),
+        ("CUSTO_REGISTRO", "sum"),
+        ("VALOR_ALUGUEL", "sum"),
+    ])
+    dir_agregados = os.path.join(dir_dataset, "_agregados")
+    os.makedirs(dir_agregados, exist_ok=True)
+    pq.write_table(agregados, os.path.join(dir_agregados, f"{run_id}-{uuid.uuid4().hex[:8]}.parquet"))
+
+
+def _abrir(dir_dataset):
+    return ds.dataset(dir_dataset, format="parquet", partitioning=PARTICIONAMENTO,
+                      exclude_invalid_files=True, ignore_prefixes=["_", "."])
+
+
+def ultimo_run_id(dir_dataset=DIR_DATASET):
+    """RUN_ID da execução mais recente (lido só dos nomes dos arquivos de agregados)."""
+    runs = [os.path.basename(a).rsplit("-", 1)[0]
+            for a in glob.glob(os.path.join(dir_dataset, "_agregados", "*.parquet"))]
+    return max(runs) if runs else None
+
+
+def consultar(filtro=None, colunas=None, acoes=None, execucao="ultima", dir_dataset=DIR_DATASET):
+    """
+    Consulta com pushdown de predicado: partições fora de acoes/execucao nem são abertas
+    e o filtro restante é avaliado nas estatísticas dos row groups do Parquet.
+    execucao: "ultima" (snapshot mais recente), uma date (todas as execuções do dia) ou None.
+
+    Ex: contratos sem firma que atravessam 2027
+        consultar(filtro=(ds.field("STATUS_VISUAL") == "FÍSICA (SEM FIRMA)")
+                         & (ds.field("FIM_VIGENCIA") >= date(2027, 1, 1)))
+    """
+    condicoes = []
+    if execucao == "ultima":
+        run_id = ultimo_run_id(dir_dataset)
+        if run_id:
+            condicoes.append(ds.field("DATA_EXECUCAO") == pa.scalar(data_do_run(run_id), pa.date32()))
+            condicoes.append(ds.field("RUN_ID") == run_id)
+    elif execucao is not None:
+        condicoes.append(ds.field("DATA_EXECUCAO") == pa.scalar(execucao, pa.date32()))
+    if acoes:
+        condicoes.append(ds.field("ACAO_RECOMENDADA").isin(list(acoes)))
+    if filtro is not None:
+        condicoes.append(filtro)
+
+    expressao = None
+    for condicao in condicoes:
+        expressao = condicao if expressao is None else expressao & condicao
+    return _abrir(dir_dataset).to_table(filter=expressao, columns=colunas)
+
+
+def agregados(agrupar_por=("ACAO_RECOMENDADA",), execucao="ultima", dir_dataset=DIR_DATASET):
+    """
+    Totais (contratos, custo de registro, aluguel) a partir dos agregados pré-calculados.
+    Ex: custo total por pasta -> agregados(("PASTA_ORIGEM",))
+    """
+    arquivos = glob.glob(os.path.join(dir_dataset, "_agregados", "*.parquet"))
+    if execucao == "ultima":
+        run_id = ultimo_run_id(dir_dataset)
+        arquivos = [a for a in arquivos if os.path.basename(a).rsplit("-", 1)[0] == run_id]
+    if not arquivos:
+        return pa.table({})
+    tabela = pa.concat_tables([pq.read_table(a) for a in arquivos])
+    if execucao not in ("ultima", None):
+        tabela = tabela.filter(pc.equal(tabela["DATA_EXECUCAO"], pa.scalar(execucao, pa.date32())))
+    return tabela.group_by(list(agrupar_por)).aggregate([
+        ("ARQUIVO_count", "sum"),
+        ("CUSTO_REGISTRO_sum", "sum"),
+        ("VALOR_ALUGUEL_sum", "sum"),
+    ]).rename_columns(list(agrupar_por) + ["CONTRATOS", "CUSTO_REGISTRO_TOTAL", "VALOR_ALUGUEL_TOTAL"])
@@ -0,0 +1,298 @@
+import os
+import re
+import json
+import time
+import zlib
+import logging
+import threading
+import unicodedata
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+import fitz  # PyMuPDF
+import numpy as np
+
+# --- DEDUPLICAÇÃO LOCAL (antes de qualquer chamada de API) ---
+DEDUPE_ATIVO = os.getenv("DEDUPE_ATIVO", "1") == "1"
+NOME_INDICE = "_indice_duplicatas.jsonl"
+
+NUM_PERMUTACOES = 128
+BANDAS, LINHAS_POR_BANDA = 32, 4           # LSH: 32 bandas x 4 linhas = 128
+TAMANHO_SHINGLE = 5                        # palavras por shingle
+LIMIAR_JACCARD = float(os.getenv("DEDUPE_LIMIAR_JACCARD", "0.85"))
+MIN_SHINGLES = 30                          # abaixo disso o texto não é confiável (PDF escaneado)
+LIMIAR_HAMMING_PAGINA = int(os.getenv("DEDUPE_LIMIAR_HAMMING", "8"))       # 64 bits
+LIMIAR_HAMMING_ASSINATURA = int(os.getenv("DEDUPE_LIMIAR_ASSINATURA", "6"))
+# Busca de candidatos por imagem: o hash de 64 bits é cortado em LIMIAR+1 blocos; com
+# distância <= LIMIAR, ao menos um bloco é idêntico (pigeonhole), então nenhum candidato se perde
+BLOCOS_PHASH = min(64, LIMIAR_HAMMING_PAGINA + 1)
+# Trava entre processos (--trabalhador): arquivo .lock criado com O_EXCL; um .lock mais velho
+# que isso é de um processo que morreu segurando a trava e é descartado
+TRAVA_EXPIRA_SEGUNDOS = 30
+
+_PRIMO = (1 << 61) - 1
+_rng = np.random.RandomState(214)  # semente fixa: assinaturas comparáveis entre execuções
+_A = _rng.randint(1, 1 << 32, NUM_PERMUTACOES, dtype=np.uint64)
+_B = _rng.randint(0, 1 << 32, NUM_PERMUTACOES, dtype=np.uint64)
+
+
+def _normalizar_texto(texto):
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.findall(r"[a-z0-9]+", texto)
+
+
+def minhash(texto):
+    """Assinatura MinHash de shingles de palavras (None se o texto for curto demais)."""
+    palavras = _normalizar_texto(texto)
+    shingles = {
+        zlib.crc32(" ".join(palavras[i:i + TAMANHO_SHINGLE]).encode())
+        for i in range(max(0, len(palavras) - TAMANHO_SHINGLE + 1))
+    }
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    valores = np.fromiter(shingles, dtype=np.uint64)
+    # (a*x + b) mod p para todas as permutações de uma vez (x < 2^32, a < 2^32: sem overflow)
+    hashes = (np.outer(_A, valores) + _B[:, None]) % _PRIMO
+    return hashes.min(axis=1).astype(np.uint64)
+
+
+def _reduzir(img, largura, altura):
+    """Reduz a imagem em tons de cinza para largura x altura pela média de blocos."""
+    linhas = np.linspace(0, img.shape[0], altura + 1).astype(int)[:-1]
+    colunas = np.linspace(0, img.shape[1], largura + 1).astype(int)[:-1]
+    somas = np.add.reduceat(np.add.reduceat(img.astype(np.float64), linhas, axis=0), colunas, axis=1)
+    contagens = np.outer(np.diff(np.append(linhas, img.shape[0])), np.diff(np.append(colunas, img.shape[1])))
+    return somas / contagens
+
+
+def dhash_pagina(pagina):
+    """Hash perceptual (dHash 64 bits) da página renderizada em baixa resolução."""
+    zoom = 96 / max(pagina.rect.width, 1)
+    pix = pagina.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY)
+    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+    pequena = _reduzir(img, 9, 8)
+    bits = (pequena[:, 1:] > pequena[:, :-1]).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def impressao_documento(doc, texto=None):
+    """Impressão de um documento já aberto; texto = camada de texto já extraída (evita reler as páginas)."""
+    if texto is None:
+        texto = "\n".join(pagina.get_text() for pagina in doc)
+    primeira = dhash_pagina(doc[0]) if len(doc) else 0
+    ultima = dhash_pagina(doc[-1]) if len(doc) else 0
+    paginas = len(doc)
+    assinatura = minhash(texto)
+    return {
+        "minhash": assinatura.tolist() if assinatura is not None else None,
+        "phash_primeira": primeira,
+        "phash_ultima": ultima,
+        "paginas": paginas,
+    }
+
+
+def _bandas(assinatura):
+    for banda in range(BANDAS):
+        inicio = banda * LINHAS_POR_BANDA
+        yield (banda, tuple(assinatura[inicio:inicio + LINHAS_POR_BANDA]))
+
+
+_LIMITES_BLOCOS = [round(64 * i / BLOCOS_PHASH) for i in range(BLOCOS_PHASH + 1)]
+
+
+def _blocos_phash(valor):
+    # BLOCOS_PHASH fatias contíguas (7-8 bits cada com o limiar padrão 8)
+    return [(i, (valor >> inicio) & ((1 << (fim - inicio)) - 1))
+            for i, (inicio, fim) in enumerate(zip(_LIMITES_BLOCOS, _LIMITES_BLOCOS[1:]))]
+
+
+@contextmanager
+def _trava_arquivo(caminho):
+    """Exclusão mútua entre processos sobre `caminho` (vale também entre threads)."""
+    trava = f"{caminho}.lock"
+    while True:
+        try:
+            os.close(os.open(trava, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(trava) > TRAVA_EXPIRA_SEGUNDOS:
+                    os.remove(trava)
+                    logging.warning(f"Dedupe: trava abandonada removida ({trava})")
+                    continue
+            except OSError:
+                continue  # o dono liberou entre o open e o getmtime
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(trava)
+        except OSError:
+            pass
+
+
+def gravar_json_atomico(caminho, pacote):
+    """Grava no temporário e troca: um processo morto no meio nunca deixa um RAW truncado."""
+    temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(pacote, f, indent=4, ensure_ascii=False)
+    os.replace(temporario, caminho)  # atômico: nenhum leitor vê um RAW pela metade
+
+
+def perfil_documento(entrada):
+    """
+    O que decide a ação e as imagens não mostram: uma assinatura PAdES invisível não muda a
+    última página, mas muda status/data. Só documentos com o mesmo perfil são agrupados.
+    entrada: a entrada do manifesto (assinaturas + pre_classificacao).
+    """
+    assinaturas = entrada.get("assinaturas") or {}
+    pre = entrada.get("pre_classificacao") or {}
+    return {
+        "assinaturas": len(assinaturas.get("assinaturas") or []),
+        "status_assinatura": assinaturas.get("status"),
+        "data_assinatura": assinaturas.get("data_evidencia"),
+        "status_pre": pre.get("status"),
+    }
+
+
+class IndiceDuplicatas:
+    """
+    Índice LSH persistente (JSONL no Data Lake) dos representantes já extraídos.
+    Vários trabalhadores acrescentam ao mesmo arquivo: antes de buscar ou adicionar,
+    as linhas novas gravadas por outros processos são lidas a partir da última posição.
+    """
+    def __init__(self, pasta_saida):
+        self.caminho = os.path.join(pasta_saida, NOME_INDICE)
+        self.entradas = []
+        self.baldes_texto = defaultdict(set)
+        self.baldes_imagem = defaultdict(set)
+        self._trava = threading.Lock()
+        self._posicao = 0
+        self._recarregar()
+
+    def _recarregar(self):
+        # Só linhas completas: uma linha sendo escrita agora fica para a próxima leitura
+        try:
+            with open(self.caminho, 'rb') as f:
+                f.seek(self._posicao)
+                novo = f.read()
+        except FileNotFoundError:
+            return
+        fim = novo.rfind(b"\n") + 1
+        for linha in novo[:fim].splitlines():
+            if linha.strip():
+                self._indexar(json.loads(linha))
+        self._posicao += fim
+
+    def _indexar(self, entrada):
+        idx = len(self.entradas)
+        self.entradas.append(entrada)
+        if entrada["minhash"] is not None:
+            for chave in _bandas(entrada["minhash"]):
+                self.baldes_texto[chave].add(idx)
+        for chave in _blocos_phash(entrada["phash_primeira"]):
+            self.baldes_imagem[chave].add(idx)
+
+    def buscar(self, impressao, perfil):
+        """Retorna (entrada_representante, detalhes) do quase-duplicado mais próximo, ou None."""
+        with self._trava:
+            self._recarregar()
+        candidatos = set()
+        if impressao["minhash"] is not None:
+            for chave in _bandas(impressao["minhash"]):
+                candidatos |= self.baldes_texto.get(chave, set())
+        for chave in _blocos_phash(impressao["phash_primeira"]):
+            candidatos |= self.baldes_imagem.get(chave, set())
+
+        melhor = None
+        for idx in candidatos:
+            entrada = self.entradas[idx]
+            # Assinatura embutida ou status local diferentes: o duplicado herdaria a ação errada.
+            # Entradas de índices antigos (sem perfil) não são verificáveis e nunca casam.
+            if entrada.get("perfil") != perfil:
+                continue
+            # Páginas de assinatura diferentes (ex: cópia assinada x não assinada) nunca são agrupadas
+            dist_assinatura = hamming(impressao["phash_ultima"], entrada["phash_ultima"])
+            if dist_assinatura > LIMIAR_HAMMING_ASSINATURA:
+                continue
+            dist_capa = hamming(impressao["phash_primeira"], entrada["phash_primeira"])
+            if impressao["minhash"] is not None and entrada["minhash"] is not None:
+                jaccard = float(np.mean(np.array(impressao["minhash"]) == np.array(entrada["minhash"])))
+                if jaccard < LIMIAR_JACCARD:
+                    continue
+            else:
+                # Sem camada de texto: decide só pelas imagens
+                jaccard = None
+                if dist_capa > LIMIAR_HAMMING_PAGINA:
+                    continue
+            pontuacao = (jaccard or 0.0, -dist_capa - dist_assinatura)
+            if melhor is None or pontuacao > melhor[0]:
+                melhor = (pontuacao, entrada, {
+                    "similaridade_texto": round(jaccard, 3) if jaccard is not None else None,
+                    "distancia_capa": dist_capa,
+                    "distancia_assinatura": dist_assinatura,
+                })
+        return (melhor[1], melhor[2]) if melhor else None
+
+    def adicionar(self, impressao, perfil, caminho_raw, arquivo):
+        entrada = dict(impressao, perfil=perfil, caminho_raw=caminho_raw, arquivo=arquivo)
+        with self._trava, _trava_arquivo(self.caminho):
+            with open(self.caminho, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entrada) + "\n")
+            # Relê a partir da última posição: indexa a própria linha e as de outros processos
+            self._recarregar()
+
+
+_INDICES = {}
+
+
+def obter_indice(pasta_saida):
+    if pasta_saida not in _INDICES:
+        _INDICES[pasta_saida] = IndiceDuplicatas(pasta_saida)
+    return _INDICES[pasta_saida]
+
+
+def registrar_duplicata(caminho_salvamento, arquivo, pasta_origem, representante, detalhes, proprios=None):
+    """
+    Grava o RAW do duplicado reaproveitando a resposta do representante (sem API)
+    e acrescenta o membro ao grupo no RAW do representante.
+    proprios: campos do próprio duplicado que substituem os do representante
+    (assinaturas_pdf, pre_classificacao: o 02_processador os aplica por cima da resposta).
+    Retorna False (nada gravado) se o RAW do representante não puder ser lido:
+    quem chamou segue com a extração normal.
+    """
+    caminho_rep = representante["caminho_raw"]
+    # Trava: dois trabalhadores com duplicatas do mesmo representante não perdem membros
+    with _trava_arquivo(caminho_rep):
+        try:
+            with open(caminho_rep, 'r', encoding='utf-8') as f:
+                pacote_rep = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"    Representante {representante['arquivo']} ilegível ({e}): extração normal")
+            return False
+
+        grupo = pacote_rep.setdefault("dedupe", {
+            "grupo": os.path.basename(caminho_rep), "representante": representante["arquivo"]
+        })
+        grupo.setdefault("membros", []).append({"arquivo": arquivo, "pasta_origem": pasta_origem, **detalhes})
+        gravar_json_atomico(caminho_rep, pacote_rep)
+
+    # Métricas ficam só no representante: a chamada de API aconteceu uma única vez
+    pacote = {k: v for k, v in pacote_rep.items() if k not in ("dedupe", "metricas_chamada")}
+    pacote.update({
+        "arquivo_origem": arquivo,
+        "pasta_origem": pasta_origem,
+        "timestamp": datetime.now().isoformat(),
+        "dedupe": {"grupo": grupo["grupo"], "representante": representante["arquivo"], "duplicata_de": representante["arquivo"], **detalhes},
+        **(proprios or {}),
+    })
+    gravar_json_atomico(caminho_salvamento, pacote)
+    logging.info(f"    Quase-duplicado de {representante['arquivo']} ({detalhes}): API não chamada")
+    return True
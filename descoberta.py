@@ -0,0 +1,119 @@
+import os
+import fnmatch
+
+# --- DESCOBERTA DE ARQUIVOS (sob demanda, recursiva) ---
+# Padrões glob separados por vírgula, relativos à pasta de entrada (ex: "2024/*,*/assinados/*")
+PADROES_INCLUIR = [p.strip() for p in os.getenv("DESCOBERTA_INCLUIR", "").split(",") if p.strip()]
+PADROES_EXCLUIR = [p.strip() for p in os.getenv("DESCOBERTA_EXCLUIR", "").split(",") if p.strip()]
+RECURSIVO = os.getenv("DESCOBERTA_RECURSIVA", "1") == "1"
+
+SUFIXO_RAW = "_RAW.json"
+
+
+def _casa(relativo, padroes):
+    relativo = relativo.replace(os.sep, "/").lower()
+    return any(fnmatch.fnmatchcase(relativo, p.lower()) for p in padroes)
+
+
+def descobrir_arquivos(raiz, extensoes=(".pdf",), incluir=None, excluir=None, recursivo=None):
+    """
+    Gera os caminhos dos arquivos à medida que os.scandir os encontra (nada é
+    materializado antes do primeiro resultado). Extensões sem diferenciar maiúsculas;
+    pastas que casam com "excluir" nem são visitadas.
+    """
+    incluir = PADROES_INCLUIR if incluir is None else incluir
+    excluir = PADROES_EXCLUIR if excluir is None else excluir
+    recursivo = RECURSIVO if recursivo is None else recursivo
+    extensoes = tuple(e.lower() for e in extensoes)
+
+    pilha = [raiz]
+    while pilha:
+        pasta = pilha.pop()
+        try:
+            entradas = os.scandir(pasta)
+        except OSError:
+            continue
+        with entradas:
+            subpastas = []
+            for entrada in entradas:
+                try:
+                    eh_pasta = entrada.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if eh_pasta:
+                    # "arquivo_morto/*" também poda a própria pasta
+                    relativo = os.path.relpath(entrada.path, raiz) + "/"
+                    if recursivo and not (excluir and _casa(relativo, excluir)):
+                        subpastas.append(entrada.path)
+                    continue
+                if not entrada.name.lower().endswith(extensoes):
+                    continue
+                relativo = os.path.relpath(entrada.path, raiz)
+                if excluir and _casa(relativo, excluir):
+                    continue
+                if incluir and not _casa(relativo, incluir):
+                    continue
+                yield entrada.path
+        # Ordem estável (alfabética) dentro de cada nível
+        pilha.extend(sorted(subpastas, reverse=True))
+
+
+def aceita_arquivo(caminho, raiz, extensoes=(".pdf",), incluir=None, excluir=None):
+    """Mesmos critérios de descobrir_arquivos para um caminho avulso (ex: evento do vigia)."""
+    incluir = PADROES_INCLUIR if incluir is None else incluir
+    excluir = PADROES_EXCLUIR if excluir is None else excluir
+    if not os.path.basename(caminho).lower().endswith(tuple(e.lower() for e in extensoes)):
+        return False
+    relativo = os.path.relpath(caminho, raiz)
+    if excluir and _casa(relativo, excluir):
+        return False
+    return not incluir or _casa(relativo, incluir)
+
+
+def indice_lake(pasta_saida, sufixo=SUFIXO_RAW):
+    """Nomes (sem sufixo) já presentes no Data Lake, lidos com um único scandir."""
+    if not pasta_saida or not os.path.isdir(pasta_saida):
+        return set()
+    with os.scandir(pasta_saida) as entradas:
+        return {e.name[:-len(sufixo)] for e in entradas if e.name.endswith(sufixo)}
+
+
+def nome_lake(caminho, raiz):
+    """
+    Nome do pacote RAW (sem sufixo). Arquivos na raiz mantêm o nome histórico;
+    os de subpastas levam a subpasta no nome para homônimos não colidirem.
+    """
+    nome_safe = os.path.splitext(os.path.basename(caminho))[0]
+    pasta = pasta_relativa(caminho, raiz)
+    if not pasta:
+        return nome_safe
+    return f"{pasta.replace('/', '__')}__{nome_safe}"
+
+
+def arquivos_pendentes(raiz, pasta_saida, extensoes=(".pdf",), estatisticas=None, **filtros):
+    """
+    Gera (caminho_arquivo, caminho_salvamento) só para o que ainda não está no lake.
+    A checagem é feita no índice em memória, sem um stat por arquivo.
+    """
+    ja_processados = indice_lake(pasta_saida)
+    if estatisticas is not None:
+        estatisticas.setdefault("pulados", 0)
+        estatisticas.setdefault("pendentes", 0)
+
+    for caminho in descobrir_arquivos(raiz, extensoes, **filtros):
+        nome = nome_lake(caminho, raiz)
+        if nome in ja_processados:
+            if estatisticas is not None:
+                estatisticas["pulados"] += 1
+            continue
+        # Reserva o nome (ex: "a.pdf" e "a.PDF" na mesma pasta geram um único RAW)
+        ja_processados.add(nome)
+        if estatisticas is not None:
+            estatisticas["pendentes"] += 1
+        yield caminho, os.path.join(pasta_saida, f"{nome}{SUFIXO_RAW}")
+
+
+def pasta_relativa(caminho, raiz):
+    """Subpasta de origem relativa à raiz ('' para a raiz), gravada nos pacotes RAW."""
+    relativo = os.path.relpath(os.path.dirname(caminho), raiz)
+    return "" if relativo == "." else relativo.replace(os.sep, "/")
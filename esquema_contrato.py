@@ -0,0 +1,269 @@
+import os
+import re
+import json
+import logging
+import unicodedata
+from collections import Counter
+from datetime import datetime
+
+# --- ESQUEMA DO REGISTRO DE LOCAÇÃO (o mesmo JSON pedido nos prompts) ---
+STATUS_VALIDOS = [
+    "DIGITAL (GOV/ICP)",
+    "FÍSICA (COM FIRMA)",
+    "FÍSICA (SEM FIRMA)",
+    "NÃO ASSINADO",
+]
+
+# campo -> (tipo, obrigatório, anulável)
+CAMPOS = {
+    "status": ("status", True, False),
+    "data_evidencia": ("data", False, True),
+    "descricao_prova": ("texto", False, True),
+    "locador": ("texto", True, True),
+    "locatario": ("texto", True, True),
+    "data_inicio_contrato": ("data", True, False),
+    "data_fim_contrato": ("data", True, False),
+    "moeda": ("texto", False, True),
+    "valor_aluguel_mensal_float": ("dinheiro", True, False),
+    "base_calculo_12_meses_float": ("dinheiro", False, True),
+    "custo_registro_cartorio_float": ("dinheiro", True, False),
+    "memoria_calculo": ("texto", False, True),
+}
+
+# Modelos do OpenRouter que aceitam response_format json_schema (ajustável via .env).
+# Os modelos usados hoje nos scripts (anthropic/claude-3.5-sonnet, nvidia/nemotron-nano-12b-v2-vl:free,
+# xiaomi/mimo-v2-flash:free) NÃO estão aqui: o OpenRouter não garante json_schema para eles, e um
+# response_format recusado derruba a chamada. Para eles o esquema vai só no prompt e a resposta
+# passa por revisar_resposta; saída estruturada de fato, só Gemini (aqui e no gemini_google) e OpenAI.
+MODELOS_SAIDA_ESTRUTURADA = set(filter(None, os.getenv(
+    "MODELOS_SAIDA_ESTRUTURADA",
+    "google/gemini-2.0-flash-001,google/gemini-2.5-flash,openai/gpt-4o,openai/gpt-4o-mini"
+).split(",")))
+
+# Formatos aceitos por normalizar_data (02_processador), despachados por regex
+_RE_DATA = re.compile(
+    r"^(?:(?P<d1>\d{1,2})(?P<s1>[/.-])(?P<m1>\d{1,2})(?P=s1)(?P<y1>\d{4})"
+    r"|(?P<y2>\d{4})(?P<s2>[/-])(?P<m2>\d{1,2})(?P=s2)(?P<d2>\d{1,2}))$"
+)
+_RE_DINHEIRO = re.compile(r"^\s*(?:R?\$)?\s*-?[\d.,]+\s*$")
+
+
+def _sem_acento(texto):
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+
+_STATUS_CANONICO = {re.sub(r"\s+", " ", _sem_acento(s)).upper(): s for s in STATUS_VALIDOS}
+
+
+def _checar_texto(valor):
+    if isinstance(valor, str):
+        return valor.strip() or None, None
+    return None, "esperado texto"
+
+
+def _checar_status(valor):
+    if not isinstance(valor, str):
+        return None, "esperado texto"
+    chave = re.sub(r"\s+", " ", _sem_acento(valor)).strip().upper()
+    if chave in _STATUS_CANONICO:
+        return _STATUS_CANONICO[chave], None
+    return None, f"status fora do enum: {valor!r}"
+
+
+def _checar_data(valor):
+    if not isinstance(valor, str):
+        return None, "esperado data DD/MM/AAAA"
+    m = _RE_DATA.match(valor.strip())
+    if not m:
+        return None, f"formato de data inválido: {valor!r}"
+    g = m.groupdict()
+    try:
+        if g["d1"]:
+            datetime(int(g["y1"]), int(g["m1"]), int(g["d1"]))
+        else:
+            datetime(int(g["y2"]), int(g["m2"]), int(g["d2"]))
+    except ValueError:
+        return None, f"data inexistente: {valor!r}"
+    return valor.strip(), None
+
+
+def _checar_dinheiro(valor):
+    if isinstance(valor, bool):
+        return None, "esperado número"
+    if isinstance(valor, (int, float)):
+        return (float(valor), None) if valor >= 0 else (None, "valor negativo")
+    if isinstance(valor, str) and _RE_DINHEIRO.match(valor):
+        return valor, None
+    return None, f"valor monetário inválido: {valor!r}"
+
+
+_CHECADORES = {
+    "texto": _checar_texto,
+    "status": _checar_status,
+    "data": _checar_data,
+    "dinheiro": _checar_dinheiro,
+}
+
+# "Compila" o esquema uma única vez: lista de (campo, checador, obrigatório, anulável)
+_ESQUEMA_COMPILADO = [
+    (campo, _CHECADORES[tipo], obrigatorio, anulavel)
+    for campo, (tipo, obrigatorio, anulavel) in CAMPOS.items()
+]
+
+
+def validar_registro(dados):
+    """
+    Valida um registro contra o esquema compilado.
+    Retorna (registro_limpo, erros) onde erros é {campo: motivo}.
+    """
+    limpo = dict(dados)
+    erros = {}
+    for campo, checar, obrigatorio, anulavel in _ESQUEMA_COMPILADO:
+        valor = dados.get(campo)
+        if valor is None or (isinstance(valor, str) and valor.strip().lower() in ("", "null")):
+            limpo[campo] = None
+            if obrigatorio and not anulavel:
+                erros[campo] = "ausente"
+            continue
+        normalizado, erro = checar(valor)
+        if erro:
+            erros[campo] = erro
+            limpo[campo] = None
+        else:
+            limpo[campo] = normalizado
+    return limpo, erros
+
+
+def validar_lote(registros):
+    """Valida vários registros de uma vez. Retorna (limpos, erros_por_registro, contagem_por_campo)."""
+    limpos, todos_erros = [], []
+    contagem = Counter()
+    for dados in registros:
+        limpo, erros = validar_registro(dados)
+        limpos.append(limpo)
+        todos_erros.append(erros)
+        contagem.update(erros.keys())
+    return limpos, todos_erros, contagem
+
+
+def extrair_json(texto_cru):
+    """
+    Localiza o primeiro objeto JSON válido no texto (ignora conversa e cercas ```json).
+    Retorna (dict, None) ou (None, motivo) — nunca engole o erro em silêncio.
+    """
+    if not texto_cru:
+        return None, "resposta vazia"
+    decodificador = json.JSONDecoder()
+    ultimo_erro = "nenhum objeto JSON encontrado"
+    pos = texto_cru.find("{")
+    while pos != -1:
+        try:
+            objeto, _ = decodificador.raw_decode(texto_cru, pos)
+            if isinstance(objeto, dict):
+                return objeto, None
+        except json.JSONDecodeError as e:
+            ultimo_erro = f"JSON inválido: {e.msg} (posição {e.pos})"
+        pos = texto_cru.find("{", pos + 1)
+    return None, ultimo_erro
+
+
+# --- SAÍDA ESTRUTURADA (JSON Schema / responseSchema) ---
+_TIPOS_JSON = {"texto": "string", "status": "string", "data": "string", "dinheiro": "number"}
+
+
+def esquema_json():
+    """JSON Schema do registro (formato OpenAI/OpenRouter)."""
+    propriedades = {}
+    for campo, (tipo, _, anulavel) in CAMPOS.items():
+        prop = {"type": [_TIPOS_JSON[tipo], "null"] if anulavel else _TIPOS_JSON[tipo]}
+        if tipo == "status":
+            prop["enum"] = STATUS_VALIDOS
+        if tipo == "data":
+            prop["description"] = "Data no formato DD/MM/AAAA"
+        propriedades[campo] = prop
+    return {
+        "type": "object",
+        "properties": propriedades,
+        "required": list(CAMPOS),
+        "additionalProperties": False,
+    }
+
+
+_SEM_ESQUEMA_AVISADOS = set()
+
+
+def response_format_para(modelo):
+    """response_format para chat.completions, ou None se o modelo não suportar esquema."""
+    if modelo not in MODELOS_SAIDA_ESTRUTURADA:
+        if modelo not in _SEM_ESQUEMA_AVISADOS:
+            _SEM_ESQUEMA_AVISADOS.add(modelo)
+            logging.info(f"{modelo}: sem saída estruturada (esquema só no prompt + revisão local)")
+        return None
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "contrato_locacao", "strict": True, "schema": esquema_json()},
+    }
+
+
+def esquema_gemini():
+    """responseSchema do Gemini (subconjunto OpenAPI: tipos em maiúsculas + nullable)."""
+    propriedades = {}
+    for campo, (tipo, _, anulavel) in CAMPOS.items():
+        prop = {"type": _TIPOS_JSON[tipo].upper(), "nullable": anulavel}
+        if tipo == "status":
+            prop["enum"] = STATUS_VALIDOS
+        propriedades[campo] = prop
+    return {"type": "OBJECT", "properties": propriedades, "required": list(CAMPOS)}
+
+
+# --- RE-EXTRAÇÃO SOMENTE DOS CAMPOS INVÁLIDOS ---
+def montar_prompt_correcao(erros):
+    """Pergunta curta que pede ao modelo apenas os campos que falharam na validação."""
+    linhas = "\n".join(f"- {campo}: {motivo}" for campo, motivo in erros.items())
+    modelo = json.dumps({campo: "..." for campo in erros}, ensure_ascii=False)
+    return (
+        "Os campos abaixo vieram ausentes ou inválidos na sua análise anterior deste contrato:\n"
+        f"{linhas}\n\n"
+        f"Status permitidos: {', '.join(STATUS_VALIDOS)}. Datas em DD/MM/AAAA. Valores como número.\n"
+        f"Retorne APENAS o JSON com esses campos: {modelo}"
+    )
+
+
+def aplicar_correcao(texto_correcao, erros):
+    """Aceita da resposta de correção somente os campos pedidos que agora passam na validação."""
+    dados, motivo = extrair_json(texto_correcao)
+    if dados is None:
+        logging.warning(f"Correção de campos ilegível: {motivo}")
+        return {}
+    corrigidos = {}
+    for campo in erros:
+        if campo not in dados:
+            continue
+        limpo, novos_erros = validar_registro({campo: dados[campo]})
+        if campo not in novos_erros and limpo[campo] is not None:
+            corrigidos[campo] = limpo[campo]
+    return corrigidos
+
+
+def revisar_resposta(resposta_raw, reconsultar, campos_locais=None):
+    """
+    Valida a resposta bruta e, se houver campos inválidos, pede ao modelo
+    (uma única vez) somente esses campos via reconsultar(pergunta).
+    Campos já resolvidos localmente (campos_locais) não são pedidos de novo.
+    Retorna (campos_corrigidos, campos_ainda_invalidos).
+    """
+    dados, motivo = extrair_json(resposta_raw)
+    if dados is None:
+        # Sem objeto aproveitável: não há campo isolado a corrigir
+        return {}, {"*": motivo}
+    _, erros = validar_registro(dados)
+    if not erros:
+        return {}, {}
+
+    corrigidos = {c: v for c, v in (campos_locais or {}).items() if c in erros and v is not None}
+    pendentes = {c: m for c, m in erros.items() if c not in corrigidos}
+    if pendentes:
+        logging.info(f"    Re-extraindo {len(pendentes)} campo(s) inválido(s): {', '.join(pendentes)}")
+        corrigidos.update(aplicar_correcao(reconsultar(montar_prompt_correcao(pendentes)), pendentes))
+    restantes = {c: m for c, m in erros.items() if c not in corrigidos}
+    return corrigidos, restantes
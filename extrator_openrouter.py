@@ -0,0 +1,438 @@
+import os
+import importlib
+import base64
+import time
+import logging
+from datetime import datetime
+from configuracao import PASTA_ENTRADA, cliente_openrouter, garantir_pasta, configurar_logging
+from resiliencia import executar_com_retry, ErroRecuperavel, Prazo
+from streaming_json import coletar_objeto_json
+from esquema_contrato import response_format_para, revisar_resposta
+from pre_classificador import PRE_CLASSIFICADOR_ATIVO, ECONOMIA, campos_confiaveis
+from roi_render import MODO_ROI, renderizar_paginas_roi
+from cache_render import CACHE_RENDER_ATIVO, CACHE, paginas_jpeg
+from mosaico import MODO_MOSAICO, mosaicos_jpeg
+from hedging import HEDGE_ATIVO, HEDGE, consultar_gemini_secundario
+from assinatura_pdf import campos_da_assinatura
+from deduplicacao import DEDUPE_ATIVO, obter_indice, registrar_duplicata, perfil_documento, gravar_json_atomico
+from manifesto import obter_manifesto, legivel
+from descoberta import arquivos_pendentes, pasta_relativa, aceita_arquivo, nome_lake
+from vigia import VigiaPasta
+from fila_trabalho import FilaTrabalho, executar_trabalhador, lease_valido
+from priorizacao import PRIORIZAR, FilaPriorizada, priorizar
+from log_estruturado import etapa
+
+# --- PIPELINE DE VISÃO VIA OPENROUTER ---
+# Comum ao 3_claude_open_router.py e ao modelos_aleatorios.py: cada um só escolhe
+# o modelo, o perfil do mosaico e a pasta do lake.
+
+# Configuração da API (cliente criado na primeira chamada)
+TITULO_API = "Auditor Contratos (Pedro)"
+# Streaming opt-in (MODO_STREAM=1): encerra a geração assim que o JSON fecha
+MODO_STREAM = os.getenv("MODO_STREAM", "0") == "1"
+
+# --- PROMPT MANTIDO EXATAMENTE COMO SOLICITADO ---
+PROMPT_SISTEMA = """
+    Você é um perito forense e calculista judicial especializado em contratos de locação. Sua missão é validar contratos de aluguel e calcular as custas de registro em cartório com base no valor mensal do contrato.
+
+### Seu Processo de Análise
+
+#### Etapa 1: Extração de Dados do Contrato
+
+Analise o documento fornecido e extraia as seguintes informações:
+
+- **Valor do Aluguel Mensal**: Localize "Valor do Aluguel" ou "Aluguel Mensal" no contrato. Ignore completamente taxas de condomínio, IPTU ou outras despesas — foque apenas no aluguel puro.
+- **Status de Assinatura**: Classifique como:
+  - DIGITAL (GOV/ICP): Se houver logos Gov.br, DocuSign, ou certificação ICP-Brasil
+  - FÍSICA (COM FIRMA): Se houver selos ou carimbos de cartório
+  - FÍSICA (SEM FIRMA): Se houver apenas assinaturas à caneta
+  - NÃO ASSINADO: Se o documento estiver em branco ou sem assinatura
+- **Partes do Contrato**: Identifique o nome completo do locador e do locatário
+- **Vigência**: Extraia a data de início e data de término do contrato
+
+#### Etapa 2: Cálculo da Base de Cálculo Anual
+
+Para fins de registro em cartório, a base de cálculo segue a regra de 12 meses:
+
+Base de Cálculo Anual = Valor Aluguel Mensal × 12
+
+#### Etapa 3: Consulta da Tabela de Custas de Registro
+
+Use a Base de Cálculo Anual obtida na Etapa 2 e consulte a tabela abaixo para identificar a faixa correspondente e a taxa exata a pagar:
+
+| Faixa de Valor da Base de Cálculo (R$) | Taxa a Pagar (R$) |
+|:---|:---|
+| Até 3.200,00 | 319,12 |
+| De 3.200,01 a 8.000,00 | 483,68 |
+| De 8.000,01 a 12.000,00 | 522,76 |
+| De 12.000,01 a 16.000,00 | 562,54 |
+| De 16.000,01 a 24.000,00 | 642,22 |
+| De 24.000,01 a 32.000,00 | 723,98 |
+| De 32.000,01 a 47.000,00 | 799,68 |
+| De 47.000,01 a 63.000,00 | 881,24 |
+| De 63.000,01 a 78.000,00 | 967,68 |
+| De 78.000,01 a 118.000,00 | 1.030,66 |
+| De 118.000,01 a 160.000,00 | 1.115,10 |
+| De 160.000,01 a 235.000,00 | 1.805,16 |
+| De 235.000,01 a 350.000,00 | 2.708,06 |
+| De 350.000,01 a 530.000,00 | 4.067,28 |
+| de 530.000,01 a 800.000,00 | 6.099,38 |
+| de 800.000,01 a 1.200.000,00  | 9.147,62 |
+| de 1.200.000,01 a 4.000.000,00| 18.551,68|
+|apartir de 4.000.000,01 | 24.117,28 |
+
+### Formato de Retorno
+
+Retorne APENAS o seguinte JSON (sem formatação markdown, sem explicações adicionais):
+
+```json
+{
+  "status": "CATEGORIA_ASSINATURA",
+  "data_evidencia": "DD/MM/AAAA ou null",
+  "descricao_prova": "Descrição do que foi observado no documento",
+  "locador": "Nome completo do locador",
+  "locatario": "Nome completo do locatário",
+  "data_inicio_contrato": "DD/MM/AAAA",
+  "data_fim_contrato": "DD/MM/AAAA",
+  "moeda": "BRL",
+  "valor_aluguel_mensal_float": 0.00,
+  "base_calculo_12_meses_float": 0.00,
+  "custo_registro_cartorio_float": 0.00,
+  "memoria_calculo": "Detalhamento: Aluguel [valor] × 12 = [base] → Faixa [intervalo] → Taxa [custo]"
+}
+```
+
+### Informações a Processar
+
+Proceda com a análise completa seguindo as três etapas acima e retorne apenas o JSON solicitado.
+    """
+
+
+class ExtratorOpenRouter:
+    """
+    Extração RAW de contratos por um modelo de visão do OpenRouter.
+    modelo: id do OpenRouter; perfil_mosaico: chave de mosaico.PERFIS;
+    pasta_saida: lake RAW do backend; fila_trabalho_db: fila do modo --trabalhador
+    (padrão: _fila_trabalho.sqlite dentro do lake, visível para todos os hosts).
+    """
+    def __init__(self, modelo, perfil_mosaico, pasta_saida, fila_trabalho_db=None):
+        self.modelo = modelo
+        self.perfil_mosaico = perfil_mosaico
+        self.pasta_saida = pasta_saida
+        self.fila_trabalho_db = fila_trabalho_db or os.path.join(pasta_saida or ".", "_fila_trabalho.sqlite")
+
+    def preparar_execucao(self):
+        """Pastas e logs só quando algo vai de fato rodar (importar o módulo não tem efeito colateral)."""
+        garantir_pasta(self.pasta_saida)
+        configurar_logging("extracao")
+
+    def converter_pdf_para_vision(self, caminho_pdf, paginas_assinatura=True, metricas_render=None, mosaico=None):
+        """
+        Converte páginas do PDF em imagens Base64 para envio à IA.
+        paginas_assinatura=False: sem as páginas finais de assinatura (já lida do PDF) em documentos longos.
+        Com RENDER_ROI=1, cada página vai em resolução de leitura + recortes em zoom alto
+        dos selos/assinaturas; a economia estimada é gravada em metricas_render.
+        Com mosaico (padrão: MODO_MOSAICO), as páginas de cada bloco vão juntas numa imagem só.
+        """
+        imagens_b64 = []
+        mosaico = MODO_MOSAICO if mosaico is None else mosaico
+        try:
+            # Nº de páginas vem do manifesto: com o cache de render quente, o PDF nem é aberto
+            entrada = obter_manifesto().obter(caminho_pdf)
+            total_pags = entrada["paginas"]
+
+            # Estratégia de Economia: 2 primeiras (valores/prazo) + 3 últimas (assinaturas)
+            # Sem as páginas de assinatura (já lidas do PDF), saem só as finais que o corte acrescentaria;
+            # até 6 páginas vai tudo, porque as últimas também podem ter valor/prazo
+            if total_pags > 6:
+                indices = list(range(3))
+                if paginas_assinatura:
+                    indices += list(range(total_pags - 2, total_pags))
+            else:
+                indices = range(total_pags)
+
+            if mosaico:
+                jpegs, relatorio = mosaicos_jpeg(caminho_pdf, indices, self.perfil_mosaico, entrada["tamanhos_pagina"])
+                if metricas_render is not None:
+                    metricas_render.update(relatorio)
+                return [f"data:image/jpeg;base64,{base64.b64encode(b).decode('utf-8')}" for b in jpegs]
+
+            if MODO_ROI:
+                jpegs, relatorio = renderizar_paginas_roi(None, indices, caminho_pdf=caminho_pdf)
+                if metricas_render is not None:
+                    metricas_render.update(relatorio)
+                return [f"data:image/jpeg;base64,{base64.b64encode(b).decode('utf-8')}" for b in jpegs]
+
+            # Zoom 2.0x essencial para ler números pequenos e tabelas (páginas já rasterizadas vêm do cache)
+            for img_bytes in paginas_jpeg(caminho_pdf, indices, zoom=2.0):
+                b64_str = base64.b64encode(img_bytes).decode('utf-8')
+                imagens_b64.append(f"data:image/jpeg;base64,{b64_str}")
+
+            return imagens_b64
+        except Exception as e:
+            logging.error(f"Erro PDF {caminho_pdf}: {e}")
+            return []
+
+    def consultar_claude_raw(self, imagens_b64, nome_arquivo, prazo=None, stream=False, metricas=None, pergunta=None):
+        """Envia imagens para o modelo com o Prompt de Perito Calculista."""
+        # "pergunta" substitui o pedido padrão (ex: re-extração apenas dos campos inválidos)
+        conteudo_msg = [{"type": "text", "text": pergunta or f"Analise o contrato: {nome_arquivo}"}]
+        for img in imagens_b64:
+            conteudo_msg.append({"type": "image_url", "image_url": {"url": img}})
+
+        # Saída estruturada quando o modelo suporta JSON Schema
+        extras = {}
+        formato = response_format_para(self.modelo)
+        if formato:
+            extras["response_format"] = formato
+        if stream:
+            # Sem isto o stream não traz uso e o custo da chamada sairia zerado
+            extras["stream_options"] = {"include_usage": True}
+
+        def chamar(timeout):
+            inicio = time.monotonic()
+            response = cliente_openrouter(TITULO_API).chat.completions.create(
+                model=self.modelo,
+                messages=[
+                    {"role": "system", "content": PROMPT_SISTEMA},
+                    {"role": "user", "content": conteudo_msg}
+                ],
+                temperature=0.0,
+                max_tokens=1000,
+                timeout=timeout,
+                stream=stream,
+                **extras
+            )
+
+            # Streaming: para de ler (e cancela a geração) assim que o JSON fecha
+            if stream:
+                if prazo is not None:
+                    # Cancelamento externo (ramo perdedor do hedge) fecha a conexão no meio da geração
+                    prazo.ao_cancelar(response.close)
+                texto, medidas = coletar_objeto_json(response, inicio)
+                if metricas is not None:
+                    metricas.update(medidas)
+                if not texto:
+                    raise ErroRecuperavel("Resposta vazia do modelo (stream)")
+                return texto
+
+            if metricas is not None:
+                metricas.update({"modo": "completo", "tempo_total_s": round(time.monotonic() - inicio, 3)})
+                uso = getattr(response, "usage", None)
+                if uso is not None:
+                    metricas.update({"tokens_entrada": uso.prompt_tokens, "tokens_saida": uso.completion_tokens})
+            # Retorna o conteúdo cru (Raw) para ser salvo no Data Lake
+            if response.choices and response.choices[0].message.content:
+                return response.choices[0].message.content
+            # Conteúdo vazio (filtro, fim prematuro do provedor) não é sucesso: entra no retry
+            raise ErroRecuperavel("Resposta vazia do modelo")
+
+        try:
+            return executar_com_retry(chamar, provedor="openrouter", prazo=prazo, descricao=nome_arquivo)
+        except Exception as e:
+            logging.error(f"Falha definitiva na API para {nome_arquivo}: {e}")
+            return None
+
+    def processar_pdf(self, caminho_pdf, caminho_salvamento):
+        """Extrai um único PDF e grava o pacote RAW. Retorna True em caso de sucesso."""
+        arquivo = os.path.basename(caminho_pdf)
+        pasta_origem = pasta_relativa(caminho_pdf, PASTA_ENTRADA)
+
+        # Triagem (manifesto): PDF criptografado/corrompido não chega a gastar API
+        entrada = obter_manifesto().obter(caminho_pdf)
+        if not legivel(entrada):
+            logging.warning(f"    Fora da extração ({entrada['status']}): {arquivo} - {entrada['erro']}")
+            print(f"    Ignorado ({entrada['status']}): {arquivo}")
+            return False
+
+        # Assinaturas digitais embutidas (PAdES) dão status/data exatos: as páginas de assinatura não vão para a visão
+        inspecao = entrada["assinaturas"]
+        # Marcadores óbvios (gov.br, selo de cartório) resolvem status/data sem o modelo
+        pre = entrada["pre_classificacao"] if PRE_CLASSIFICADOR_ATIVO else None
+
+        # Quase-duplicados (re-scans, anexos renomeados) reaproveitam a extração do representante
+        impressao = None
+        if DEDUPE_ATIVO:
+            indice = obter_indice(self.pasta_saida)
+            impressao, perfil = entrada["impressao"], perfil_documento(entrada)
+            achado = indice.buscar(impressao, perfil)
+            # Assinatura e pré-classificação são deste arquivo, não do representante
+            proprios = {"assinaturas_pdf": inspecao, "pre_classificacao": pre}
+            if achado and registrar_duplicata(caminho_salvamento, arquivo, pasta_origem, *achado, proprios=proprios):
+                representante, _ = achado
+                print(f"    Quase-duplicado de {representante['arquivo']}: reaproveitado sem chamar a API.")
+                return True
+
+        # Prazo único por documento: retries não podem segurar o lote indefinidamente
+        prazo = Prazo()
+        metricas_render = {}
+        with etapa("render"):
+            imagens = self.converter_pdf_para_vision(caminho_pdf, paginas_assinatura=not inspecao["status"],
+                                                     metricas_render=metricas_render)
+        if not imagens:
+            logging.error(f"    Falha ao converter imagens: {arquivo}")
+            return False
+        if metricas_render.get("paginas_roi"):
+            logging.info(
+                f"    ROI: {metricas_render['tokens_estimados']} tokens / {metricas_render['bytes']} bytes "
+                f"(página inteira: {metricas_render['tokens_pagina_inteira']} / ~{metricas_render['bytes_pagina_inteira_estimados']}) "
+                f"-> economia {metricas_render.get('economia_tokens_pct')}% tokens, {metricas_render.get('economia_bytes_pct')}% bytes"
+            )
+        if metricas_render.get("modo") == "mosaico":
+            logging.info(
+                f"    Mosaico: {metricas_render['imagens']} imagens para {metricas_render['paginas']} páginas, "
+                f"~{metricas_render['tokens_estimados']} tokens (uma por página: ~{metricas_render['tokens_uma_imagem_por_pagina']})"
+            )
+
+        campos_locais = {**campos_confiaveis(pre), **campos_da_assinatura(inspecao)}
+
+        metricas = {}
+        with etapa("api"):
+            if HEDGE_ATIVO:
+                # Cauda longa do OpenRouter: passado o percentil recente, o Gemini recebe o mesmo pedido
+                metricas_principal = {}
+                resposta_raw, backend = HEDGE.executar(
+                    # Sempre em streaming no hedge: o perdedor só pode ser cancelado fechando o stream
+                    lambda p: self.consultar_claude_raw(imagens, arquivo, prazo=p, stream=True, metricas=metricas_principal),
+                    lambda p: consultar_gemini_secundario(imagens, arquivo, prazo=p),
+                    prazo=prazo, descricao=arquivo,
+                )
+                if backend == "principal":
+                    metricas.update(metricas_principal)
+                metricas["backend"] = self.modelo if backend == "principal" else backend
+            else:
+                resposta_raw = self.consultar_claude_raw(imagens, arquivo, prazo=prazo, stream=MODO_STREAM, metricas=metricas)
+
+        if resposta_raw:
+            # Valida contra o esquema e re-pede só os campos inválidos
+            campos_corrigidos, campos_invalidos = revisar_resposta(
+                resposta_raw,
+                lambda pergunta: self.consultar_claude_raw(imagens, arquivo, prazo=prazo, pergunta=pergunta),
+                campos_locais=campos_locais,
+            )
+            ECONOMIA.registrar(pre, campos_locais, campos_corrigidos, campos_invalidos)
+
+            pacote_dados = {
+                "arquivo_origem": arquivo,
+                "pasta_origem": pasta_origem,
+                "timestamp": datetime.now().isoformat(),
+                "metricas_chamada": metricas,
+                "campos_corrigidos": campos_corrigidos,
+                "campos_invalidos": campos_invalidos,
+                "pre_classificacao": pre,
+                "assinaturas_pdf": inspecao,
+                "metricas_render": metricas_render,
+                "resposta_ia_raw": resposta_raw  # O texto exato que o modelo mandou
+            }
+
+            # Modo --trabalhador: se o arquivo foi reassumido por outro, quem grava é ele
+            if not lease_valido():
+                logging.warning(f"    Lease perdido, resultado descartado: {arquivo}")
+                return False
+            # A existência do RAW marca o arquivo como feito: nunca pode ficar pela metade
+            gravar_json_atomico(caminho_salvamento, pacote_dados)
+            if impressao is not None:
+                indice.adicionar(impressao, perfil, caminho_salvamento, arquivo)
+
+            logging.info(f"    Custos calculados e salvos: {caminho_salvamento}")
+            print(f"    Sucesso! Salvo em: {caminho_salvamento}")
+            return True
+        else:
+            logging.error(f"    Falha na API: {arquivo}")
+            print(f"    Erro na API para: {arquivo}")
+            return False
+
+    def executar_extracao(self):
+        """Função principal que orquestra a leitura e envio."""
+        if not os.path.exists(PASTA_ENTRADA):
+            print(f" Diretório não encontrado: {PASTA_ENTRADA}")
+            return
+        self.preparar_execucao()
+
+        # Descoberta sob demanda: o primeiro PDF vai para a API sem esperar a varredura inteira
+        estatisticas = {}
+        pendentes = arquivos_pendentes(PASTA_ENTRADA, self.pasta_saida, estatisticas=estatisticas)
+        if PRIORIZAR:
+            # Valor e prazo primeiro: exige a varredura completa antes do primeiro envio
+            pendentes = FilaPriorizada(pendentes)
+        logging.info(f" INICIANDO EXTRAÇÃO DE CUSTOS ({self.modelo}, varredura recursiva): {PASTA_ENTRADA}")
+        print(f" Iniciando processamento (varredura recursiva de {PASTA_ENTRADA})...")
+
+        for i, (caminho_pdf, caminho_salvamento) in enumerate(pendentes):
+            arquivo = os.path.basename(caminho_pdf)
+
+            logging.info(f"[{i+1}] Processando: {caminho_pdf}")
+            print(f" [{i+1}] Processando: {arquivo}...")
+
+            with etapa("extracao", arquivo=arquivo):
+                self.processar_pdf(caminho_pdf, caminho_salvamento)
+
+        print(f" Concluído: {estatisticas.get('pendentes', 0)} processados, {estatisticas.get('pulados', 0)} já existentes no lake.")
+        if PRIORIZAR:
+            print(f" {pendentes.relatorio()}")
+            logging.info(pendentes.relatorio())
+        print(f" {ECONOMIA.resumo()}")
+        logging.info(ECONOMIA.resumo())
+        if HEDGE_ATIVO:
+            print(f" {HEDGE.resumo()}")
+            logging.info(HEDGE.resumo())
+        if CACHE_RENDER_ATIVO:
+            print(f" {CACHE.resumo()}")
+            logging.info(CACHE.resumo())
+
+    def executar_vigia(self):
+        """
+        Modo contínuo: processa o acumulado, depois vigia PASTA_ENTRADA e extrai cada
+        PDF novo assim que a cópia termina, atualizando o 02_processador de forma incremental.
+        """
+        # O vigia nasce antes do acumulado: o que chegar durante a carga (horas) não se perde.
+        # Os arquivos já existentes também passam por ele uma vez: o que o acumulado extraiu
+        # cai no teste do RAW abaixo, e o que falhou ganha uma nova tentativa.
+        vigia = VigiaPasta(PASTA_ENTRADA, aceitar=lambda caminho: aceita_arquivo(caminho, PASTA_ENTRADA),
+                           incluir_existentes=True)
+        self.executar_extracao()
+        processador = importlib.import_module("02_processador")
+
+        logging.info(f" Vigiando {PASTA_ENTRADA} ({vigia.modo})")
+        print(f" Vigiando {PASTA_ENTRADA} ({vigia.modo}). Ctrl+C para encerrar.")
+
+        for caminho_pdf in vigia.arquivos_prontos():
+            inicio = time.monotonic()
+            nome = nome_lake(caminho_pdf, PASTA_ENTRADA)
+            caminho_salvamento = os.path.join(self.pasta_saida, f"{nome}_RAW.json")
+            if os.path.exists(caminho_salvamento):
+                continue
+
+            print(f" Novo arquivo: {os.path.basename(caminho_pdf)}")
+            if self.processar_pdf(caminho_pdf, caminho_salvamento):
+                processador.processar_incremental([caminho_salvamento])
+            logging.info(f" Latência ponta a ponta: {time.monotonic() - inicio:.1f}s ({caminho_pdf})")
+
+    def executar_como_trabalhador(self):
+        """
+        Modo fila (--trabalhador): quantos processos/hosts quiser rodam este mesmo comando.
+        Cada PDF é arrendado por um único trabalhador; se ele cair, o lease expira e outro reassume.
+        """
+        if not os.path.exists(PASTA_ENTRADA):
+            print(f" Diretório não encontrado: {PASTA_ENTRADA}")
+            return
+        self.preparar_execucao()
+        fila = FilaTrabalho(self.fila_trabalho_db)
+        logging.info(f" Trabalhador iniciado na fila {self.fila_trabalho_db}")
+        origem = arquivos_pendentes(PASTA_ENTRADA, self.pasta_saida)
+        if PRIORIZAR:
+            # A prioridade vai para a fila: todos os trabalhadores arrendam o mais importante primeiro
+            origem = ((caminho, salvamento, pontos) for (caminho, salvamento), pontos in priorizar(origem))
+        executar_trabalhador(fila, self.processar_pdf, origem=origem)
+
+    def executar_linha_de_comando(self, argv):
+        """Ponto de entrada dos scripts: --vigiar, --trabalhador ou (padrão) o lote."""
+        try:
+            if "--vigiar" in argv:
+                self.executar_vigia()
+            elif "--trabalhador" in argv:
+                self.executar_como_trabalhador()
+            else:
+                self.executar_extracao()
+        except KeyboardInterrupt:
+            print("\n Interrompido pelo usuário.")
@@ -0,0 +1,274 @@
+import os
+import time
+import socket
+import sqlite3
+import logging
+import threading
+import contextvars
+from collections import Counter
+
+from log_estruturado import etapa
+
+# --- FILA DE TRABALHO COMPARTILHADA (vários processos / vários hosts) ---
+# Um único arquivo SQLite numa pasta compartilhada coordena os trabalhadores.
+# Sem WAL de propósito: o journal padrão (rollback) é o que funciona em sistemas de arquivos de rede.
+DURACAO_LEASE = float(os.getenv("FILA_LEASE_SEGUNDOS", "120"))
+INTERVALO_HEARTBEAT = DURACAO_LEASE / 3
+MAX_TENTATIVAS = int(os.getenv("FILA_MAX_TENTATIVAS", "3"))
+ESPERA_FILA_VAZIA = float(os.getenv("FILA_ESPERA_SEGUNDOS", "10"))
+
+PENDENTE, EM_ANDAMENTO, CONCLUIDA, FALHOU = "pendente", "em_andamento", "concluida", "falhou"
+
+# Heartbeat do arquivo sendo processado nesta thread (None fora do modo trabalhador)
+_LEASE_ATUAL = contextvars.ContextVar("lease_atual", default=None)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tarefas (
+    caminho TEXT PRIMARY KEY,
+    caminho_salvamento TEXT NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendente',
+    trabalhador TEXT,
+    lease_ate REAL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    atualizado_em REAL,
+    erro TEXT,
+    prioridade REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_tarefas_estado ON tarefas (estado, lease_ate);
+"""
+
+
+def id_trabalhador():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class FilaTrabalho:
+    """
+    Fila com arrendamento (lease): cada arquivo é entregue a um único trabalhador
+    por vez. O trabalhador renova o lease com heartbeats; se ele morrer, o lease
+    expira e o arquivo volta para a fila automaticamente.
+    """
+    def __init__(self, caminho_db, duracao_lease=DURACAO_LEASE, max_tentativas=MAX_TENTATIVAS):
+        self.caminho_db = caminho_db
+        self.duracao_lease = duracao_lease
+        self.max_tentativas = max_tentativas
+        os.makedirs(os.path.dirname(os.path.abspath(caminho_db)), exist_ok=True)
+        conexao = sqlite3.connect(self.caminho_db, timeout=60)
+        try:
+            conexao.executescript(_ESQUEMA)
+            # Filas criadas antes da priorização não têm a coluna
+            colunas = {linha[1] for linha in conexao.execute("PRAGMA table_info(tarefas)")}
+            if "prioridade" not in colunas:
+                conexao.execute("ALTER TABLE tarefas ADD COLUMN prioridade REAL NOT NULL DEFAULT 0")
+                conexao.commit()
+        finally:
+            conexao.close()
+
+    def _conectar(self):
+        # Uma conexão por operação: seguro entre threads (heartbeat) e após fork
+        conexao = sqlite3.connect(self.caminho_db, timeout=60, isolation_level=None)
+        conexao.execute("PRAGMA busy_timeout = 60000")
+        return _Transacao(conexao)
+
+    def enfileirar(self, pares):
+        """
+        Insere (caminho, caminho_salvamento) ou (caminho, caminho_salvamento, prioridade);
+        repetidos são ignorados. Retorna quantos entraram.
+        """
+        inseridos = 0
+        lote = []
+        for par in pares:
+            lote.append(par)
+            if len(lote) >= 500:
+                inseridos += self._inserir(lote)
+                lote = []
+        return inseridos + self._inserir(lote)
+
+    def _inserir(self, lote):
+        if not lote:
+            return 0
+        with self._conectar() as conexao:
+            antes = conexao.total_changes
+            conexao.executemany(
+                "INSERT OR IGNORE INTO tarefas (caminho, caminho_salvamento, prioridade, atualizado_em) "
+                "VALUES (?, ?, ?, ?)",
+                [(par[0], par[1], par[2] if len(par) > 2 else 0.0, time.time()) for par in lote],
+            )
+            return conexao.total_changes - antes
+
+    def arrendar(self, trabalhador):
+        """Reserva a próxima tarefa livre (ou com lease vencido). Retorna (caminho, caminho_salvamento) ou None."""
+        agora = time.time()
+        with self._conectar() as conexao:
+            # Leases vencidos que já estouraram as tentativas não voltam mais para a fila
+            conexao.execute(
+                "UPDATE tarefas SET estado = ?, erro = 'lease expirado', atualizado_em = ? "
+                "WHERE estado = ? AND lease_ate < ? AND tentativas >= ?",
+                (FALHOU, agora, EM_ANDAMENTO, agora, self.max_tentativas),
+            )
+            linha = conexao.execute(
+                "SELECT caminho, caminho_salvamento, estado, trabalhador FROM tarefas "
+                "WHERE estado = ? OR (estado = ? AND lease_ate < ?) "
+                "ORDER BY tentativas, prioridade DESC, rowid LIMIT 1",
+                (PENDENTE, EM_ANDAMENTO, agora),
+            ).fetchone()
+            if linha is None:
+                return None
+            caminho, caminho_salvamento, estado, anterior = linha
+            if estado == EM_ANDAMENTO:
+                logging.warning(f"Lease de {anterior} expirou; reassumindo {caminho}")
+            conexao.execute(
+                "UPDATE tarefas SET estado = ?, trabalhador = ?, lease_ate = ?, "
+                "tentativas = tentativas + 1, atualizado_em = ? WHERE caminho = ?",
+                (EM_ANDAMENTO, trabalhador, agora + self.duracao_lease, agora, caminho),
+            )
+            return caminho, caminho_salvamento
+
+    def renovar(self, caminho, trabalhador):
+        """Heartbeat. False se o lease já foi perdido para outro trabalhador."""
+        with self._conectar() as conexao:
+            cursor = conexao.execute(
+                "UPDATE tarefas SET lease_ate = ?, atualizado_em = ? "
+                "WHERE caminho = ? AND trabalhador = ? AND estado = ?",
+                (time.time() + self.duracao_lease, time.time(), caminho, trabalhador, EM_ANDAMENTO),
+            )
+            return cursor.rowcount == 1
+
+    def concluir(self, caminho, trabalhador, sucesso, erro=None):
+        """Fecha a tarefa. Falhas voltam para a fila até MAX_TENTATIVAS."""
+        with self._conectar() as conexao:
+            if sucesso:
+                novo_estado = CONCLUIDA
+            else:
+                tentativas = conexao.execute(
+                    "SELECT tentativas FROM tarefas WHERE caminho = ?", (caminho,)
+                ).fetchone()[0]
+                novo_estado = FALHOU if tentativas >= self.max_tentativas else PENDENTE
+            conexao.execute(
+                "UPDATE tarefas SET estado = ?, lease_ate = NULL, erro = ?, atualizado_em = ? "
+                "WHERE caminho = ? AND trabalhador = ?",
+                (novo_estado, erro, time.time(), caminho, trabalhador),
+            )
+
+    def ha_trabalho_em_andamento(self):
+        with self._conectar() as conexao:
+            return conexao.execute(
+                "SELECT 1 FROM tarefas WHERE estado = ? LIMIT 1", (EM_ANDAMENTO,)
+            ).fetchone() is not None
+
+    def resumo(self):
+        with self._conectar() as conexao:
+            return Counter(dict(conexao.execute("SELECT estado, COUNT(*) FROM tarefas GROUP BY estado")))
+
+
+class _Transacao:
+    """Conexão em BEGIN IMMEDIATE: o lock de escrita é pego antes do SELECT (sem corrida entre hosts)."""
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    def __enter__(self):
+        self.conexao.execute("BEGIN IMMEDIATE")
+        return self.conexao
+
+    def __exit__(self, tipo_erro, erro, tb):
+        try:
+            self.conexao.execute("ROLLBACK" if tipo_erro else "COMMIT")
+        finally:
+            self.conexao.close()
+        return False
+
+
+class Heartbeat:
+    """Renova o lease em segundo plano enquanto o arquivo é processado."""
+    def __init__(self, fila, caminho, trabalhador, intervalo=INTERVALO_HEARTBEAT):
+        self.fila = fila
+        self.caminho = caminho
+        self.trabalhador = trabalhador
+        self.intervalo = intervalo
+        self.perdido = False
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._bater, daemon=True)
+
+    def _bater(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                if not self.fila.renovar(self.caminho, self.trabalhador):
+                    self.perdido = True
+                    logging.warning(f"Lease perdido para {self.caminho}")
+                    return
+            except sqlite3.Error as e:
+                # Falha transitória do FS compartilhado: tenta de novo no próximo batimento
+                logging.warning(f"Heartbeat falhou ({e})")
+
+    def confirmar(self):
+        """Renova agora (sem esperar o próximo batimento); False se o lease foi perdido."""
+        if not self.perdido:
+            try:
+                self.perdido = not self.fila.renovar(self.caminho, self.trabalhador)
+            except sqlite3.Error as e:
+                logging.warning(f"Confirmação do lease falhou ({e})")
+        return not self.perdido
+
+    def __enter__(self):
+        self._token = _LEASE_ATUAL.set(self)
+        self._thread.start()
+        return self
+
+    def __exit__(self, tipo_erro, erro, tb):
+        self._parar.set()
+        self._thread.join()
+        _LEASE_ATUAL.reset(self._token)
+        return False
+
+
+def lease_valido():
+    """
+    Chamar antes de gravar o resultado: False se o arquivo atual foi reassumido por outro
+    trabalhador (lease expirado), e quem chamou não deve gravar. Fora do modo trabalhador, sempre True.
+    """
+    heartbeat = _LEASE_ATUAL.get()
+    return heartbeat is None or heartbeat.confirmar()
+
+
+def executar_trabalhador(fila, processar, origem=None, trabalhador=None):
+    """
+    Laço de um trabalhador: semeia a fila (idempotente), arrenda arquivos e chama
+    processar(caminho, caminho_salvamento) -> bool até não sobrar nada.
+    Enquanto outros ainda têm tarefas em andamento, espera: se algum morrer, o lease
+    dele expira e o arquivo é reassumido aqui.
+    """
+    trabalhador = trabalhador or id_trabalhador()
+    if origem is not None:
+        novos = fila.enfileirar(origem)
+        logging.info(f"[{trabalhador}] {novos} arquivos novos enfileirados")
+
+    processados = 0
+    while True:
+        tarefa = fila.arrendar(trabalhador)
+        if tarefa is None:
+            if not fila.ha_trabalho_em_andamento():
+                break
+            time.sleep(ESPERA_FILA_VAZIA)
+            continue
+
+        caminho, caminho_salvamento = tarefa
+        logging.info(f"[{trabalhador}] Processando: {caminho}")
+        print(f" [{trabalhador}] Processando: {os.path.basename(caminho)}...")
+        sucesso, erro = os.path.exists(caminho_salvamento), None
+        with Heartbeat(fila, caminho, trabalhador) as heartbeat:
+            try:
+                # Outro trabalhador pode ter terminado depois de perder o lease
+                with etapa("extracao", arquivo=os.path.basename(caminho), trabalhador=trabalhador):
+                    sucesso = sucesso or bool(processar(caminho, caminho_salvamento))
+            except Exception as e:
+                erro = str(e)
+                logging.error(f"[{trabalhador}] Erro em {caminho}: {e}")
+        if heartbeat.perdido:
+            # A tarefa agora é de outro trabalhador: o estado dela não é nosso para fechar
+            logging.warning(f"[{trabalhador}] Lease perdido: {caminho} fica com quem o reassumiu")
+            continue
+        fila.concluir(caminho, trabalhador, sucesso, erro)
+        processados += 1
+
+    print(f" [{trabalhador}] Fila vazia: {processados} arquivos processados. Estado: {dict(fila.resumo())}")
+    return processados
@@ -3,17 +3,20 @@ import json
 import base64
 import time
 import logging
-import fitz  # PyMuPDF
 import requests
 from datetime import datetime
-from dotenv import load_dotenv
-
-load_dotenv()
+from configuracao import PASTA_ENTRADA, PASTA_SAIDA_EXTRATOR, garantir_pasta, configurar_logging
+from resiliencia import executar_com_retry, ErroHTTP, ErroRecuperavel, Prazo
+from esquema_contrato import esquema_gemini, revisar_resposta
+from descoberta import arquivos_pendentes, pasta_relativa
+from priorizacao import PRIORIZAR, FilaPriorizada
+from cache_render import CACHE_RENDER_ATIVO, CACHE, paginas_jpeg
+from manifesto import obter_manifesto, filtrar_legiveis
+from log_estruturado import etapa
 
 # --- CONFIGURAÇÕES DE PRODUÇÃO ---
-DIR_ENTRADA = os.getenv("PASTA_ENTRADA")
-DIR_SAIDA_BRUTA = os.getenv("TESTE_GEMINI_JSON")
-DIR_LOGS = r"outputs\logs"
+DIR_ENTRADA = PASTA_ENTRADA
+DIR_SAIDA_BRUTA = PASTA_SAIDA_EXTRATOR["gemini"]
 
 # Configuração da API Google Gemini
 API_KEY = os.getenv("GEMINI_API_KEY")
@@ -23,17 +26,10 @@ MODELO_GEMINI = "gemini-2.5-flash-preview-09-2025" # O "Nano Banana"
 ARQUIVOS_POR_LOTE = 4
 TEMPO_ESPERA_SEGUNDOS = 60
 
-# Logging
-os.makedirs(DIR_SAIDA_BRUTA, exist_ok=True)
-os.makedirs(DIR_LOGS, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(DIR_LOGS, f"extracao_gemini_{datetime.now().strftime('%Y%m%d')}.log"),
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-logging.getLogger('').addHandler(console)
+def preparar_execucao():
+    """Pastas e logs só quando algo vai de fato rodar (importar o módulo não tem efeito colateral)."""
+    garantir_pasta(DIR_SAIDA_BRUTA)
+    configurar_logging("extracao_gemini")
 
 def converter_pdf_para_imagens_b64(caminho_pdf):
     """
@@ -42,19 +38,16 @@ def converter_pdf_para_imagens_b64(caminho_pdf):
     """
     imagens_payload = []
     try:
-        doc = fitz.open(caminho_pdf)
-        total_pags = len(doc)
+        # Nº de páginas vem do manifesto: com o cache de render quente, o PDF nem é aberto
+        total_pags = obter_manifesto().obter(caminho_pdf)["paginas"]
         
         if total_pags > 6:
             indices = list(range(3)) + list(range(total_pags - 2, total_pags))
         else:
             indices = range(total_pags)
 
-        for i in indices:
-            pagina = doc.load_page(i)
-            # Zoom 2.0x para o Gemini ler letras miúdas de carimbos
-            pix = pagina.get_pixmap(matrix=fitz.Matrix(2.0, 2.0))
-            img_bytes = pix.tobytes("jpeg")
+        # Zoom 2.0x para o Gemini ler letras miúdas de carimbos (mesmas imagens dos backends OpenRouter, via cache)
+        for img_bytes in paginas_jpeg(caminho_pdf, indices, zoom=2.0):
             b64_str = base64.b64encode(img_bytes).decode('utf-8')
             
             # Formato específico para o payload do Gemini
@@ -70,11 +63,13 @@ def converter_pdf_para_imagens_b64(caminho_pdf):
         logging.error(f"Erro ao converter PDF {caminho_pdf}: {e}")
         return []
 
-def consultar_gemini_vision(imagens_payload, nome_arquivo):
+def consultar_gemini_vision(imagens_payload, nome_arquivo, prazo=None, pergunta=None, metricas=None, stream=False):
     """
     Envia imagens para o Gemini 2.5 Flash via REST API.
+    stream=True usa streamGenerateContent (SSE): cancelar o prazo fecha a conexão e encerra a geração.
     """
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{MODELO_GEMINI}:generateContent?key={API_KEY}"
+    metodo = "streamGenerateContent?alt=sse&" if stream else "generateContent?"
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{MODELO_GEMINI}:{metodo}key={API_KEY}"
     headers = {"Content-Type": "application/json"}
     
     prompt_text = f"""
@@ -130,24 +125,67 @@ def consultar_gemini_vision(imagens_payload, nome_arquivo):
     }}
     """
 
+    # "pergunta" complementa o prompt (ex: re-extração apenas dos campos inválidos)
+    if pergunta:
+        prompt_text += f"\n\n{pergunta}"
+
     # Monta o payload: Texto do Prompt + Lista de Imagens
     parts = [{"text": prompt_text}] + imagens_payload
     
+    # Saída estruturada: o Gemini valida o JSON contra o esquema do registro
     payload = {
         "contents": [{"parts": parts}],
-        "generationConfig": {"response_mime_type": "application/json"}
+        "generationConfig": {
+            "response_mime_type": "application/json",
+            "response_schema": esquema_gemini()
+        }
     }
 
-    try:
-        response = requests.post(url, headers=headers, json=payload)
+    def chamar_stream(timeout):
+        inicio = time.monotonic()
+        response = requests.post(url, headers=headers, json=payload, timeout=timeout, stream=True)
+        with response:
+            if response.status_code != 200:
+                raise ErroHTTP(response.status_code, response.text, response.headers)
+            if prazo is not None:
+                prazo.ao_cancelar(response.close)
+            partes, uso = [], {}
+            for linha in response.iter_lines(decode_unicode=True):
+                if not linha or not linha.startswith("data:"):
+                    continue
+                evento = json.loads(linha[len("data:"):])
+                uso = evento.get("usageMetadata", uso)
+                for candidato in evento.get("candidates", [])[:1]:
+                    partes.extend(p.get("text", "") for p in candidato.get("content", {}).get("parts", []))
+        if metricas is not None:
+            metricas.update({
+                "modo": "stream", "tempo_total_s": round(time.monotonic() - inicio, 3),
+                "tokens_entrada": uso.get("promptTokenCount"), "tokens_saida": uso.get("candidatesTokenCount"),
+            })
+        texto = "".join(partes)
+        if not texto:
+            raise ErroRecuperavel("Resposta vazia do Gemini (stream)")
+        return texto
+
+    def chamar(timeout):
+        inicio = time.monotonic()
+        response = requests.post(url, headers=headers, json=payload, timeout=timeout)
         
         if response.status_code == 200:
-            return response.json()['candidates'][0]['content']['parts'][0]['text']
-        else:
-            logging.error(f"Erro API Gemini ({response.status_code}): {response.text}")
-            return None
+            corpo = response.json()
+            if metricas is not None:
+                uso = corpo.get("usageMetadata", {})
+                metricas.update({
+                    "modo": "completo", "tempo_total_s": round(time.monotonic() - inicio, 3),
+                    "tokens_entrada": uso.get("promptTokenCount"), "tokens_saida": uso.get("candidatesTokenCount"),
+                })
+            return corpo['candidates'][0]['content']['parts'][0]['text']
+        raise ErroHTTP(response.status_code, response.text, response.headers)
+
+    try:
+        return executar_com_retry(chamar_stream if stream else chamar, provedor="gemini", prazo=prazo, descricao=nome_arquivo)
     except Exception as e:
-        logging.error(f"Erro Request: {e}")
+        logging.error(f"Erro API Gemini ({nome_arquivo}): {e}")
         return None
 
 def executar_producao():
@@ -158,24 +196,25 @@ def executar_producao():
     if not os.path.exists(DIR_ENTRADA):
         print(f" Diretório não encontrado: {DIR_ENTRADA}")
         return
+    preparar_execucao()
 
-    arquivos = [f for f in os.listdir(DIR_ENTRADA) if f.lower().endswith('.pdf')]
-    total_arquivos = len(arquivos)
+    # Descoberta sob demanda + retomada inteligente pelo índice do lake
+    estatisticas = {}
+    pendentes = arquivos_pendentes(DIR_ENTRADA, DIR_SAIDA_BRUTA, estatisticas=estatisticas)
+    # Triagem: criptografados/corrompidos saem antes de ocupar uma vaga do lote
+    pendentes = filtrar_legiveis(pendentes)
+    if PRIORIZAR:
+        # Com a pausa do rate limit, a ordem decide o que sai no primeiro dia
+        pendentes = FilaPriorizada(pendentes)
     
     print(" Iniciando Produção com Gemini 2.5 Flash")
-    print(f" Arquivos: {total_arquivos}")
+    print(f" Varredura recursiva de: {DIR_ENTRADA}")
     print(f" Regra: Pausa de {TEMPO_ESPERA_SEGUNDOS}s a cada {ARQUIVOS_POR_LOTE} envios.\n")
 
     processados_no_lote = 0
 
-    for i, arquivo in enumerate(arquivos):
-        nome_safe = os.path.splitext(arquivo)[0]
-        caminho_salvamento = os.path.join(DIR_SAIDA_BRUTA, f"{nome_safe}_RAW.json")
-
-        # Verifica se já foi processado (Retomada Inteligente)
-        if os.path.exists(caminho_salvamento):
-            print(f" [{i+1}/{total_arquivos}] Pulando (Já existe): {arquivo}")
-            continue
+    for i, (caminho_pdf, caminho_salvamento) in enumerate(pendentes):
+        arquivo = os.path.basename(caminho_pdf)
 
         # --- CONTROLE DE RATE LIMIT ---
         if processados_no_lote > 0 and processados_no_lote % ARQUIVOS_POR_LOTE == 0:
@@ -184,23 +223,36 @@ def executar_producao():
             time.sleep(TEMPO_ESPERA_SEGUNDOS)
             print(" Retomando...\n")
 
-        print(f" [{i+1}/{total_arquivos}] Processando: {arquivo}...")
+        print(f" [{i+1}] Processando: {arquivo}...")
         
+        # Prazo único por documento
+        prazo = Prazo()
+
         # 1. Converter PDF em Imagens
-        imagens = converter_pdf_para_imagens_b64(os.path.join(DIR_ENTRADA, arquivo))
+        imagens = converter_pdf_para_imagens_b64(caminho_pdf)
         
         if not imagens:
             logging.error(f"Falha ao gerar imagens para {arquivo}")
             continue
 
         # 2. Enviar para Gemini
-        resultado_raw = consultar_gemini_vision(imagens, arquivo)
+        with etapa("api", arquivo=arquivo):
+            resultado_raw = consultar_gemini_vision(imagens, arquivo, prazo=prazo)
 
         if resultado_raw:
+            # Valida contra o esquema e re-pede só os campos inválidos
+            campos_corrigidos, campos_invalidos = revisar_resposta(
+                resultado_raw,
+                lambda pergunta: consultar_gemini_vision(imagens, arquivo, prazo=prazo, pergunta=pergunta)
+            )
+
             pacote = {
                 "arquivo_origem": arquivo,
+                "pasta_origem": pasta_relativa(caminho_pdf, DIR_ENTRADA),
                 "modelo": MODELO_GEMINI,
                 "timestamp": datetime.now().isoformat(),
+                "campos_corrigidos": campos_corrigidos,
+                "campos_invalidos": campos_invalidos,
                 "resposta_ia_raw": resultado_raw
             }
             
@@ -212,6 +264,14 @@ def executar_producao():
         else:
             print("    Falha na API.")
 
+    print(f" Concluído: {estatisticas.get('pendentes', 0)} processados, {estatisticas.get('pulados', 0)} já existentes no lake.")
+    if PRIORIZAR:
+        print(f" {pendentes.relatorio()}")
+        logging.info(pendentes.relatorio())
+    if CACHE_RENDER_ATIVO:
+        print(f" {CACHE.resumo()}")
+        logging.info(CACHE.resumo())
+
 if __name__ == "__main__":
     try:
         executar_producao()
@@ -0,0 +1,151 @@
+import os
+import time
+import logging
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from log_estruturado import copiar_contexto
+from resiliencia import Prazo
+
+# --- REQUISIÇÕES HEDGED (cauda de latência entre provedores) ---
+# Se a chamada principal passar do percentil HEDGE_PERCENTIL das latências recentes, o mesmo
+# pedido vai para o backend secundário (Gemini REST). Vale a primeira resposta válida; a outra
+# é cancelada: o prazo do ramo se esgota (sem novas tentativas) e a conexão dele é fechada.
+# Os dois ramos rodam em streaming para que haja o que fechar: o provedor para de gerar (e de
+# cobrar tokens de saída) ao perder o cliente. Os tokens de entrada do perdedor já foram cobrados.
+HEDGE_ATIVO = os.getenv("HEDGE_ATIVO", "0") == "1"
+PERCENTIL = float(os.getenv("HEDGE_PERCENTIL", "0.9"))
+JANELA = int(os.getenv("HEDGE_JANELA", "200"))
+MIN_AMOSTRAS = int(os.getenv("HEDGE_MIN_AMOSTRAS", "20"))
+ATRASO_INICIAL = float(os.getenv("HEDGE_ATRASO_INICIAL", "45"))   # enquanto não há histórico
+ATRASO_MINIMO = float(os.getenv("HEDGE_ATRASO_MINIMO", "5"))
+TAXA_MAXIMA = float(os.getenv("HEDGE_TAXA_MAXIMA", "0.2"))         # teto de custo: no máx. 20% das chamadas
+CUSTO_SECUNDARIO_USD = float(os.getenv("HEDGE_CUSTO_SECUNDARIO_USD", "0.01"))
+
+
+class HistoricoLatencia:
+    """Janela deslizante das latências do backend principal."""
+    def __init__(self, janela=JANELA):
+        self.amostras = deque(maxlen=janela)
+        self._trava = threading.Lock()
+
+    def registrar(self, segundos):
+        with self._trava:
+            self.amostras.append(segundos)
+
+    def limiar(self, percentil=PERCENTIL):
+        with self._trava:
+            if len(self.amostras) < MIN_AMOSTRAS:
+                return ATRASO_INICIAL
+            ordenadas = sorted(self.amostras)
+        indice = min(len(ordenadas) - 1, int(percentil * len(ordenadas)))
+        return max(ATRASO_MINIMO, ordenadas[indice])
+
+
+def _prazo_ramo(prazo):
+    """Prazo próprio de cada ramo (limitado pelo do documento), para poder cancelar só o perdedor."""
+    ramo = Prazo()
+    if prazo is not None:
+        ramo.limite = min(ramo.limite, prazo.limite)
+    return ramo
+
+
+class Hedge:
+    """Dispara o backend secundário quando o principal demora; contabiliza taxa de hedge e custo extra."""
+    def __init__(self, nome_secundario="gemini", custo_secundario_usd=CUSTO_SECUNDARIO_USD):
+        self.nome_secundario = nome_secundario
+        self.custo_secundario_usd = custo_secundario_usd
+        self.historico = HistoricoLatencia()
+        self.contagem = Counter()
+        self._trava = threading.Lock()
+
+    def _pode_hedgear(self):
+        with self._trava:
+            return self.contagem["hedges"] < TAXA_MAXIMA * self.contagem["chamadas"]
+
+    def _contar(self, chave):
+        with self._trava:
+            self.contagem[chave] += 1
+
+    def executar(self, principal, secundario, prazo=None, descricao="", valido=lambda r: r is not None):
+        """
+        principal(prazo) e secundario(prazo) devolvem a resposta ou None.
+        Retorna (resposta, "principal" | nome_secundario), ou (None, None) se nenhum respondeu.
+        """
+        self._contar("chamadas")
+        limiar = self.historico.limiar()
+        inicio = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hedge")
+        prazos = {"principal": _prazo_ramo(prazo)}
+        # Os ramos rodam em threads do executor, levando o contexto de log (arquivo, etapa) de quem chamou
+        futuros = {executor.submit(copiar_contexto(principal), prazos["principal"]): "principal"}
+        try:
+            pendentes = set(futuros)
+            decidido = False   # já se decidiu (uma única vez) se o secundário entra
+            while pendentes:
+                espera = None if decidido else max(0.0, limiar - (time.monotonic() - inicio))
+                concluidos, pendentes = wait(pendentes, timeout=espera, return_when=FIRST_COMPLETED)
+                for futuro in concluidos:
+                    ramo = futuros[futuro]
+                    try:
+                        resposta = futuro.result()
+                    except Exception as e:
+                        logging.warning(f"Hedge: ramo {ramo} falhou em {descricao}: {e}")
+                        resposta = None
+                    if valido(resposta):
+                        decorrido = time.monotonic() - inicio
+                        # Só respostas válidas do principal entram no histórico: 429/5xx rápidos
+                        # puxariam o percentil para baixo e disparariam mais hedges
+                        if ramo == "principal":
+                            self.historico.registrar(decorrido)
+                        for perdedor in pendentes:
+                            if futuros[perdedor] == "principal":
+                                # Perdeu ainda em andamento: levou pelo menos isso (mantém a cauda na janela)
+                                self.historico.registrar(decorrido)
+                            prazos[futuros[perdedor]].cancelar()
+                            self._contar(f"cancelados_{futuros[perdedor]}")
+                        self._contar(f"vitorias_{ramo}")
+                        return resposta, ramo
+
+                if decidido:
+                    continue
+                # Passou do limiar, ou o principal já voltou sem resposta válida
+                decidido = True
+                if self._pode_hedgear() and (prazo is None or not prazo.esgotado()):
+                    self._contar("hedges")
+                    motivo = f"passou de {limiar:.1f}s" if pendentes else "falhou"
+                    logging.info(f"Hedge: {descricao} {motivo}; enviando também para {self.nome_secundario}")
+                    prazos[self.nome_secundario] = _prazo_ramo(prazo)
+                    futuro = executor.submit(copiar_contexto(secundario), prazos[self.nome_secundario])
+                    futuros[futuro] = self.nome_secundario
+                    pendentes.add(futuro)
+            self._contar("sem_resposta")
+            return None, None
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def resumo(self):
+        c = self.contagem
+        taxa = 100 * c["hedges"] / c["chamadas"] if c["chamadas"] else 0.0
+        return (f"Hedge: {c['chamadas']} chamadas | {c['hedges']} hedges ({taxa:.1f}%) | "
+                f"vitórias {self.nome_secundario}: {c[f'vitorias_{self.nome_secundario}']} | "
+                f"perdedores cancelados: {c['cancelados_principal'] + c[f'cancelados_{self.nome_secundario}']} | "
+                f"limiar atual: {self.historico.limiar():.1f}s (p{PERCENTIL * 100:.0f}) | "
+                f"custo extra estimado: US$ {c['hedges'] * self.custo_secundario_usd:.2f}")
+
+
+def consultar_gemini_secundario(imagens_b64, nome_arquivo, prazo=None):
+    """Backend secundário: as mesmas imagens (data URLs do OpenRouter) no formato inlineData do Gemini."""
+    import gemini_google  # só carrega o cliente REST quando um hedge de fato dispara
+
+    partes = []
+    for url in imagens_b64:
+        cabecalho, _, dados = url.partition(",")
+        mime = cabecalho[len("data:"):].split(";")[0] or "image/jpeg"
+        partes.append({"inlineData": {"mimeType": mime, "data": dados}})
+    # Streaming: se o principal vencer, fechar a resposta interrompe a geração no Gemini
+    return gemini_google.consultar_gemini_vision(partes, nome_arquivo, prazo=prazo, stream=True)
+
+
+HEDGE = Hedge()
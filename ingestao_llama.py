@@ -0,0 +1,147 @@
+import os
+import json
+import queue
+import asyncio
+import hashlib
+import logging
+import threading
+
+from manifesto import hash_arquivo
+
+# --- INGESTÃO LLAMAPARSE (concorrente, com cache persistente de markdown) ---
+# Chave do cache = hash do conteúdo do PDF + configuração de parse. O modelo que consome o
+# markdown depois NÃO entra na chave: trocar de modelo/prompt nunca re-parseia um documento.
+DIR_CACHE_MARKDOWN = os.getenv("DIR_CACHE_MARKDOWN", os.path.join("outputs", "cache_markdown"))
+MAX_CONCORRENCIA = int(os.getenv("LLAMA_MAX_CONCORRENCIA", "4"))
+
+_FIM = object()
+
+
+def configuracao_parser(parser):
+    """Parâmetros do LlamaParse que mudam o markdown gerado."""
+    config = {}
+    for campo in ("result_type", "language", "parsing_instruction"):
+        valor = getattr(parser, campo, None)
+        config[campo] = getattr(valor, "value", valor)
+    return config
+
+
+def chave_cache(caminho, config):
+    assinatura_config = json.dumps(config, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{hash_arquivo(caminho)}|{assinatura_config}".encode("utf-8")).hexdigest()
+
+
+def _caminho_cache(chave, dir_cache):
+    # Dois níveis de pasta para não acumular milhares de arquivos num diretório só
+    return os.path.join(dir_cache, chave[:2], f"{chave}.json")
+
+
+def ler_cache(chave, dir_cache=DIR_CACHE_MARKDOWN):
+    try:
+        with open(_caminho_cache(chave, dir_cache), 'r', encoding='utf-8') as f:
+            return json.load(f)["paginas"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def gravar_cache(chave, caminho, config, paginas, dir_cache=DIR_CACHE_MARKDOWN):
+    destino = _caminho_cache(chave, dir_cache)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporario = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump({"arquivo": os.path.basename(caminho), "config": config, "paginas": paginas}, f, ensure_ascii=False)
+    os.replace(temporario, destino)  # atômico: leitores nunca veem um cache pela metade
+
+
+def carregar_markdown(parser, caminho, dir_cache=DIR_CACHE_MARKDOWN):
+    """Versão síncrona (um arquivo): lista com o texto de cada documento/página do LlamaParse."""
+    config = configuracao_parser(parser)
+    chave = chave_cache(caminho, config)
+    paginas = ler_cache(chave, dir_cache)
+    if paginas is None:
+        paginas = [doc.text for doc in parser.load_data(caminho)]
+        gravar_cache(chave, caminho, config, paginas, dir_cache)
+    return paginas
+
+
+def parsear_em_paralelo(parser, itens, caminho_de=lambda item: item, pular=None,
+                        max_concorrencia=MAX_CONCORRENCIA, dir_cache=DIR_CACHE_MARKDOWN):
+    """
+    Gera (item, paginas) na ordem em que os parses terminam, com até max_concorrencia
+    chamadas aload_data simultâneas. paginas é None se o parse falhou ou se pular(item) for True.
+    O consumidor (chamada ao LLM) roda em paralelo com os próximos parses; a fila limitada
+    segura a ingestão se o consumidor ficar para trás.
+    """
+    config = configuracao_parser(parser)
+    fila = queue.Queue(maxsize=max_concorrencia * 2)
+    estatisticas = {"cache": 0, "parseados": 0, "falhas": 0}
+
+    async def processar(item, semaforo):
+        if pular and pular(item):
+            return None
+        caminho = caminho_de(item)
+        try:
+            chave = await asyncio.to_thread(chave_cache, caminho, config)
+            paginas = await asyncio.to_thread(ler_cache, chave, dir_cache)
+        except OSError as e:
+            # Arquivo movido/apagado depois da descoberta, sem permissão...: só este item falha
+            estatisticas["falhas"] += 1
+            logging.error(f"Erro ao ler {caminho} para o LlamaParse: {e}")
+            return None
+        if paginas is not None:
+            estatisticas["cache"] += 1
+            return paginas
+        async with semaforo:
+            try:
+                documentos = await parser.aload_data(caminho)
+            except Exception as e:
+                estatisticas["falhas"] += 1
+                logging.error(f"Erro LlamaParse ao ler {caminho}: {e}")
+                return None
+        paginas = [doc.text for doc in documentos]
+        try:
+            await asyncio.to_thread(gravar_cache, chave, caminho, config, paginas, dir_cache)
+        except OSError as e:
+            logging.warning(f"Cache de markdown não gravado para {caminho}: {e}")
+        estatisticas["parseados"] += 1
+        return paginas
+
+    async def produzir():
+        semaforo = asyncio.Semaphore(max_concorrencia)
+        iterador = iter(itens)
+        trava = asyncio.Lock()
+
+        async def proximo():
+            # Cada next() pode descobrir e triar arquivos (scandir, sha256, fitz): roda numa thread
+            # para não parar os aload_data em andamento. A trava serializa o gerador compartilhado.
+            async with trava:
+                return await asyncio.to_thread(next, iterador, _FIM)
+
+        async def trabalhador():
+            # O iterador é compartilhado: a descoberta continua sob demanda, sem lista prévia
+            while (item := await proximo()) is not _FIM:
+                paginas = await processar(item, semaforo)
+                await asyncio.to_thread(fila.put, (item, paginas))
+
+        await asyncio.gather(*(trabalhador() for _ in range(max_concorrencia)))
+
+    def rodar():
+        try:
+            asyncio.run(produzir())
+        except Exception as e:
+            logging.error(f"Ingestão LlamaParse interrompida: {e}")
+        finally:
+            fila.put(_FIM)
+
+    thread = threading.Thread(target=rodar, daemon=True)
+    thread.start()
+    while True:
+        resultado = fila.get()
+        if resultado is _FIM:
+            break
+        yield resultado
+    thread.join()
+    logging.info(
+        f"LlamaParse: {estatisticas['parseados']} parseados, {estatisticas['cache']} do cache, "
+        f"{estatisticas['falhas']} falhas"
+    )
@@ -0,0 +1,165 @@
+import re
+import logging
+import zipfile
+import xml.etree.ElementTree as ET
+
+# --- LEITURA LOCAL DE DOCX (sem LlamaParse) ---
+# DOCX já é XML estruturado: word/document.xml, cabeçalhos e rodapés são lidos em streaming
+# (iterparse) direto do zip e viram o mesmo markdown que o LLM recebe do LlamaParse:
+# títulos com "#", listas com "-", tabelas em pipe table. Sem rede e sem crédito de parse.
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+_P, _T, _TAB, _BR, _CR = _W + "p", _W + "t", _W + "tab", _W + "br", _W + "cr"
+_TBL, _TR, _TC = _W + "tbl", _W + "tr", _W + "tc"
+_PPR, _PSTYLE, _NUMPR, _VAL = _W + "pPr", _W + "pStyle", _W + "numPr", _W + "val"
+_HIFEN = _W + "noBreakHyphen"
+
+_RE_TITULO = re.compile(r"(?:heading|t[íi]?tulo)\s*(\d)", re.IGNORECASE)
+_RE_PARTE_CABECALHO = re.compile(r"^word/header\d*\.xml$")
+_RE_PARTE_RODAPE = re.compile(r"^word/footer\d*\.xml$")
+_RE_NUMERO = re.compile(r"(\d+)")
+
+
+def _formatar_paragrafo(texto, estilo, lista):
+    texto = texto.strip()
+    if not texto:
+        return ""
+    if estilo:
+        titulo = _RE_TITULO.search(estilo)
+        if titulo:
+            return f"{'#' * min(int(titulo.group(1)), 6)} {texto}"
+        if estilo.lower() in ("title", "titulo", "título"):
+            return f"# {texto}"
+    return f"- {texto}" if lista else texto
+
+
+def _celula(paragrafos):
+    return "<br>".join(p for p in paragrafos if p).replace("|", "\\|").replace("\n", "<br>")
+
+
+def _tabela_markdown(linhas):
+    linhas = [[_celula(c) for c in linha] for linha in linhas if linha]
+    if not linhas:
+        return ""
+    colunas = max(len(linha) for linha in linhas)
+    linhas = [linha + [""] * (colunas - len(linha)) for linha in linhas]
+    saida = ["| " + " | ".join(linhas[0]) + " |", "|" + " --- |" * colunas]
+    saida.extend("| " + " | ".join(linha) + " |" for linha in linhas[1:])
+    return "\n".join(saida)
+
+
+def blocos_markdown(fluxo):
+    """
+    Gera os blocos (parágrafos e tabelas) de uma parte WordprocessingML, em streaming.
+    Cada elemento é limpo ao fechar: a memória não cresce com o tamanho do documento.
+    """
+    paragrafos = []   # pilha: caixas de texto têm parágrafos dentro de parágrafos
+    tabelas = []      # pilha de tabelas (aninhadas); tabela = linhas; linha = células; célula = parágrafos
+    em_ppr = 0        # tabulações dentro de pPr são definições de parada, não texto
+    em_fallback = 0   # conteúdo duplicado (VML) de mc:AlternateContent
+
+    for evento, elem in ET.iterparse(fluxo, events=("start", "end")):
+        tag = elem.tag
+        if evento == "start":
+            if tag == _MC_FALLBACK:
+                em_fallback += 1
+            elif em_fallback:
+                pass
+            elif tag == _P:
+                paragrafos.append({"partes": [], "estilo": None, "lista": False})
+            elif tag == _PPR:
+                em_ppr += 1
+            elif tag == _TBL:
+                tabelas.append([])
+            elif tag == _TR and tabelas:
+                tabelas[-1].append([])
+            elif tag == _TC and tabelas and tabelas[-1]:
+                tabelas[-1][-1].append([])
+            continue
+
+        if tag == _MC_FALLBACK:
+            em_fallback -= 1
+            elem.clear()
+            continue
+        if em_fallback or (not paragrafos and tag != _TBL):
+            continue
+
+        if tag == _T:
+            paragrafos[-1]["partes"].append(elem.text or "")
+        elif tag == _TAB and not em_ppr:
+            paragrafos[-1]["partes"].append("\t")
+        elif tag in (_BR, _CR):
+            paragrafos[-1]["partes"].append("\n")
+        elif tag == _HIFEN:
+            paragrafos[-1]["partes"].append("-")
+        elif tag == _PSTYLE:
+            paragrafos[-1]["estilo"] = elem.get(_VAL)
+        elif tag == _NUMPR and em_ppr:
+            paragrafos[-1]["lista"] = True
+        elif tag == _PPR:
+            em_ppr -= 1
+        elif tag == _P:
+            atual = paragrafos.pop()
+            linha = _formatar_paragrafo("".join(atual["partes"]), atual["estilo"], atual["lista"])
+            elem.clear()
+            if paragrafos:
+                # Caixa de texto: o conteúdo fica no parágrafo que a contém
+                if linha:
+                    paragrafos[-1]["partes"].append(f" {linha} ")
+            elif tabelas and tabelas[-1] and tabelas[-1][-1]:
+                tabelas[-1][-1][-1].append(linha)
+            elif linha:
+                yield linha
+        elif tag == _TBL:
+            tabela = _tabela_markdown(tabelas.pop())
+            elem.clear()
+            if tabelas and tabelas[-1] and tabelas[-1][-1]:
+                # Tabela aninhada: vira texto da célula de fora
+                tabelas[-1][-1][-1].append(tabela.replace("\n", " "))
+            elif tabela:
+                yield tabela
+
+
+def _ordem_parte(nome):
+    numero = _RE_NUMERO.search(nome.rsplit("/", 1)[-1])
+    return int(numero.group(1)) if numero else 0
+
+
+def _texto_parte(arquivo_zip, nome):
+    with arquivo_zip.open(nome) as fluxo:
+        return "\n\n".join(blocos_markdown(fluxo))
+
+
+def markdown_docx(caminho):
+    """
+    Markdown do DOCX inteiro: cabeçalhos, corpo, rodapés (cabeçalhos/rodapés repetidos entram uma vez).
+    Levanta zipfile.BadZipFile / KeyError / ET.ParseError para arquivos inválidos.
+    """
+    with zipfile.ZipFile(caminho) as arquivo_zip:
+        nomes = arquivo_zip.namelist()
+        cabecalhos = sorted((n for n in nomes if _RE_PARTE_CABECALHO.match(n)), key=_ordem_parte)
+        rodapes = sorted((n for n in nomes if _RE_PARTE_RODAPE.match(n)), key=_ordem_parte)
+
+        vistos = set()
+
+        def unicos(partes):
+            for nome in partes:
+                texto = _texto_parte(arquivo_zip, nome)
+                if texto and texto not in vistos:
+                    vistos.add(texto)
+                    yield texto
+
+        topo = list(unicos(cabecalhos))
+        corpo = _texto_parte(arquivo_zip, "word/document.xml")
+        base = list(unicos(rodapes))
+    return "\n\n".join(topo + [corpo] + base)
+
+
+def paginas_docx(caminho):
+    """Mesmo formato do LlamaParse (lista de textos markdown); None se o arquivo não for um DOCX válido."""
+    try:
+        return [markdown_docx(caminho)]
+    except (zipfile.BadZipFile, KeyError, ET.ParseError, OSError) as e:
+        logging.error(f"Erro ao ler DOCX {caminho}: {e}")
+        return None
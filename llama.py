@@ -1,65 +1,74 @@
 import os
 import json
 import time
+import random
 import logging
 from datetime import datetime
-from openai import OpenAI
-from dotenv import load_dotenv
-from llama_parse import LlamaParse
-
-# Carrega variáveis de ambiente
-load_dotenv()
-
-# --- CONFIGURAÇÕES VIA .ENV ---
-# Usa os caminhos definidos no .env ou valores padrão (fallback)
-DIR_ENTRADA = os.getenv("PASTA_ENTRADA")
-DIR_SAIDA_BRUTA = os.getenv("PASTA_SAIDA_JSON")
-DIR_LOGS = r"outputs\logs"
-
-# Configuração API (Inteligência)
-CLIENTE_API = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("JULLIANE"),
-    default_headers={"HTTP-Referer": "https://merca.com.br", "X-Title": "Auditor LlamaParse"}
-)
+from configuracao import PASTA_ENTRADA, PASTA_SAIDA_EXTRATOR, cliente_openrouter, garantir_pasta, configurar_logging
+from resiliencia import executar_com_retry, ErroRecuperavel, Prazo
+from streaming_json import coletar_objeto_json
+from esquema_contrato import response_format_para, revisar_resposta, extrair_json
+from contexto_relevante import AMOSTRA_AVALIACAO, montar_contexto, comparar_campos
+from pre_classificador import PRE_CLASSIFICADOR_ATIVO, ECONOMIA, classificar_texto, campos_confiaveis
+from descoberta import arquivos_pendentes, pasta_relativa
+from ingestao_llama import carregar_markdown, parsear_em_paralelo
+from manifesto import filtrar_legiveis
+from log_estruturado import etapa
+
+# --- CONFIGURAÇÕES VIA .ENV (configuracao.py) ---
+DIR_ENTRADA = PASTA_ENTRADA
+DIR_SAIDA_BRUTA = PASTA_SAIDA_EXTRATOR["llama"]
+
+# Configuração API (Inteligência) - cliente criado na primeira chamada
+TITULO_API = "Auditor LlamaParse"
+CHAVE_API_ENV = "JULLIANE"
 MODELO_IA = "xiaomi/mimo-v2-flash:free"
+# Streaming opt-in (MODO_STREAM=1): encerra a geração assim que o JSON fecha
+MODO_STREAM = os.getenv("MODO_STREAM", "0") == "1"
+CAMPOS_AVALIADOS = [
+    "status", "data_evidencia", "locador", "locatario",
+    "data_inicio_contrato", "data_fim_contrato", "valor_aluguel_mensal_float",
+]
+
+_PARSER = None
+
 
-# Configuração LlamaParse (Leitura de PDF)
-parser = LlamaParse(
-    api_key=os.getenv("LLAMA_CLOUD_API_KEY_2"),
-    result_type="markdown",  # Markdown preserva estrutura de tabelas
-    language="pt",
-    verbose=False
-)
-
-# Configuração de Logs
-os.makedirs(DIR_SAIDA_BRUTA, exist_ok=True)
-os.makedirs(DIR_LOGS, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(DIR_LOGS, f"extracao_llama_{datetime.now().strftime('%Y%m%d')}.log"),
-    level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s'
-)
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-logging.getLogger('').addHandler(console)
+def obter_parser():
+    """Configuração LlamaParse (Leitura de PDF): o SDK só é importado quando há o que parsear."""
+    global _PARSER
+    if _PARSER is None:
+        from llama_parse import LlamaParse
+        _PARSER = LlamaParse(
+            api_key=os.getenv("LLAMA_CLOUD_API_KEY_2"),
+            result_type="markdown",  # Markdown preserva estrutura de tabelas
+            language="pt",
+            verbose=False
+        )
+    return _PARSER
+
+
+def preparar_execucao():
+    """Pastas e logs só quando algo vai de fato rodar (importar o módulo não tem efeito colateral)."""
+    garantir_pasta(DIR_SAIDA_BRUTA)
+    configurar_logging("extracao_llama")
 
 def extrair_texto_llama(caminho_pdf):
     """
     Usa LlamaParse para converter PDF em Markdown estruturado.
-    Ideal para documentos longos e tabelas.
+    Ideal para documentos longos e tabelas. Passa pelo cache de markdown.
     """
     try:
         # LlamaParse retorna uma lista de documentos (páginas)
-        documentos = parser.load_data(caminho_pdf)
+        paginas = carregar_markdown(obter_parser(), caminho_pdf)
         
         # Concatena tudo em um texto único
-        texto_completo = "\n\n".join([doc.text for doc in documentos])
+        texto_completo = "\n\n".join(paginas)
         return texto_completo
     except Exception as e:
         logging.error(f"Erro LlamaParse ao ler {caminho_pdf}: {e}")
         return None
 
-def consultar_claude_raw(texto_markdown, nome_arquivo):
+def consultar_claude_raw(texto_markdown, nome_arquivo, prazo=None, stream=False, metricas=None, pergunta=None, modelo=None):
     """
     Envia o TEXTO EXTRAÍDO para o Claude analisar.
     """
@@ -131,70 +140,136 @@ def consultar_claude_raw(texto_markdown, nome_arquivo):
     
     # Monta a mensagem com o texto extraído
     conteudo_msg = f"Analise o seguinte contrato (Texto Extraído):\n\n--- INICIO DO DOCUMENTO ---\n{texto_markdown}\n--- FIM DO DOCUMENTO ---"
+    if pergunta:
+        conteudo_msg += f"\n\n{pergunta}"
 
-    for tentativa in range(3):
-        try:
-            response = CLIENTE_API.chat.completions.create(
-                model=MODELO_IA,
-                messages=[
-                    {"role": "system", "content": prompt_system},
-                    {"role": "user", "content": conteudo_msg}
-                ],
-                temperature=0.0,
-                max_tokens=1500
-            )
-            
-            if response.choices and response.choices[0].message.content:
-                return response.choices[0].message.content
-                
-        except Exception as e:
-            logging.warning(f"Erro API (Tentativa {tentativa+1}): {e}")
-            time.sleep(2)
-            
-    return None
+    # Saída estruturada quando o modelo suporta JSON Schema
+    extras = {}
+    modelo = modelo or MODELO_IA  # outro modelo sobre o mesmo markdown (ex: benchmark)
+    formato = response_format_para(modelo)
+    if formato:
+        extras["response_format"] = formato
+    if stream:
+        # Sem isto o stream não traz uso e o custo da chamada sairia zerado
+        extras["stream_options"] = {"include_usage": True}
+
+    def chamar(timeout):
+        inicio = time.monotonic()
+        response = cliente_openrouter(TITULO_API, CHAVE_API_ENV).chat.completions.create(
+            model=modelo,
+            messages=[
+                {"role": "system", "content": prompt_system},
+                {"role": "user", "content": conteudo_msg}
+            ],
+            temperature=0.0,
+            max_tokens=1500,
+            timeout=timeout,
+            stream=stream,
+            **extras
+        )
+
+        # Streaming: para de ler (e cancela a geração) assim que o JSON fecha
+        if stream:
+            if prazo is not None:
+                # Cancelamento externo (ramo perdedor do hedge) fecha a conexão no meio da geração
+                prazo.ao_cancelar(response.close)
+            texto, medidas = coletar_objeto_json(response, inicio)
+            if metricas is not None:
+                metricas.update(medidas)
+            if not texto:
+                raise ErroRecuperavel("Resposta vazia do modelo (stream)")
+            return texto
+
+        if metricas is not None:
+            metricas.update({"modo": "completo", "tempo_total_s": round(time.monotonic() - inicio, 3)})
+            uso = getattr(response, "usage", None)
+            if uso is not None:
+                metricas.update({"tokens_entrada": uso.prompt_tokens, "tokens_saida": uso.completion_tokens})
+        if response.choices and response.choices[0].message.content:
+            return response.choices[0].message.content
+        # Conteúdo vazio (filtro, fim prematuro do provedor) não é sucesso: entra no retry
+        raise ErroRecuperavel("Resposta vazia do modelo")
+
+    try:
+        return executar_com_retry(chamar, provedor="openrouter", prazo=prazo, descricao=nome_arquivo)
+    except Exception as e:
+        logging.error(f"Falha definitiva na API para {nome_arquivo}: {e}")
+        return None
 
 def executar_extracao():
     if not os.path.exists(DIR_ENTRADA):
         print(f" Diretório de entrada não encontrado: {DIR_ENTRADA}")
         print("   -> Verifique a variável PASTA_ENTRADA no arquivo .env")
         return
+    preparar_execucao()
 
-    arquivos = [f for f in os.listdir(DIR_ENTRADA) if f.lower().endswith('.pdf')]
-    logging.info(f" INICIANDO EXTRAÇÃO VIA LLAMAPARSE: {len(arquivos)} arquivos")
-    print(f" Iniciando processamento de {len(arquivos)} arquivos (LlamaParse)...")
+    # Descoberta sob demanda: o primeiro PDF vai para o LlamaParse sem esperar a varredura inteira
+    estatisticas = {}
+    pendentes = arquivos_pendentes(DIR_ENTRADA, DIR_SAIDA_BRUTA, estatisticas=estatisticas)
+    # Triagem: criptografados/corrompidos não gastam crédito de parse
+    pendentes = filtrar_legiveis(pendentes)
+    logging.info(f" INICIANDO EXTRAÇÃO VIA LLAMAPARSE (varredura recursiva): {DIR_ENTRADA}")
+    print(" Iniciando processamento (LlamaParse)...")
     print(f" Lendo de: {DIR_ENTRADA}")
     print(f" Salvando em: {DIR_SAIDA_BRUTA}")
 
-    for i, arquivo in enumerate(arquivos):
-        nome_safe = os.path.splitext(arquivo)[0]
-        caminho_salvamento = os.path.join(DIR_SAIDA_BRUTA, f"{nome_safe}_RAW.json")
+    # 1. Extrai Texto (LlamaParse): vários PDFs em paralelo, markdown reaproveitado do cache
+    parseados = parsear_em_paralelo(obter_parser(), pendentes, caminho_de=lambda par: par[0])
 
-        if os.path.exists(caminho_salvamento):
-            logging.info(f" Pulando: {arquivo}")
-            print(f" [{i+1}/{len(arquivos)}] Pulando (Já existe): {arquivo}")
-            continue
+    for i, ((caminho_pdf, caminho_salvamento), paginas) in enumerate(parseados):
+        arquivo = os.path.basename(caminho_pdf)
 
-        logging.info(f"[{i+1}/{len(arquivos)}] Processando: {arquivo}")
-        print(f" [{i+1}/{len(arquivos)}] Lendo PDF com LlamaParse: {arquivo}...")
-        
-        caminho_pdf = os.path.join(DIR_ENTRADA, arquivo)
+        logging.info(f"[{i+1}] Processando: {caminho_pdf}")
+        print(f" [{i+1}] Texto pronto (LlamaParse): {arquivo}...")
         
-        # 1. Extrai Texto (LlamaParse)
-        texto_extraido = extrair_texto_llama(caminho_pdf)
+        # Prazo único por documento (análise; o parse já aconteceu em paralelo)
+        prazo = Prazo()
+
+        texto_extraido = "\n\n".join(paginas) if paginas else None
         
         if not texto_extraido:
             logging.error(f"   Falha na extração de texto: {arquivo}")
             continue
 
+        # Marcadores óbvios (gov.br, selo de cartório) resolvem status/data sem o modelo
+        pre = classificar_texto(texto_extraido) if PRE_CLASSIFICADOR_ATIVO else None
+        campos_locais = campos_confiaveis(pre)
+
+        # Contratos longos: só as seções relevantes + começo e fim, dentro do orçamento de tokens
+        texto_contexto, metricas_contexto = montar_contexto(texto_extraido)
+
         # 2. Analisa Texto (Claude)
-        print("    Enviando texto para IA analisar...")
-        resposta_raw = consultar_claude_raw(texto_extraido, arquivo)
+        print(f"    Enviando texto para IA analisar ({metricas_contexto['tokens_enviados']}/{metricas_contexto['tokens_originais']} tokens)...")
+        metricas = {}
+        with etapa("api", arquivo=arquivo):
+            resposta_raw = consultar_claude_raw(texto_contexto, arquivo, prazo=prazo, stream=MODO_STREAM, metricas=metricas)
 
         if resposta_raw:
+            # Valida contra o esquema e re-pede só os campos inválidos
+            campos_corrigidos, campos_invalidos = revisar_resposta(
+                resposta_raw,
+                lambda pergunta: consultar_claude_raw(texto_contexto, arquivo, prazo=prazo, pergunta=pergunta),
+                campos_locais=campos_locais,
+            )
+            ECONOMIA.registrar(pre, campos_locais, campos_corrigidos, campos_invalidos)
+
+            # Amostra de controle: mesma análise com o texto inteiro, para medir o efeito no acerto
+            if metricas_contexto["secoes_total"] and random.random() < AMOSTRA_AVALIACAO:
+                resposta_completa = consultar_claude_raw(texto_extraido, arquivo, prazo=prazo)
+                metricas_contexto["concordancia_campos"] = comparar_campos(
+                    extrair_json(resposta_raw)[0], extrair_json(resposta_completa or "")[0], CAMPOS_AVALIADOS
+                )
+
             pacote_dados = {
                 "arquivo_origem": arquivo,
+                "pasta_origem": pasta_relativa(caminho_pdf, DIR_ENTRADA),
                 "metodo_extracao": "LlamaParse",
                 "timestamp": datetime.now().isoformat(),
+                "metricas_chamada": metricas,
+                "metricas_contexto": metricas_contexto,
+                "campos_corrigidos": campos_corrigidos,
+                "campos_invalidos": campos_invalidos,
+                "pre_classificacao": pre,
                 "resposta_ia_raw": resposta_raw
             }
             
@@ -207,5 +282,9 @@ def executar_extracao():
             logging.error(f"    Falha na API IA: {arquivo}")
             print(f"    Erro na API para: {arquivo}")
 
+    print(f" Concluído: {estatisticas.get('pendentes', 0)} processados, {estatisticas.get('pulados', 0)} já existentes no lake.")
+    print(f" {ECONOMIA.resumo()}")
+    logging.info(ECONOMIA.resumo())
+
 if __name__ == "__main__":
     executar_extracao()
\ No newline at end of file
@@ -0,0 +1,143 @@
+import os
+import copy
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# --- LOG ESTRUTURADO (JSON lines, fora do caminho quente) ---
+# Os trabalhadores só põem o registro numa fila em memória (QueueHandler, sem trava de I/O);
+# uma thread única (QueueListener) grava o arquivo e o console. Cada linha do arquivo é um JSON
+# com execucao (id da execução), arquivo, etapa, tentativa e duração, quando houver: dá para
+# filtrar com jq/pandas em vez de grep. Os arquivos giram por tamanho.
+RUN_ID = os.getenv("RUN_ID") or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+LOG_MAX_MB = float(os.getenv("LOG_MAX_MB", "50"))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "10"))
+NIVEL_LOG = os.getenv("NIVEL_LOG", "INFO").upper()
+FORMATO_CONSOLE = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Campos de contexto que entram em cada linha (definidos por contexto_log / etapa)
+CAMPOS_CONTEXTO = ("arquivo", "etapa", "tentativa", "provedor", "trabalhador")
+CAMPOS_EXTRAS = ("duracao_s", "sucesso")
+
+_CONTEXTO = contextvars.ContextVar("contexto_log", default={})
+_LISTENER = None
+_TRAVA = threading.Lock()
+
+
+@contextmanager
+def contexto_log(**campos):
+    """Acrescenta campos (arquivo, tentativa...) a todo registro emitido dentro do bloco, nesta thread."""
+    token = _CONTEXTO.set({**_CONTEXTO.get(), **campos})
+    try:
+        yield
+    finally:
+        _CONTEXTO.reset(token)
+
+
+@contextmanager
+def etapa(nome, **campos):
+    """
+    Marca uma etapa do pipeline: os registros de dentro levam etapa=nome, e ao sair
+    é emitida uma linha com a duração (e sucesso=False se saiu por exceção).
+    """
+    inicio = time.monotonic()
+    sucesso = True
+    with contexto_log(etapa=nome, **campos):
+        try:
+            yield
+        except BaseException:
+            sucesso = False
+            raise
+        finally:
+            # Linha de métrica: vai só para o arquivo JSONL, não polui o console
+            logging.info(f"Etapa {nome} concluída",
+                         extra={"duracao_s": round(time.monotonic() - inicio, 3), "sucesso": sucesso, "metrica": True})
+
+
+def copiar_contexto(funcao):
+    """Leva o contexto atual para outra thread (ex: ThreadPoolExecutor.submit)."""
+    contexto = contextvars.copy_context()
+    return lambda *args, **kwargs: contexto.run(funcao, *args, **kwargs)
+
+
+class FiltroContexto(logging.Filter):
+    """Roda na thread que emite (antes da fila): é onde o contexto da thread ainda existe."""
+    def filter(self, record):
+        record.execucao = RUN_ID
+        for campo, valor in _CONTEXTO.get().items():
+            if not hasattr(record, campo):
+                setattr(record, campo, valor)
+        return True
+
+
+class FormatadorJSON(logging.Formatter):
+    def format(self, record):
+        linha = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "nivel": record.levelname,
+            "execucao": getattr(record, "execucao", RUN_ID),
+            "msg": record.getMessage().strip(),
+            "logger": record.name,
+            "thread": record.threadName,
+        }
+        for campo in CAMPOS_CONTEXTO + CAMPOS_EXTRAS:
+            valor = getattr(record, campo, None)
+            if valor is not None:
+                linha[campo] = valor
+        if record.exc_text:
+            linha["excecao"] = record.exc_text
+        return json.dumps(linha, ensure_ascii=False, default=str)
+
+
+class _HandlerFila(QueueHandler):
+    def prepare(self, record):
+        # Só texto viaja pela fila: args e traceback viram string aqui (na thread de origem);
+        # ao contrário do prepare padrão, os campos estruturados e o traceback ficam separados
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configurar(nome, dir_logs):
+    """
+    Instala o QueueHandler na raiz e inicia a thread de escrita (arquivo JSONL rotativo + console).
+    Idempotente: só a primeira chamada do processo vale. Retorna o caminho do arquivo de log.
+    """
+    global _LISTENER
+    with _TRAVA:
+        if _LISTENER is not None:
+            return _LISTENER.caminho
+        os.makedirs(dir_logs, exist_ok=True)
+        caminho = os.path.join(dir_logs, f"{nome}.jsonl")
+
+        arquivo = RotatingFileHandler(caminho, maxBytes=int(LOG_MAX_MB * 1024 * 1024),
+                                      backupCount=LOG_BACKUPS, encoding="utf-8", delay=True)
+        arquivo.setFormatter(FormatadorJSON())
+        console = logging.StreamHandler()
+        console.setFormatter(logging.Formatter(FORMATO_CONSOLE))
+        console.addFilter(lambda record: not getattr(record, "metrica", False))
+
+        fila = queue.SimpleQueue()   # sem limite: quem loga nunca espera
+        manipulador = _HandlerFila(fila)
+        manipulador.addFilter(FiltroContexto())
+
+        raiz = logging.getLogger()
+        raiz.setLevel(NIVEL_LOG)
+        raiz.addHandler(manipulador)
+
+        _LISTENER = QueueListener(fila, arquivo, console, respect_handler_level=True)
+        _LISTENER.caminho = caminho
+        _LISTENER.start()
+        # Esvazia a fila antes do processo terminar (inclusive no Ctrl+C)
+        atexit.register(_LISTENER.stop)
+        return caminho
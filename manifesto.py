@@ -0,0 +1,246 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import Counter
+
+from descoberta import descobrir_arquivos
+
+# --- MANIFESTO DO CORPUS (triagem em uma única passada) ---
+# Cada PDF é lido e aberto UMA vez: hash do conteúdo, tamanho, páginas e seus tamanhos, cobertura
+# da camada de texto, campos/assinaturas embutidas, impressão de deduplicação, pré-classificação e
+# sinais de priorização. Orçamento, escolha de páginas, dedupe e extração leem daqui em vez de
+# reabrir o arquivo; PDFs criptografados ou corrompidos saem da fila antes de gastar API.
+# JSONL só de acréscimo: vale a última linha de cada caminho, e a entrada é refeita quando o
+# tamanho ou o mtime do arquivo mudam (ou quando VERSAO muda).
+CAMINHO_MANIFESTO = os.getenv("MANIFESTO_CORPUS", os.path.join("outputs", "manifesto_corpus.jsonl"))
+VERSAO = 1                       # mude quando a triagem passar a gravar algo diferente
+MIN_CARACTERES_PAGINA = 50       # abaixo disso a página não tem camada de texto útil
+
+OK = "ok"
+# Demais status: "criptografado" (exige senha), "corrompido", "vazio" (0 páginas), "erro_leitura"
+
+
+def hash_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    """sha256 do conteúdo, lido em blocos (mesmo valor do campo "hash" da triagem)."""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _entrada_base(caminho, info):
+    return {
+        "caminho": os.path.abspath(caminho),
+        "arquivo": os.path.basename(caminho),
+        "tamanho": info.st_size,
+        "mtime_ns": info.st_mtime_ns,
+        "versao": VERSAO,
+        "hash": None,
+        "status": OK,
+        "erro": None,
+        "protegido": False,
+        "paginas": 0,
+        "tamanhos_pagina": [],
+        "caracteres_texto": 0,
+        "cobertura_texto": 0.0,
+        "tipo": None,
+        "campos_assinatura": 0,
+        "assinaturas": None,
+        "impressao": None,
+        "pre_classificacao": None,
+        "sinais": None,
+    }
+
+
+def triar_pdf(caminho):
+    """Lê o arquivo uma vez (hash + abertura pelo fitz a partir dos mesmos bytes) e monta a entrada."""
+    import fitz  # PyMuPDF
+    from assinatura_pdf import inspecionar_documento
+    from deduplicacao import impressao_documento
+    from pre_classificador import classificar_texto
+    from priorizacao import sinais_texto, PAGINAS_INICIO, PAGINAS_FIM
+
+    info = os.stat(caminho)
+    entrada = _entrada_base(caminho, info)
+    try:
+        with open(caminho, "rb") as f:
+            dados = f.read()
+    except OSError as e:
+        entrada.update(status="erro_leitura", erro=str(e))
+        return entrada
+    entrada["hash"] = hashlib.sha256(dados).hexdigest()
+
+    try:
+        doc = fitz.open(stream=dados, filetype="pdf")
+    except Exception as e:
+        entrada.update(status="corrompido", erro=str(e))
+        return entrada
+
+    with doc:
+        entrada["protegido"] = bool(doc.is_encrypted)
+        if doc.needs_pass:
+            entrada.update(status="criptografado", erro="PDF exige senha")
+            return entrada
+        if len(doc) == 0:
+            entrada.update(status="vazio", erro="PDF sem páginas")
+            return entrada
+        try:
+            textos = []
+            for pagina in doc:
+                entrada["tamanhos_pagina"].append([round(pagina.rect.width, 1), round(pagina.rect.height, 1)])
+                textos.append(pagina.get_text())
+            texto = "\n".join(textos)
+            assinaturas = inspecionar_documento(doc)
+            impressao = impressao_documento(doc, texto)
+        except Exception as e:
+            entrada.update(status="corrompido", erro=f"páginas ilegíveis: {e}")
+            return entrada
+
+    paginas = len(textos)
+    com_texto = sum(1 for t in textos if len(t.strip()) >= MIN_CARACTERES_PAGINA)
+    cobertura = com_texto / paginas
+    extremos = textos[:PAGINAS_INICIO] + textos[max(PAGINAS_INICIO, paginas - PAGINAS_FIM):]
+    aluguel, fim = sinais_texto("\n".join(extremos))
+    entrada.update({
+        "paginas": paginas,
+        "caracteres_texto": len(texto.strip()),
+        "cobertura_texto": round(cobertura, 3),
+        "tipo": "texto" if cobertura >= 0.9 else "escaneado" if cobertura <= 0.1 else "misto",
+        "campos_assinatura": len(assinaturas["assinaturas"]) + assinaturas["campos_vazios"],
+        "assinaturas": assinaturas,
+        "impressao": impressao,
+        "pre_classificacao": classificar_texto(texto),
+        "sinais": {"aluguel": aluguel, "fim": fim.isoformat() if fim else None},
+    })
+    return entrada
+
+
+class Manifesto:
+    """Índice em memória do JSONL; entradas velhas (arquivo alterado) são triadas de novo sob demanda."""
+    def __init__(self, caminho=CAMINHO_MANIFESTO):
+        self.caminho = caminho
+        self.entradas = {}
+        self._trava = threading.Lock()
+        if os.path.exists(caminho):
+            with open(caminho, "r", encoding="utf-8") as f:
+                for linha in f:
+                    try:
+                        entrada = json.loads(linha)
+                    except ValueError:
+                        continue  # última linha truncada por uma execução interrompida
+                    self.entradas[entrada["caminho"]] = entrada
+
+    def _atual(self, caminho):
+        entrada = self.entradas.get(os.path.abspath(caminho))
+        if entrada is None or entrada.get("versao") != VERSAO:
+            return None
+        try:
+            info = os.stat(caminho)
+        except OSError:
+            return None
+        if (info.st_size, info.st_mtime_ns) != (entrada["tamanho"], entrada["mtime_ns"]):
+            return None
+        return entrada
+
+    def obter(self, caminho):
+        """Entrada do arquivo, triando agora se ele ainda não está no manifesto (ou mudou)."""
+        entrada = self._atual(caminho)
+        if entrada is not None:
+            return entrada
+        try:
+            entrada = triar_pdf(caminho)
+        except OSError as e:
+            # Sumiu entre a descoberta e a triagem: não vai para o manifesto
+            return {"caminho": os.path.abspath(caminho), "arquivo": os.path.basename(caminho),
+                    "status": "erro_leitura", "erro": str(e), "paginas": 0}
+        self.adicionar(entrada)
+        return entrada
+
+    def adicionar(self, entrada):
+        with self._trava:
+            self.entradas[entrada["caminho"]] = entrada
+            pasta = os.path.dirname(self.caminho)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            with open(self.caminho, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+
+    def compactar(self):
+        """Reescreve o JSONL com uma linha por arquivo (as versões antigas das entradas somem)."""
+        with self._trava:
+            temporario = f"{self.caminho}.{os.getpid()}.tmp"
+            with open(temporario, "w", encoding="utf-8") as f:
+                for entrada in self.entradas.values():
+                    f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+            os.replace(temporario, self.caminho)
+
+
+_MANIFESTOS = {}
+
+
+def obter_manifesto(caminho=CAMINHO_MANIFESTO):
+    if caminho not in _MANIFESTOS:
+        _MANIFESTOS[caminho] = Manifesto(caminho)
+    return _MANIFESTOS[caminho]
+
+
+def legivel(entrada):
+    return entrada.get("status") == OK
+
+
+def filtrar_legiveis(pendentes, caminho_de=lambda par: par[0], contagem=None):
+    """Deixa passar só os PDFs que abrem; os demais são registrados no log e contados por status."""
+    manifesto = obter_manifesto()
+    for item in pendentes:
+        caminho = caminho_de(item)
+        if not caminho.lower().endswith(".pdf"):
+            yield item
+            continue
+        entrada = manifesto.obter(caminho)
+        if legivel(entrada):
+            yield item
+            continue
+        logging.warning(f"Triagem: {caminho} fora da extração ({entrada['status']}: {entrada['erro']})")
+        print(f"    Ignorado ({entrada['status']}): {os.path.basename(caminho)}")
+        if contagem is not None:
+            contagem[entrada["status"]] += 1
+
+
+def triar_corpus(raiz, extensoes=(".pdf",)):
+    """Gera a entrada de cada PDF da raiz (mesma descoberta dos extratores); só tria o que é novo ou mudou."""
+    manifesto = obter_manifesto()
+    for caminho in descobrir_arquivos(raiz, extensoes):
+        yield manifesto.obter(caminho)
+
+
+def executar_triagem(raiz=None):
+    from configuracao import PASTA_ENTRADA
+
+    raiz = raiz or PASTA_ENTRADA
+    if not raiz or not os.path.exists(raiz):
+        print(f" Diretório não encontrado: {raiz}")
+        return
+    print(f" Triagem do corpus: {raiz}")
+    status, tipos = Counter(), Counter()
+    paginas = 0
+    for entrada in triar_corpus(raiz):
+        status[entrada["status"]] += 1
+        if legivel(entrada):
+            tipos[entrada["tipo"]] += 1
+            paginas += entrada["paginas"]
+        else:
+            print(f"    {entrada['status']:<14} {entrada['caminho']} ({entrada['erro']})")
+    obter_manifesto().compactar()
+    print(f" {sum(status.values())} PDFs | {paginas} páginas | " + " | ".join(f"{k}: {v}" for k, v in sorted(status.items())))
+    print(" Camada de texto: " + " | ".join(f"{k}: {v}" for k, v in sorted(tipos.items())))
+    print(f" Manifesto: {CAMINHO_MANIFESTO}")
+
+
+if __name__ == "__main__":
+    try:
+        executar_triagem()
+    except KeyboardInterrupt:
+        print("\n Interrompido pelo usuário.")
@@ -0,0 +1,132 @@
+import os
+import math
+
+from cache_render import CACHE_RENDER_ATIVO, CACHE, hash_pdf, chave_imagem
+from roi_render import estimar_tokens
+
+# --- MOSAICO DE PÁGINAS (várias páginas numa imagem, para modelos cobrados por imagem) ---
+# As páginas escolhidas (ex: as de valores/prazo, ou as de assinatura) são compostas como vetor
+# numa página única do PyMuPDF (show_pdf_page) e rasterizadas uma vez, na resolução máxima que o
+# provedor aceita sem reduzir a imagem. Cada sequência contínua de páginas vira um ou mais mosaicos.
+MODO_MOSAICO = os.getenv("MODO_MOSAICO", "0") == "1"
+PAGINAS_MAXIMAS = int(os.getenv("MOSAICO_PAGINAS_MAXIMAS", "3"))
+ZOOM_MINIMO = float(os.getenv("MOSAICO_ZOOM_MINIMO", "1.2"))   # abaixo disso letra miúda fica ilegível
+ZOOM_MAXIMO = 2.0                                               # o mesmo zoom do modo página inteira
+MARGEM_PT = 6
+
+# Limites de imagem por provedor (lado maior, total de pixels): acima disso o provedor reduz a imagem
+PERFIS = {
+    "claude": {"lado_maximo": 1568, "pixels_maximos": 1_150_000},
+    "nemotron": {"lado_maximo": 2048, "pixels_maximos": 4_194_304},
+    "gemini": {"lado_maximo": 3072, "pixels_maximos": 9_437_184},
+}
+
+
+def sequencias(indices):
+    """[0, 1, 2, 8, 9] -> [[0, 1, 2], [8, 9]]: valores/prazo de um lado, assinaturas do outro."""
+    grupos = []
+    for i in indices:
+        if grupos and i == grupos[-1][-1] + 1:
+            grupos[-1].append(i)
+        else:
+            grupos.append([i])
+    return grupos
+
+
+def _celula(tamanhos):
+    """Célula da grade (pontos): cabe a maior página do grupo, mais a margem."""
+    return max(w for w, _ in tamanhos) + MARGEM_PT, max(h for _, h in tamanhos) + MARGEM_PT
+
+
+def _layout(tamanhos, perfil):
+    """Melhor grade (colunas, linhas, zoom) para as páginas: a que permite o maior zoom."""
+    largura, altura = _celula(tamanhos)
+    melhor = None
+    for colunas in range(1, len(tamanhos) + 1):
+        linhas = math.ceil(len(tamanhos) / colunas)
+        w, h = colunas * largura, linhas * altura
+        zoom = min(ZOOM_MAXIMO, perfil["lado_maximo"] / max(w, h), math.sqrt(perfil["pixels_maximos"] / (w * h)))
+        if melhor is None or zoom > melhor[2]:
+            melhor = (colunas, linhas, zoom)
+    return melhor
+
+
+def agrupar(indices, tamanhos_pagina, perfil, paginas_maximas=PAGINAS_MAXIMAS):
+    """
+    Divide cada sequência em mosaicos de até paginas_maximas páginas, reduzindo o tamanho do
+    grupo até todos ficarem com zoom >= ZOOM_MINIMO. Retorna [(páginas, colunas, linhas, zoom)].
+    """
+    for tamanho in range(max(1, paginas_maximas), 0, -1):
+        grupos = []
+        for sequencia in sequencias(indices):
+            for inicio in range(0, len(sequencia), tamanho):
+                paginas = sequencia[inicio:inicio + tamanho]
+                grupos.append((paginas, *_layout([tamanhos_pagina[i] for i in paginas], perfil)))
+        if tamanho == 1 or all(zoom >= ZOOM_MINIMO for *_, zoom in grupos):
+            return grupos
+
+
+def _compor(doc, paginas, celula, colunas, linhas, zoom):
+    import fitz  # PyMuPDF
+
+    largura, altura = celula
+    with fitz.open() as composto:
+        folha = composto.new_page(width=colunas * largura, height=linhas * altura)
+        for n, i in enumerate(paginas):
+            linha, coluna = divmod(n, colunas)
+            area = fitz.Rect(coluna * largura, linha * altura, (coluna + 1) * largura, (linha + 1) * altura)
+            folha.show_pdf_page(area + (MARGEM_PT / 2, MARGEM_PT / 2, -MARGEM_PT / 2, -MARGEM_PT / 2), doc, i)
+            # Moldura fina: o modelo distingue onde acaba cada página
+            folha.draw_rect(area, color=(0.5, 0.5, 0.5), width=0.8)
+        return folha.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("jpeg")
+
+
+def mosaicos_jpeg(caminho_pdf, indices, nome_perfil, tamanhos_pagina):
+    """
+    JPEGs compostos das páginas escolhidas + relatório (imagens, tokens estimados x uma imagem por página).
+    tamanhos_pagina: [[largura, altura], ...] em pontos, do manifesto do corpus.
+    """
+    import fitz  # PyMuPDF
+
+    indices = list(indices)
+    perfil = PERFIS[nome_perfil]
+    grupos = agrupar(indices, tamanhos_pagina, perfil)
+    hash_conteudo = hash_pdf(caminho_pdf) if CACHE_RENDER_ATIVO else None
+    doc = None
+    imagens, tokens = [], 0
+    try:
+        for paginas, colunas, linhas, zoom in grupos:
+            celula = _celula([tamanhos_pagina[i] for i in paginas])
+            chave = None
+            if hash_conteudo:
+                rotulo = "mosaico:" + "+".join(map(str, paginas))
+                chave = chave_imagem(hash_conteudo, rotulo, zoom, extra=f"{nome_perfil}|{colunas}x{linhas}|{MARGEM_PT}")
+            jpeg = CACHE.ler(chave) if chave else None
+            if jpeg is None:
+                # Só abre o PDF se algum mosaico faltar no cache
+                doc = doc if doc is not None else fitz.open(caminho_pdf)
+                jpeg = _compor(doc, paginas, celula, colunas, linhas, zoom)
+                if chave:
+                    CACHE.gravar(chave, jpeg)
+            tokens += estimar_tokens(math.ceil(colunas * celula[0] * zoom), math.ceil(linhas * celula[1] * zoom))
+            imagens.append(jpeg)
+    finally:
+        if doc is not None:
+            doc.close()
+
+    # Referência: uma imagem por página em zoom 2.0 (o modo padrão); tokens pela fórmula de roi_render
+    tokens_por_pagina = sum(estimar_tokens(math.ceil(w * ZOOM_MAXIMO), math.ceil(h * ZOOM_MAXIMO))
+                            for w, h in (tamanhos_pagina[i] for i in indices))
+    relatorio = {
+        "modo": "mosaico",
+        "perfil": nome_perfil,
+        "paginas": len(indices),
+        "imagens": len(imagens),
+        "zoom_minimo": round(min(zoom for *_, zoom in grupos), 2) if grupos else None,
+        "bytes": sum(len(i) for i in imagens),
+        "tokens_estimados": tokens,
+        "tokens_uma_imagem_por_pagina": tokens_por_pagina,
+    }
+    if tokens_por_pagina:
+        relatorio["economia_tokens_pct"] = round(100 * (1 - tokens / tokens_por_pagina), 1)
+    return imagens, relatorio
@@ -0,0 +1,96 @@
+import pandas as pd
+
+# --- NORMALIZAÇÃO COLUNAR (lote inteiro de uma vez) ---
+# Equivalente vetorizado de normalizar_data / sanitizar_valor_monetario (02_processador),
+# que continuam disponíveis para uso registro a registro.
+
+# Despacho por regex: cada formato de normalizar_data vira um padrão exclusivo,
+# então cada valor é convertido uma única vez, sem exceções por tentativa.
+FORMATOS_DATA = [
+    (r"\d{1,2}/\d{1,2}/\d{4}", "%d/%m/%Y"),
+    (r"\d{4}-\d{1,2}-\d{1,2}", "%Y-%m-%d"),
+    (r"\d{1,2}-\d{1,2}-\d{4}", "%d-%m-%Y"),
+    (r"\d{1,2}\.\d{1,2}\.\d{4}", "%d.%m.%Y"),
+    (r"\d{4}/\d{1,2}/\d{1,2}", "%Y/%m/%d"),
+]
+
+COLUNAS_DATA = ["data_inicio_contrato", "data_fim_contrato", "data_evidencia"]
+COLUNAS_DINHEIRO = ["valor_aluguel_mensal_float", "custo_registro_cartorio_float"]
+# Strings em armazenamento Python: com pyarrow instalado o pandas 3 usa o backend Arrow,
+# cujo str.find quebra em colunas só com nulos
+TEXTO = "string[python]"
+
+
+def normalizar_datas(serie):
+    """
+    Converte uma coluna inteira de datas em texto.
+    Retorna (datas datetime64 com NaT nas inválidas, máscara de validade).
+    """
+    texto = serie.astype(TEXTO).str.strip().fillna("")
+    datas = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    for padrao, formato in FORMATOS_DATA:
+        mascara = texto.str.fullmatch(padrao)
+        if mascara.any():
+            datas[mascara] = pd.to_datetime(texto[mascara], format=formato, errors="coerce")
+    return datas, datas.notna()
+
+
+def sanitizar_valores_monetarios(serie):
+    """
+    Converte uma coluna inteira de valores em BRL/USD ("R$ 1.234,56", "1,234.56", 1234.56).
+    Retorna (valores float com 0.0 nos inválidos, máscara de validade).
+    """
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        valores = serie.astype(float).fillna(0.0)
+        return valores, serie.notna()
+
+    valores = pd.Series(0.0, index=serie.index)
+    valida = pd.Series(False, index=serie.index)
+
+    # Números já tipados passam direto (mesma regra do escalar: float(valor))
+    eh_numero = pd.Series([isinstance(v, (int, float)) for v in serie], index=serie.index, dtype=bool)
+    if eh_numero.any():
+        numeros = serie[eh_numero].astype(float)
+        valores[eh_numero] = numeros.fillna(0.0)
+        valida[eh_numero] = numeros.notna()
+
+    texto = (
+        serie[~eh_numero].astype(TEXTO)
+        .str.replace("R$", "", regex=False)
+        .str.replace("$", "", regex=False)
+        .str.strip()
+    )
+    pos_ponto = texto.str.find(".")
+    pos_virgula = texto.str.find(",")
+    ambos = (pos_ponto >= 0) & (pos_virgula >= 0)
+
+    # "1.234,56" -> ponto de milhar; "1,234.56" -> vírgula de milhar; "12,5" -> vírgula decimal
+    br = ambos & (pos_ponto < pos_virgula)
+    us = ambos & ~br
+    so_virgula = (pos_virgula >= 0) & (pos_ponto < 0)
+
+    texto = texto.mask(br, texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    texto = texto.mask(us, texto.str.replace(",", "", regex=False))
+    texto = texto.mask(so_virgula, texto.str.replace(",", ".", regex=False))
+
+    convertidos = pd.to_numeric(texto, errors="coerce")
+    ok = convertidos.notna().fillna(False).astype(bool)
+    valores[~eh_numero] = convertidos.where(ok, 0.0).astype(float)
+    valida[~eh_numero] = ok
+    return valores, valida
+
+
+def normalizar_lote(df):
+    """
+    Etapa de normalização do Data Lake inteiro.
+    Substitui as colunas monetárias por float, cria <coluna>_dt para as datas
+    e <coluna>_valida com a máscara de validade de cada campo.
+    """
+    df = df.copy()
+    for coluna in COLUNAS_DINHEIRO:
+        origem = df[coluna] if coluna in df.columns else pd.Series(None, index=df.index, dtype=object)
+        df[coluna], df[f"{coluna}_valida"] = sanitizar_valores_monetarios(origem)
+    for coluna in COLUNAS_DATA:
+        origem = df[coluna] if coluna in df.columns else pd.Series(None, index=df.index, dtype=object)
+        df[f"{coluna}_dt"], df[f"{coluna}_valida"] = normalizar_datas(origem)
+    return df
@@ -0,0 +1,176 @@
+import os
+import re
+import unicodedata
+from collections import Counter
+from datetime import datetime
+
+# --- PRÉ-CLASSIFICADOR LOCAL (marcadores textuais de assinatura) ---
+# Os mesmos indícios que os prompts pedem ao modelo, procurados direto na camada de texto.
+PRE_CLASSIFICADOR_ATIVO = os.getenv("PRE_CLASSIFICADOR_ATIVO", "1") == "1"
+LIMIAR_CONFIANCA = float(os.getenv("PRE_CLASSIFICADOR_LIMIAR", "0.9"))
+MIN_CARACTERES_TEXTO = 200      # abaixo disso a camada de texto não existe (PDF escaneado)
+JANELA_ANTES, JANELA_DEPOIS = 150, 250  # onde procurar a data em volta de um marcador
+
+DIGITAL = "DIGITAL (GOV/ICP)"
+COM_FIRMA = "FÍSICA (COM FIRMA)"
+
+# (categoria, padrão sobre texto minúsculo e sem acento, peso). Espaço no padrão = qualquer espaço/quebra.
+# Um marcador isolado nunca passa do limiar: cláusulas como "poderá ser assinado digitalmente" existem.
+MARCADORES = [
+    (DIGITAL, r"assinado digitalmente", 0.6),
+    (DIGITAL, r"assinatura (eletronica|digital) (qualificada|avancada)", 0.5),
+    (DIGITAL, r"icp ?- ?brasil", 0.6),
+    (DIGITAL, r"(verifique|valide|validar|verificar) (em|no|a autenticidade)(?=[^\n]{0,60}gov\.br)", 0.6),
+    (DIGITAL, r"validar\.iti\.gov\.br|assinador\.iti\.br", 0.7),
+    (DIGITAL, r"gov\.br", 0.2),
+    (DIGITAL, r"docusign|envelope id", 0.6),
+    (DIGITAL, r"clicksign|d4sign|adobe (acrobat )?sign|zapsign", 0.6),
+    (DIGITAL, r"carimbo (de )?tempo", 0.4),
+    (DIGITAL, r"certificado digital", 0.3),
+    (DIGITAL, r"\bhash\b|sha ?- ?256", 0.15),
+    (COM_FIRMA, r"reconheco (a |as )?(firmas?|por semelhanca|por autenticidade)", 0.7),
+    (COM_FIRMA, r"reconhecimento de firmas?", 0.4),
+    (COM_FIRMA, r"em testemunho (da verdade|do que)", 0.6),
+    (COM_FIRMA, r"\bdou fe\b", 0.5),
+    (COM_FIRMA, r"tabeli(ao|a|onato)|oficial de notas|escrevente", 0.3),
+    (COM_FIRMA, r"selo (digital|de fiscalizacao|de autenticidade)", 0.4),
+    (COM_FIRMA, r"cartorio", 0.15),
+]
+_ESPACO = r"\s+"
+_COMBINADO = re.compile(
+    "|".join(f"(?P<m{i}>{padrao.replace(' ', _ESPACO)})" for i, (_, padrao, _) in enumerate(MARCADORES))
+)
+
+MESES = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "abril": 4, "maio": 5, "junho": 6,
+    "julho": 7, "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12,
+}
+_RE_DATAS = re.compile(
+    r"\b(?P<d>\d{1,2})[/.-](?P<m>\d{1,2})[/.-](?P<a>\d{4})\b"
+    r"|\b(?P<de>\d{1,2})\s+de\s+(?P<me>" + "|".join(MESES) + r")\s+de\s+(?P<ae>\d{4})\b"
+)
+
+
+def _normalizar(texto):
+    """Minúsculas e sem acento, caractere a caractere (as posições batem com o texto original)."""
+    return "".join(unicodedata.normalize("NFKD", c.lower())[:1] for c in texto)
+
+
+def _data(match):
+    try:
+        if match.group("d"):
+            data = datetime(int(match.group("a")), int(match.group("m")), int(match.group("d")))
+        else:
+            data = datetime(int(match.group("ae")), MESES[match.group("me")], int(match.group("de")))
+    except ValueError:
+        return None
+    return data if 1990 <= data.year <= 2100 else None
+
+
+def _combinar(pesos):
+    """Confiança de indícios independentes: 1 - prod(1 - peso)."""
+    restante = 1.0
+    for peso in pesos:
+        restante *= 1.0 - peso
+    return 1.0 - restante
+
+
+def classificar_texto(texto):
+    """
+    Classifica o status de assinatura pelos marcadores do texto.
+    Retorna {"status", "confianca", "data_evidencia", "confianca_data", "marcadores", "descricao_prova"}.
+    Só afirma DIGITAL ou COM FIRMA: ausência de marcador não prova SEM FIRMA/NÃO ASSINADO.
+    """
+    resultado = {
+        "status": None, "confianca": 0.0, "data_evidencia": None, "confianca_data": 0.0,
+        "marcadores": [], "descricao_prova": None,
+    }
+    if not texto or len(texto.strip()) < MIN_CARACTERES_TEXTO:
+        resultado["motivo"] = "sem camada de texto"
+        return resultado
+
+    normalizado = _normalizar(texto)
+    achados = {DIGITAL: {}, COM_FIRMA: {}}  # categoria -> {indice_marcador: [posições]}
+    for match in _COMBINADO.finditer(normalizado):
+        indice = int(match.lastgroup[1:])
+        achados[MARCADORES[indice][0]].setdefault(indice, []).append(match.span())
+
+    confiancas = {
+        categoria: _combinar(MARCADORES[i][2] for i in indices)
+        for categoria, indices in achados.items()
+    }
+    status = max(confiancas, key=confiancas.get)
+    outra = confiancas[COM_FIRMA if status == DIGITAL else DIGITAL]
+    # Indícios das duas categorias ao mesmo tempo: deixa o modelo decidir
+    confianca = confiancas[status] * (1.0 - outra)
+    if confiancas[status] == 0.0:
+        return resultado
+
+    resultado["status"] = status
+    resultado["confianca"] = round(confianca, 3)
+    # Texto original de cada marcador encontrado (primeira ocorrência)
+    resultado["marcadores"] = [
+        re.sub(r"\s+", " ", texto[inicio:fim]) for inicio, fim in sorted(p[0] for p in achados[status].values())
+    ]
+
+    # Datas perto dos marcadores fortes (selo, manifesto, carimbo de tempo)
+    datas = []
+    fortes = []
+    for indice, posicoes in achados[status].items():
+        if MARCADORES[indice][2] < 0.4:
+            continue
+        for inicio, fim in posicoes:
+            fortes.append((inicio, fim))
+            trecho = normalizado[max(0, inicio - JANELA_ANTES):fim + JANELA_DEPOIS]
+            datas.extend(d for d in (_data(m) for m in _RE_DATAS.finditer(trecho)) if d)
+
+    if fortes:
+        inicio = min(i for i, _ in fortes)
+        trecho = texto[max(0, inicio - 40):inicio + 300]
+        resultado["descricao_prova"] = re.sub(r"\s+", " ", trecho).strip()
+    if datas:
+        # Vale a última assinatura: o contrato só está completo quando todos assinaram
+        ultima = max(datas)
+        resultado["data_evidencia"] = ultima.strftime("%d/%m/%Y")
+        dispersao_dias = (ultima - min(datas)).days
+        resultado["confianca_data"] = round(confianca * (0.5 if dispersao_dias > 365 else 1.0), 3)
+    return resultado
+
+
+def campos_confiaveis(pre, limiar=LIMIAR_CONFIANCA):
+    """Campos (no formato do RAW) que o pré-classificador resolve sem o modelo."""
+    if not pre or not pre.get("status") or pre.get("confianca", 0.0) < limiar:
+        return {}
+    campos = {"status": pre["status"], "descricao_prova": pre.get("descricao_prova")}
+    if pre.get("data_evidencia") and pre.get("confianca_data", 0.0) >= limiar:
+        campos["data_evidencia"] = pre["data_evidencia"]
+    return campos
+
+
+class Economia:
+    """Contabiliza o que o pré-classificador resolveu localmente."""
+    def __init__(self):
+        self.contagem = Counter()
+
+    def registrar(self, pre, campos_locais, campos_corrigidos=None, campos_invalidos=None):
+        self.contagem["documentos"] += 1
+        if pre and pre.get("motivo") != "sem camada de texto":
+            self.contagem["com_texto"] += 1
+        for campo in campos_locais:
+            self.contagem[f"campo_{campo}"] += 1
+        # Re-consulta de correção evitada: tudo o que estava inválido foi coberto localmente
+        if campos_corrigidos and not campos_invalidos and set(campos_corrigidos) <= set(campos_locais):
+            self.contagem["chamadas_evitadas"] += 1
+
+    def campos_fora_do_llm(self, campos_locais):
+        """Campos que o LLM deixou de extrair (o pedido encolhe; a chamada das partes continua)."""
+        self.contagem["campos_fora_do_llm"] += sum(1 for c in ("status", "data_evidencia") if campos_locais.get(c))
+
+    def resumo(self):
+        c = self.contagem
+        return (f"Pré-classificador: {c['documentos']} documentos ({c['com_texto']} com texto) | "
+                f"status local: {c['campo_status']} | data local: {c['campo_data_evidencia']} | "
+                f"campos fora do LLM: {c['campos_fora_do_llm']} | re-consultas evitadas: {c['chamadas_evitadas']}")
+
+
+ECONOMIA = Economia()
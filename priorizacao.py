@@ -0,0 +1,168 @@
+import os
+import re
+import math
+import time
+import logging
+from datetime import datetime
+
+# --- PRIORIZAÇÃO DA EXTRAÇÃO (valor e prazo primeiro) ---
+# Com teto de orçamento e rate limit, a ordem importa: os contratos de aluguel alto (custo de
+# registro alto) que atravessam o início da CBS são extraídos antes, em vez da ordem do disco.
+# Os sinais são locais e baratos: camada de texto de poucas páginas, nº de páginas, pasta e data.
+PRIORIZAR = os.getenv("PRIORIZAR_EXTRACAO", "0") == "1"
+PASTAS_PRIORITARIAS = [p.strip().lower() for p in os.getenv("PRIORIDADE_PASTAS", "").split(",") if p.strip()]
+PAGINAS_INICIO, PAGINAS_FIM = 3, 2   # valor/prazo no começo, datas de assinatura no fim
+INICIO_VIGENCIA_CBS = datetime(2027, 1, 1)
+
+PESO_PRAZO = {True: 1.0, None: 0.6, False: 0.25}   # atravessa 2027? (None = não deu para saber)
+PESO_PASTA_PRIORITARIA = 2.0
+PESO_RECENTE = 1.2                                 # arquivo modificado no último ano: contrato em vigor
+ALUGUEL_MINIMO, ALUGUEL_MAXIMO = 100.0, 5_000_000.0
+
+_RE_VALOR = re.compile(r"R\$\s*(\d{1,3}(?:\.\d{3})*(?:,\d{2})?|\d+(?:,\d{2})?)")
+_RE_ALUGUEL = re.compile(r"alug|locat[íi]c|mensa", re.IGNORECASE)
+_RE_OUTROS_VALORES = re.compile(r"multa|cau[çc][ãa]o|garantia|seguro|indeniza|condom[íi]nio|iptu", re.IGNORECASE)
+_RE_FIM_FRASE = re.compile(r"[;\n]|\.\s")
+_RE_DATA = re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4})\b")
+_RE_PRAZO = re.compile(r"prazo\D{0,60}?(\d{1,3})\s*(?:\([^)]*\)\s*)?(meses|anos)", re.IGNORECASE)
+
+
+def _valor(texto):
+    try:
+        return float(texto.replace(".", "").replace(",", "."))
+    except ValueError:
+        return None
+
+
+def _datas(texto):
+    datas = []
+    for d, m, a in _RE_DATA.findall(texto):
+        try:
+            data = datetime(int(a), int(m), int(d))
+        except ValueError:
+            continue
+        if 1990 <= data.year <= 2100:
+            datas.append(data)
+    return datas
+
+
+def sinais_texto(texto):
+    """Aluguel e fim de vigência estimados pela camada de texto (None quando não aparecem)."""
+    aluguel = None
+    for match in _RE_VALOR.finditer(texto):
+        # Só valores com "aluguel"/"locatício"/"mensal" na mesma frase (multa e caução ficam de fora)
+        antes = _RE_FIM_FRASE.split(texto[max(0, match.start() - 120):match.start()])[-1]
+        depois = _RE_FIM_FRASE.split(texto[match.end():match.end() + 40])[0]
+        frase = antes + depois
+        if not _RE_ALUGUEL.search(frase) or _RE_OUTROS_VALORES.search(frase):
+            continue
+        valor = _valor(match.group(1))
+        if valor and ALUGUEL_MINIMO <= valor <= ALUGUEL_MAXIMO:
+            aluguel = max(aluguel or 0.0, valor)
+
+    datas = _datas(texto)
+    fim = max(datas) if datas else None
+    prazo = _RE_PRAZO.search(texto)
+    if prazo and datas:
+        meses = int(prazo.group(1)) * (12 if prazo.group(2).lower() == "anos" else 1)
+        inicio = min(datas)
+        ano, mes = divmod(inicio.month - 1 + meses, 12)
+        fim_prazo = inicio.replace(year=inicio.year + ano, month=mes + 1, day=1)
+        fim = max(fim, fim_prazo)
+    return aluguel, fim
+
+
+def sinais_pdf(caminho_pdf):
+    """
+    Sinais baratos de um PDF: páginas, aluguel/fim estimados, data do arquivo.
+    Vêm do manifesto do corpus (a triagem já leu o texto das primeiras/últimas páginas).
+    """
+    from manifesto import obter_manifesto, legivel
+
+    sinais = {"paginas": 0, "aluguel": None, "fim": None, "tem_texto": False, "modificado": None}
+    try:
+        sinais["modificado"] = os.path.getmtime(caminho_pdf)
+    except OSError as e:
+        logging.warning(f"Priorização: não leu {caminho_pdf}: {e}")
+        return sinais
+    entrada = obter_manifesto().obter(caminho_pdf)
+    if not legivel(entrada):
+        logging.warning(f"Priorização: {caminho_pdf} ilegível ({entrada['status']})")
+        return sinais
+    sinais["paginas"] = entrada["paginas"]
+    sinais["tem_texto"] = entrada["tipo"] != "escaneado"
+    sinais["aluguel"] = entrada["sinais"]["aluguel"]
+    if entrada["sinais"]["fim"]:
+        sinais["fim"] = datetime.fromisoformat(entrada["sinais"]["fim"])
+    return sinais
+
+
+def pontuar(sinais, caminho, aluguel_padrao):
+    """Pontuação ~ base anual de registro em jogo (aluguel x 12), ajustada por prazo, pasta e data."""
+    aluguel = sinais["aluguel"] or aluguel_padrao
+    atravessa = None if sinais["fim"] is None else sinais["fim"] >= INICIO_VIGENCIA_CBS
+    pontos = aluguel * 12 * PESO_PRAZO[atravessa]
+    if PASTAS_PRIORITARIAS and any(p in caminho.lower() for p in PASTAS_PRIORITARIAS):
+        pontos *= PESO_PASTA_PRIORITARIA
+    if sinais["modificado"] and time.time() - sinais["modificado"] < 365 * 86400:
+        pontos *= PESO_RECENTE
+    return round(pontos, 2)
+
+
+def priorizar(pendentes, caminho_de=lambda par: par[0]):
+    """
+    Lê os sinais de todos os pendentes e devolve [(item, pontuação)] do mais ao menos importante.
+    Sem aluguel no texto (PDF escaneado) o contrato recebe a mediana dos conhecidos: fica no meio da fila.
+    """
+    itens = list(pendentes)
+    sinais = [sinais_pdf(caminho_de(item)) for item in itens]
+    conhecidos = sorted(s["aluguel"] for s in sinais if s["aluguel"])
+    aluguel_padrao = conhecidos[len(conhecidos) // 2] if conhecidos else ALUGUEL_MINIMO
+    pontuados = [(item, pontuar(s, caminho_de(item), aluguel_padrao)) for item, s in zip(itens, sinais)]
+    # Empate: menos páginas primeiro (mais barato, libera o lote mais cedo)
+    ordem = sorted(range(len(itens)), key=lambda i: (-pontuados[i][1], sinais[i]["paginas"]))
+    return [pontuados[i] for i in ordem]
+
+
+class FilaPriorizada:
+    """
+    Itera os pendentes em ordem de prioridade e mede quando o decil do topo terminou.
+    Um item conta como concluído quando o laço pede o próximo (o processamento é síncrono).
+    """
+    def __init__(self, pendentes, caminho_de=lambda par: par[0]):
+        inicio = time.monotonic()
+        descobertos = list(pendentes)
+        self.pontuados = priorizar(descobertos, caminho_de)
+        posicao_original = {id(item): i for i, item in enumerate(descobertos)}
+        self.posicoes_originais = [posicao_original[id(item)] for item, _ in self.pontuados]
+        self.tempo_priorizacao = time.monotonic() - inicio
+        self.concluidos = []   # instante de conclusão de cada item, na ordem priorizada
+        logging.info(f"Priorização: {len(self.pontuados)} arquivos ordenados em {self.tempo_priorizacao:.1f}s")
+
+    def __len__(self):
+        return len(self.pontuados)
+
+    def __iter__(self):
+        self.inicio = time.monotonic()
+        for item, _ in self.pontuados:
+            yield item
+            self.concluidos.append(time.monotonic() - self.inicio)
+
+    def relatorio(self):
+        total = len(self.pontuados)
+        if not total or not self.concluidos:
+            return "Priorização: nada processado."
+        decil = max(1, math.ceil(total / 10))
+        if len(self.concluidos) < decil:
+            return f"Priorização: decil do topo incompleto ({len(self.concluidos)}/{decil})."
+        fim_decil = self.concluidos[decil - 1]
+        fim_total = self.concluidos[-1] or 1e-9
+        valor_decil = sum(p for _, p in self.pontuados[:decil])
+        valor_total = sum(p for _, p in self.pontuados) or 1e-9
+        # Na ordem de descoberta, o decil do topo só fecharia quando saísse o último dos seus itens
+        ultimo_sem_priorizar = max(self.posicoes_originais[:decil]) + 1
+        return (
+            f"Priorização: decil do topo ({decil} contratos, {100 * valor_decil / valor_total:.0f}% do valor em jogo) "
+            f"concluído em {fim_decil:.0f}s = {100 * fim_decil / fim_total:.0f}% do tempo da execução, "
+            f"após {decil} de {total} arquivos (sem priorizar: após {ultimo_sem_priorizar})."
+        )
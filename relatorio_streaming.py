@@ -0,0 +1,156 @@
+import os
+import json
+import heapq
+import shutil
+import logging
+from datetime import datetime
+
+import xlsxwriter
+
+# --- FORMATOS DO RELATÓRIO (os mesmos usados no pd.ExcelWriter original) ---
+FORMATO_DINHEIRO = {'num_format': 'R$ #,##0.00'}
+FORMATO_DATA = {'num_format': 'dd/mm/yyyy'}
+
+COLUNAS_DATA = {"INICIO_VIGENCIA", "FIM_VIGENCIA", "DATA_PROVA"}
+COLUNAS_DINHEIRO = {"CUSTO_REGISTRO", "VALOR_ALUGUEL"}
+LARGURAS = {"ARQUIVO": 40, "ACAO_RECOMENDADA": 30, "MOTIVO_GEMINI": 50}
+
+LINHAS_POR_LOTE = int(os.getenv("RELATORIO_LINHAS_POR_LOTE", "5000"))
+# Lotes em disco: uma subpasta por execução (run_id), para achar e recuperar um relatório interrompido
+DIR_SPOOL = os.getenv("DIR_SPOOL_RELATORIO", os.path.join("outputs", "spool_relatorio"))
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return {"__dt__": valor.isoformat()}
+    return valor
+
+
+def _desserializar(valor):
+    if isinstance(valor, dict) and "__dt__" in valor:
+        return datetime.fromisoformat(valor["__dt__"])
+    return valor
+
+
+def _ler_lote(caminho):
+    with open(caminho, 'r', encoding='utf-8') as f:
+        for linha in f:
+            yield {k: _desserializar(v) for k, v in json.loads(linha).items()}
+
+
+class EscritorRelatorioStreaming:
+    """
+    Relatório Excel em memória constante.
+    As linhas vão para lotes ordenados em disco (gravados a cada LINHAS_POR_LOTE)
+    e, no fechamento, uma intercalação externa (k-way merge) por CUSTO_REGISTRO
+    escreve direto no xlsxwriter em modo constant_memory.
+    Se a execução for interrompida, os lotes já gravados geram um relatório parcial.
+    """
+    def __init__(self, caminho_excel, colunas, chave="CUSTO_REGISTRO", decrescente=True,
+                 linhas_por_lote=LINHAS_POR_LOTE, nome_aba="Auditoria", dir_spool=None, run_id=None):
+        self.caminho_excel = caminho_excel
+        self.colunas = list(colunas)
+        self.chave = chave
+        self.decrescente = decrescente
+        self.linhas_por_lote = linhas_por_lote
+        self.nome_aba = nome_aba
+        # Sem run_id, o nome do relatório identifica a execução
+        self.dir_spool = dir_spool or os.path.join(
+            DIR_SPOOL, run_id or os.path.splitext(os.path.basename(caminho_excel))[0]
+        )
+        os.makedirs(self.dir_spool, exist_ok=True)
+        logging.info(f"Spool do relatório: {os.path.abspath(self.dir_spool)}")
+        self.buffer = []
+        self.lotes = sorted(
+            os.path.join(self.dir_spool, f) for f in os.listdir(self.dir_spool) if f.endswith(".jsonl")
+        )
+        self.total_linhas = 0
+
+    def _valor_ordenacao(self, registro):
+        valor = registro.get(self.chave)
+        valor = float(valor) if isinstance(valor, (int, float)) else 0.0
+        return -valor if self.decrescente else valor
+
+    def adicionar(self, registro):
+        self.buffer.append(registro)
+        self.total_linhas += 1
+        if len(self.buffer) >= self.linhas_por_lote:
+            self.descarregar()
+
+    def descarregar(self):
+        """Grava o buffer como um lote ordenado e durável no disco."""
+        if not self.buffer:
+            return
+        self.buffer.sort(key=self._valor_ordenacao)
+        caminho = os.path.join(self.dir_spool, f"lote_{len(self.lotes):06d}.jsonl")
+        with open(caminho, 'w', encoding='utf-8') as f:
+            for registro in self.buffer:
+                f.write(json.dumps({k: _serializar(v) for k, v in registro.items()}, ensure_ascii=False))
+                f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.lotes.append(caminho)
+        self.buffer = []
+
+    def _escrever_excel(self, caminho_excel):
+        workbook = xlsxwriter.Workbook(caminho_excel, {'constant_memory': True})
+        worksheet = workbook.add_worksheet(self.nome_aba)
+        money_fmt = workbook.add_format(FORMATO_DINHEIRO)
+        date_fmt = workbook.add_format(FORMATO_DATA)
+
+        # Em constant_memory as colunas precisam ser configuradas antes das linhas
+        for idx, coluna in enumerate(self.colunas):
+            if coluna in COLUNAS_DATA:
+                worksheet.set_column(idx, idx, 12, date_fmt)
+            elif coluna in COLUNAS_DINHEIRO:
+                worksheet.set_column(idx, idx, 18, money_fmt)
+            elif coluna in LARGURAS:
+                worksheet.set_column(idx, idx, LARGURAS[coluna])
+
+        worksheet.write_row(0, 0, self.colunas)
+        fontes = [_ler_lote(caminho) for caminho in self.lotes]
+        linha = 0
+        for linha, registro in enumerate(heapq.merge(*fontes, key=self._valor_ordenacao), start=1):
+            for idx, coluna in enumerate(self.colunas):
+                valor = registro.get(coluna)
+                if valor is None:
+                    continue
+                if isinstance(valor, datetime):
+                    worksheet.write_datetime(linha, idx, valor, date_fmt)
+                elif coluna in COLUNAS_DINHEIRO and isinstance(valor, (int, float)):
+                    worksheet.write_number(linha, idx, valor, money_fmt)
+                else:
+                    worksheet.write(linha, idx, valor)
+        workbook.close()
+        return linha
+
+    def fechar(self, parcial=False):
+        """Intercala os lotes e grava o .xlsx. Retorna o caminho gerado (None se vazio)."""
+        self.descarregar()
+        if not self.lotes:
+            shutil.rmtree(self.dir_spool, ignore_errors=True)
+            return None
+        caminho = self.caminho_excel
+        if parcial:
+            raiz, ext = os.path.splitext(caminho)
+            caminho = f"{raiz}_PARCIAL{ext}"
+        linhas = self._escrever_excel(caminho)
+        if not parcial:
+            shutil.rmtree(self.dir_spool, ignore_errors=True)
+        else:
+            logging.warning(f"Relatório parcial ({linhas} linhas). Lotes preservados em {self.dir_spool}")
+        return caminho
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_erro, erro, tb):
+        # Interrupção (Ctrl+C, erro) ainda entrega o que já foi processado
+        self.fechar(parcial=tipo_erro is not None)
+        return False
+
+
+def recuperar_relatorio_parcial(dir_spool, caminho_excel, colunas):
+    """Gera o relatório a partir dos lotes de uma execução que morreu sem fechar."""
+    escritor = EscritorRelatorioStreaming(caminho_excel, colunas, dir_spool=dir_spool)
+    return escritor.fechar(parcial=True)
@@ -0,0 +1,240 @@
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+from log_estruturado import contexto_log
+
+# --- CONFIGURAÇÕES (sobrescrevíveis via .env) ---
+MAX_TENTATIVAS = int(os.getenv("RETRY_MAX_TENTATIVAS", "5"))
+ESPERA_BASE_SEGUNDOS = float(os.getenv("RETRY_ESPERA_BASE", "1.0"))
+ESPERA_MAXIMA_SEGUNDOS = float(os.getenv("RETRY_ESPERA_MAXIMA", "60"))
+TIMEOUT_CHAMADA_SEGUNDOS = float(os.getenv("TIMEOUT_CHAMADA", "120"))
+PRAZO_POR_DOCUMENTO_SEGUNDOS = float(os.getenv("PRAZO_POR_DOCUMENTO", "600"))
+ORCAMENTO_GLOBAL_RETRIES = int(os.getenv("ORCAMENTO_GLOBAL_RETRIES", "500"))
+
+# Disjuntor (circuit breaker): abre se a taxa de erro da janela passar do limite
+DISJUNTOR_JANELA = int(os.getenv("DISJUNTOR_JANELA", "20"))
+DISJUNTOR_MINIMO_CHAMADAS = int(os.getenv("DISJUNTOR_MINIMO_CHAMADAS", "5"))
+DISJUNTOR_TAXA_ERRO = float(os.getenv("DISJUNTOR_TAXA_ERRO", "0.5"))
+DISJUNTOR_PAUSA_SEGUNDOS = float(os.getenv("DISJUNTOR_PAUSA", "60"))
+
+STATUS_RECUPERAVEIS = {408, 409, 425, 429}
+
+
+class ErroRecuperavel(Exception):
+    """Falha transitória: vale a pena tentar de novo (429, 5xx, timeout)."""
+    def __init__(self, mensagem, retry_after=None):
+        super().__init__(mensagem)
+        self.retry_after = retry_after
+
+
+class ErroHTTP(Exception):
+    """Resposta HTTP de erro de clientes sem exceção própria (ex: requests)."""
+    def __init__(self, status_code, texto="", headers=None):
+        super().__init__(f"HTTP {status_code}: {texto[:300]}")
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class PrazoEsgotado(Exception):
+    """O prazo do documento acabou antes de uma resposta válida."""
+
+
+class CircuitoAberto(Exception):
+    """O provedor está pausado pelo disjuntor além do prazo disponível."""
+
+
+class Prazo:
+    """Prazo absoluto (relógio monotônico) para todas as chamadas de um documento."""
+    def __init__(self, segundos=PRAZO_POR_DOCUMENTO_SEGUNDOS):
+        self.limite = time.monotonic() + segundos
+        self.cancelado = False
+        self._fechamentos = []
+        self._trava = threading.Lock()
+
+    def ao_cancelar(self, fechar):
+        """Registra como abortar a requisição em andamento (ex: response.close do stream)."""
+        with self._trava:
+            if not self.cancelado:
+                self._fechamentos.append(fechar)
+                return
+        fechar()
+
+    def cancelar(self):
+        """Esgota o prazo (sem novas tentativas) e fecha as conexões registradas: o provedor para de gerar."""
+        with self._trava:
+            self.limite = time.monotonic()
+            self.cancelado = True
+            fechamentos, self._fechamentos = self._fechamentos, []
+        for fechar in fechamentos:
+            try:
+                fechar()
+            except Exception as e:
+                logging.debug(f"Falha ao fechar requisição cancelada: {e}")
+
+    def restante(self):
+        return max(0.0, self.limite - time.monotonic())
+
+    def esgotado(self):
+        return self.restante() <= 0
+
+
+class OrcamentoRetries:
+    """Limite global de novas tentativas no processo (evita tempestade de retries)."""
+    def __init__(self, total=ORCAMENTO_GLOBAL_RETRIES):
+        self.restantes = total
+        self._trava = threading.Lock()
+
+    def consumir(self):
+        with self._trava:
+            if self.restantes <= 0:
+                return False
+            self.restantes -= 1
+            return True
+
+
+class Disjuntor:
+    """Pausa um provedor enquanto a taxa de erro recente estiver alta."""
+    def __init__(self, nome, janela=DISJUNTOR_JANELA, taxa_erro=DISJUNTOR_TAXA_ERRO,
+                 pausa=DISJUNTOR_PAUSA_SEGUNDOS, minimo=DISJUNTOR_MINIMO_CHAMADAS):
+        self.nome = nome
+        self.resultados = deque(maxlen=janela)
+        self.taxa_erro = taxa_erro
+        self.pausa = pausa
+        self.minimo = minimo
+        self.aberto_ate = 0.0
+        self._trava = threading.Lock()
+
+    def registrar(self, sucesso):
+        with self._trava:
+            self.resultados.append(bool(sucesso))
+            if len(self.resultados) < self.minimo:
+                return
+            erros = self.resultados.count(False)
+            if erros / len(self.resultados) >= self.taxa_erro and time.monotonic() >= self.aberto_ate:
+                self.aberto_ate = time.monotonic() + self.pausa
+                # Meia-abertura: a janela recomeça para medir o provedor depois da pausa
+                self.resultados.clear()
+                logging.warning(f"Disjuntor ABERTO para {self.nome}: pausa de {self.pausa:.0f}s")
+
+    def aguardar_liberacao(self, prazo=None):
+        espera = self.aberto_ate - time.monotonic()
+        if espera <= 0:
+            return
+        if prazo is not None and espera > prazo.restante():
+            raise CircuitoAberto(f"{self.nome} pausado por mais {espera:.0f}s")
+        time.sleep(espera)
+
+
+ORCAMENTO_GLOBAL = OrcamentoRetries()
+_DISJUNTORES = {}
+_TRAVA_DISJUNTORES = threading.Lock()
+
+
+def obter_disjuntor(provedor):
+    with _TRAVA_DISJUNTORES:
+        if provedor not in _DISJUNTORES:
+            _DISJUNTORES[provedor] = Disjuntor(provedor)
+        return _DISJUNTORES[provedor]
+
+
+def _ler_retry_after(headers):
+    if not headers:
+        return None
+    valor = headers.get("retry-after") or headers.get("Retry-After")
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        data = parsedate_to_datetime(valor)
+        return max(0.0, (data - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def classificar_erro(erro):
+    """
+    Retorna (recuperavel, retry_after).
+    429/5xx/timeouts/conexão -> recuperável. Demais 4xx -> falha imediata.
+    """
+    if isinstance(erro, ErroRecuperavel):
+        return True, erro.retry_after
+
+    status = getattr(erro, "status_code", None)
+    resposta = getattr(erro, "response", None)
+    if status is None and resposta is not None:
+        status = getattr(resposta, "status_code", None)
+    headers = getattr(erro, "headers", None) or getattr(resposta, "headers", None)
+
+    if status is not None:
+        recuperavel = status in STATUS_RECUPERAVEIS or status >= 500
+        return recuperavel, _ler_retry_after(headers) if recuperavel else None
+
+    # Sem status: timeouts e falhas de conexão (openai, requests, socket)
+    if isinstance(erro, (TimeoutError, ConnectionError)):
+        return True, None
+    nome = type(erro).__name__
+    if "Timeout" in nome or "Connection" in nome:
+        return True, None
+    return False, None
+
+
+def calcular_espera(tentativa, retry_after=None):
+    """Backoff exponencial com jitter total; respeita Retry-After quando enviado."""
+    teto = min(ESPERA_MAXIMA_SEGUNDOS, ESPERA_BASE_SEGUNDOS * (2 ** tentativa))
+    espera = random.uniform(0, teto)
+    if retry_after is not None:
+        espera = max(espera, min(retry_after, ESPERA_MAXIMA_SEGUNDOS))
+    return espera
+
+
+def executar_com_retry(funcao, provedor, prazo=None, descricao="",
+                       max_tentativas=MAX_TENTATIVAS, orcamento=ORCAMENTO_GLOBAL):
+    """
+    Executa funcao(timeout) com a política compartilhada de retry.
+    O timeout passado à função nunca ultrapassa o prazo restante do documento.
+    Propaga a última exceção quando desiste.
+    """
+    disjuntor = obter_disjuntor(provedor)
+    for tentativa in range(max_tentativas):
+        if prazo is not None and prazo.esgotado():
+            raise PrazoEsgotado(f"Prazo esgotado: {descricao}")
+        disjuntor.aguardar_liberacao(prazo)
+
+        timeout = TIMEOUT_CHAMADA_SEGUNDOS
+        if prazo is not None:
+            timeout = min(timeout, prazo.restante())
+
+        inicio = time.monotonic()
+        try:
+            with contexto_log(tentativa=tentativa + 1, provedor=provedor):
+                resultado = funcao(timeout)
+            disjuntor.registrar(True)
+            return resultado
+        except Exception as e:
+            if prazo is not None and prazo.cancelado:
+                # Conexão fechada de propósito (ramo perdedor do hedge): não é falha do provedor
+                raise PrazoEsgotado(f"Cancelado: {descricao}") from e
+            duracao = {"tentativa": tentativa + 1, "provedor": provedor, "duracao_s": round(time.monotonic() - inicio, 3)}
+            recuperavel, retry_after = classificar_erro(e)
+            disjuntor.registrar(not recuperavel)
+            if not recuperavel:
+                logging.error(f"Erro não recuperável ({provedor}) {descricao}: {e}", extra=duracao)
+                raise
+            if tentativa + 1 >= max_tentativas or not orcamento.consumir():
+                logging.error(f"Desistindo após {tentativa+1} tentativa(s) ({provedor}) {descricao}: {e}", extra=duracao)
+                raise
+
+            espera = calcular_espera(tentativa, retry_after)
+            if prazo is not None and espera >= prazo.restante():
+                raise PrazoEsgotado(f"Prazo insuficiente para nova tentativa: {descricao}") from e
+            logging.warning(f"Erro API ({provedor}, tentativa {tentativa+1}): {e} -> aguardando {espera:.1f}s", extra=duracao)
+            time.sleep(espera)
@@ -0,0 +1,232 @@
+import os
+import math
+from collections import deque
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from cache_render import CACHE_RENDER_ATIVO, hash_pdf, chave_imagem, ler_composto, gravar_composto
+
+# --- RENDERIZAÇÃO POR REGIÃO DE INTERESSE (carimbos, selos, blocos de assinatura) ---
+# Página inteira em resolução de leitura + recortes em zoom alto só onde há selo/assinatura/valor.
+MODO_ROI = os.getenv("RENDER_ROI", "0") == "1"
+ZOOM_DETECCAO = 0.5                                       # render barato só para achar as regiões
+ZOOM_BASE = float(os.getenv("ROI_ZOOM_BASE", "1.0"))      # página inteira enviada como contexto
+ZOOM_ALTO = float(os.getenv("ROI_ZOOM_ALTO", "2.0"))      # o mesmo zoom do modo página inteira
+CELULA_PX = 8                  # célula da grade de detecção (16pt com ZOOM_DETECCAO 0.5)
+LIMIAR_COR = 0.04              # fração de pixels coloridos na célula (tinta de carimbo azul/roxa/vermelha)
+LIMIAR_TINTA = 0.08            # fração de pixels escuros fora do texto digitado (assinatura à caneta)
+MARGEM_PT = 12
+AREA_MAXIMA_ROI = 0.6          # acima disso os recortes não compensam: página inteira em zoom alto
+
+# Âncoras da camada de texto: (termo, altura acima, altura abaixo) da faixa recortada, em pontos
+ANCORAS = [
+    ("assinatura", 70, 90),
+    ("assinado digitalmente", 40, 80),
+    ("testemunha", 40, 90),
+    ("reconheço", 40, 120),
+    ("tabeli", 40, 120),
+    ("selo", 40, 80),
+    ("dou fé", 60, 60),
+    ("R$", 6, 6),
+]
+
+# Limites de imagem do modelo (lado maior e área) para estimar tokens: tokens ≈ largura * altura / 750
+LADO_MAXIMO_MODELO = 1568
+PIXELS_MAXIMOS_MODELO = 1_150_000
+
+
+def estimar_tokens(largura, altura):
+    escala = min(1.0, LADO_MAXIMO_MODELO / max(largura, altura, 1),
+                 math.sqrt(PIXELS_MAXIMOS_MODELO / max(largura * altura, 1)))
+    return math.ceil((largura * escala) * (altura * escala) / 750)
+
+
+def _mascaras(pagina):
+    """Máscaras (cor, tinta) da página em baixa resolução; texto digitado é removido da tinta."""
+    pix = pagina.get_pixmap(matrix=fitz.Matrix(ZOOM_DETECCAO, ZOOM_DETECCAO), colorspace=fitz.csRGB, alpha=False)
+    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3).astype(np.int16)
+    maximo, minimo = img.max(axis=2), img.min(axis=2)
+    cor = (maximo - minimo > 60) & (maximo < 250)
+    tinta = img.mean(axis=2) < 110
+
+    for x0, y0, x1, y1, *_ in pagina.get_text("words"):
+        tinta[int(y0 * ZOOM_DETECCAO):math.ceil(y1 * ZOOM_DETECCAO),
+              int(x0 * ZOOM_DETECCAO):math.ceil(x1 * ZOOM_DETECCAO)] = False
+    return cor, tinta
+
+
+def _celulas_ativas(cor, tinta):
+    linhas, colunas = cor.shape[0] // CELULA_PX, cor.shape[1] // CELULA_PX
+    if not linhas or not colunas:
+        return np.zeros((0, 0), dtype=bool)
+
+    def fracao(mascara):
+        recorte = mascara[:linhas * CELULA_PX, :colunas * CELULA_PX]
+        return recorte.reshape(linhas, CELULA_PX, colunas, CELULA_PX).mean(axis=(1, 3))
+
+    return (fracao(cor) > LIMIAR_COR) | (fracao(tinta) > LIMIAR_TINTA)
+
+
+def _componentes(ativas):
+    """Caixas (linha0, coluna0, linha1, coluna1) dos grupos conexos de células ativas."""
+    vistas = np.zeros_like(ativas)
+    caixas = []
+    for inicio in zip(*np.nonzero(ativas)):
+        if vistas[inicio]:
+            continue
+        fila = deque([inicio])
+        vistas[inicio] = True
+        l0 = l1 = inicio[0]
+        c0 = c1 = inicio[1]
+        tamanho = 0
+        while fila:
+            l, c = fila.popleft()
+            tamanho += 1
+            l0, l1, c0, c1 = min(l0, l), max(l1, l), min(c0, c), max(c1, c)
+            for dl in (-1, 0, 1):
+                for dc in (-1, 0, 1):
+                    vizinho = (l + dl, c + dc)
+                    if (0 <= vizinho[0] < ativas.shape[0] and 0 <= vizinho[1] < ativas.shape[1]
+                            and ativas[vizinho] and not vistas[vizinho]):
+                        vistas[vizinho] = True
+                        fila.append(vizinho)
+        if tamanho >= 2:  # célula isolada é ruído (sujeira de scan, marcador de lista)
+            caixas.append((int(l0), int(c0), int(l1) + 1, int(c1) + 1))
+    return caixas
+
+
+def _unir(retangulos):
+    """Une retângulos sobrepostos até não sobrar interseção."""
+    retangulos = list(retangulos)
+    mudou = True
+    while mudou:
+        mudou = False
+        unidos = []
+        for r in retangulos:
+            for i, u in enumerate(unidos):
+                if r.intersects(u):
+                    unidos[i] = u | r
+                    mudou = True
+                    break
+            else:
+                unidos.append(r)
+        retangulos = unidos
+    return retangulos
+
+
+def detectar_regioes(pagina):
+    """Regiões (fitz.Rect em pontos) com provável selo, carimbo, assinatura ou valor."""
+    area = pagina.rect
+    regioes = []
+
+    cor, tinta = _mascaras(pagina)
+    escala = CELULA_PX / ZOOM_DETECCAO
+    for l0, c0, l1, c1 in _componentes(_celulas_ativas(cor, tinta)):
+        regioes.append(fitz.Rect(c0 * escala, l0 * escala, c1 * escala, l1 * escala))
+
+    for termo, acima, abaixo in ANCORAS:
+        for achado in pagina.search_for(termo):
+            # Faixa na largura da página: o nome/selo costuma ficar acima ou abaixo da âncora
+            regioes.append(fitz.Rect(area.x0, achado.y0 - acima, area.x1, achado.y1 + abaixo))
+
+    regioes = [(r + (-MARGEM_PT, -MARGEM_PT, MARGEM_PT, MARGEM_PT)) & area for r in regioes]
+    return _unir(r for r in regioes if not r.is_empty)
+
+
+def renderizar_pagina_roi(pagina):
+    """
+    Retorna (lista de JPEGs, medidas). Sem regiões, ou com regiões demais,
+    cai para a página inteira em ZOOM_ALTO (o comportamento anterior).
+    """
+    regioes = detectar_regioes(pagina)
+    area_pagina = pagina.rect.width * pagina.rect.height
+    area_roi = sum(r.width * r.height for r in regioes)
+
+    imagens, dimensoes = [], []
+    if not regioes or area_roi > AREA_MAXIMA_ROI * area_pagina:
+        pix = pagina.get_pixmap(matrix=fitz.Matrix(ZOOM_ALTO, ZOOM_ALTO))
+        imagens.append(pix.tobytes("jpeg"))
+        dimensoes.append((pix.width, pix.height))
+        modo = "pagina_inteira"
+    else:
+        base = pagina.get_pixmap(matrix=fitz.Matrix(ZOOM_BASE, ZOOM_BASE))
+        imagens.append(base.tobytes("jpeg"))
+        dimensoes.append((base.width, base.height))
+        for regiao in regioes:
+            pix = pagina.get_pixmap(matrix=fitz.Matrix(ZOOM_ALTO, ZOOM_ALTO), clip=regiao)
+            imagens.append(pix.tobytes("jpeg"))
+            dimensoes.append((pix.width, pix.height))
+        modo = "roi"
+
+    largura_cheia = math.ceil(pagina.rect.width * ZOOM_ALTO)
+    altura_cheia = math.ceil(pagina.rect.height * ZOOM_ALTO)
+    bytes_roi = sum(len(i) for i in imagens)
+    if modo == "roi":
+        # JPEG cresce ~linearmente com a área: estimativa pela imagem base, sem renderizar a página cheia
+        bytes_cheia = round(len(imagens[0]) * (ZOOM_ALTO / ZOOM_BASE) ** 2)
+    else:
+        bytes_cheia = bytes_roi
+    return imagens, {
+        "modo": modo,
+        "regioes": len(regioes) if modo == "roi" else 0,
+        "bytes": bytes_roi,
+        "bytes_pagina_inteira_estimados": bytes_cheia,
+        "tokens_estimados": sum(estimar_tokens(w, h) for w, h in dimensoes),
+        "tokens_pagina_inteira": estimar_tokens(largura_cheia, altura_cheia),
+    }
+
+
+def _pagina_roi_com_cache(documento, i, hash_conteudo):
+    """Detecção + recortes de uma página, reaproveitados do cache de render quando possível."""
+    if hash_conteudo is None:
+        return renderizar_pagina_roi(documento().load_page(i))
+    # Os parâmetros que mudam as regiões ou os recortes entram na chave
+    parametros = f"roi|{ZOOM_BASE:g}|{ZOOM_DETECCAO:g}|{LIMIAR_COR:g}|{LIMIAR_TINTA:g}|{AREA_MAXIMA_ROI:g}"
+    chave = chave_imagem(hash_conteudo, i, ZOOM_ALTO, extra=parametros)
+    guardado = ler_composto(chave)
+    if guardado is not None:
+        return guardado
+    jpegs, medidas = renderizar_pagina_roi(documento().load_page(i))
+    gravar_composto(chave, jpegs, medidas)
+    return jpegs, medidas
+
+
+def renderizar_paginas_roi(doc, indices, caminho_pdf=None):
+    """
+    Renderiza as páginas escolhidas em modo ROI. Retorna (JPEGs, relatório de economia do documento).
+    Com caminho_pdf, cada página passa pelo cache de render (CACHE_RENDER_ATIVO).
+    doc=None: o PDF só é aberto (e fechado ao final) se alguma página faltar no cache.
+    """
+    hash_conteudo = hash_pdf(caminho_pdf) if caminho_pdf and CACHE_RENDER_ATIVO else None
+    aberto = []
+
+    def documento():
+        if doc is not None:
+            return doc
+        if not aberto:
+            aberto.append(fitz.open(caminho_pdf))
+        return aberto[0]
+
+    imagens = []
+    relatorio = {"paginas": 0, "paginas_roi": 0, "imagens": 0, "bytes": 0,
+                 "bytes_pagina_inteira_estimados": 0, "tokens_estimados": 0, "tokens_pagina_inteira": 0}
+    try:
+        for i in indices:
+            jpegs, medidas = _pagina_roi_com_cache(documento, i, hash_conteudo)
+            imagens.extend(jpegs)
+            relatorio["paginas"] += 1
+            relatorio["paginas_roi"] += medidas["modo"] == "roi"
+            relatorio["imagens"] += len(jpegs)
+            for chave in ("bytes", "bytes_pagina_inteira_estimados", "tokens_estimados", "tokens_pagina_inteira"):
+                relatorio[chave] += medidas[chave]
+    finally:
+        for aberto_doc in aberto:
+            aberto_doc.close()
+    if relatorio["tokens_pagina_inteira"]:
+        relatorio["economia_tokens_pct"] = round(
+            100 * (1 - relatorio["tokens_estimados"] / relatorio["tokens_pagina_inteira"]), 1)
+    if relatorio["bytes_pagina_inteira_estimados"]:
+        relatorio["economia_bytes_pct"] = round(
+            100 * (1 - relatorio["bytes"] / relatorio["bytes_pagina_inteira_estimados"]), 1)
+    return imagens, relatorio
@@ -0,0 +1,131 @@
+import time
+import logging
+
+
+class DetectorObjetoJSON:
+    """
+    Parser incremental que acompanha o texto em streaming e reconhece
+    quando o objeto JSON de nível superior fechou.
+    Ignora conversa e cercas de código (```json) antes do primeiro '{'.
+    """
+    def __init__(self):
+        self.profundidade = 0
+        self.em_string = False
+        self.escape = False
+        self.inicio = None
+        self.completo = False
+        self._partes = []
+        self._tamanho = 0
+
+    def alimentar(self, trecho):
+        """Consome um pedaço do stream. Retorna True quando o objeto fechou."""
+        if self.completo or not trecho:
+            return self.completo
+
+        base = self._tamanho
+        self._partes.append(trecho)
+        self._tamanho += len(trecho)
+
+        for i, c in enumerate(trecho):
+            if self.inicio is None:
+                if c == "{":
+                    self.inicio = base + i
+                    self.profundidade = 1
+                continue
+            if self.em_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.em_string = False
+                continue
+            if c == '"':
+                self.em_string = True
+            elif c in "{[":
+                self.profundidade += 1
+            elif c in "}]":
+                self.profundidade -= 1
+                if self.profundidade == 0:
+                    self.completo = True
+                    self._fim = base + i + 1
+                    return True
+        return False
+
+    @property
+    def texto(self):
+        return "".join(self._partes)
+
+    @property
+    def objeto_texto(self):
+        """Apenas o trecho do objeto JSON (ou None se ele nunca abriu/fechou)."""
+        if not self.completo:
+            return None
+        return self.texto[self.inicio:self._fim]
+
+
+def _registrar_uso(chunk, metricas):
+    """Com stream_options include_usage, o último chunk (sem choices) traz o uso da chamada."""
+    uso = getattr(chunk, "usage", None)
+    if uso is not None:
+        metricas["tokens_entrada"] = uso.prompt_tokens
+        metricas["tokens_saida"] = uso.completion_tokens
+
+
+def _ainda_gerando(chunks, metricas):
+    """
+    Depois do objeto fechar: True se o provedor ainda tinha texto a mandar (o corte economizou algo).
+    Se a geração já tinha terminado, lê até o fim: o chunk de uso vem logo depois do finish_reason.
+    """
+    for chunk in chunks:
+        _registrar_uso(chunk, metricas)
+        if chunk.choices and chunk.choices[0].delta.content:
+            return True
+    return False
+
+
+def coletar_objeto_json(stream, inicio_chamada):
+    """
+    Lê um stream de chat.completions (OpenAI/OpenRouter) até o objeto JSON fechar
+    e cancela o restante da geração fechando a conexão.
+    Retorna (texto, metricas) com tempo até o 1º byte e até o objeto completo.
+    Os tokens só são conhecidos se o chunk de uso chegou (stream_options include_usage e
+    sem corte antecipado); senão ficam None e tokens_desconhecidos=True, nunca 0.
+    """
+    detector = DetectorObjetoJSON()
+    metricas = {"modo": "stream", "ttfb_s": None, "tempo_objeto_s": None, "cancelado_antecipado": False,
+                "tokens_entrada": None, "tokens_saida": None}
+
+    chunks = iter(stream)
+    try:
+        for chunk in chunks:
+            _registrar_uso(chunk, metricas)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if metricas["ttfb_s"] is None:
+                metricas["ttfb_s"] = round(time.monotonic() - inicio_chamada, 3)
+            if detector.alimentar(delta):
+                metricas["tempo_objeto_s"] = round(time.monotonic() - inicio_chamada, 3)
+                # Se a geração já terminou neste chunk (ou no seguinte, vazio), não houve o que cancelar
+                if chunk.choices[0].finish_reason is not None:
+                    _ainda_gerando(chunks, metricas)  # só falta o chunk de uso
+                else:
+                    metricas["cancelado_antecipado"] = _ainda_gerando(chunks, metricas)
+                break
+    finally:
+        # Fechar a resposta HTTP interrompe a geração no provedor (economia de tokens)
+        fechar = getattr(stream, "close", None)
+        if fechar:
+            try:
+                fechar()
+            except Exception as e:
+                logging.debug(f"Falha ao fechar stream: {e}")
+
+    metricas["tempo_total_s"] = round(time.monotonic() - inicio_chamada, 3)
+    metricas["caracteres_recebidos"] = len(detector.texto)
+    metricas["tokens_desconhecidos"] = metricas["tokens_entrada"] is None
+    texto = detector.objeto_texto if detector.completo else detector.texto
+    return texto, metricas
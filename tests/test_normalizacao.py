@@ -0,0 +1,75 @@
+import importlib
+
+import pandas as pd
+import pytest
+
+from normalizacao import normalizar_lote
+
+# O módulo começa com dígito: só dá para importar pelo nome
+processador = importlib.import_module("02_processador")
+
+# Um exemplo por formato de normalizar_data, mais casos que ela rejeita
+DATAS = [
+    "16/01/2025", "1/2/2027",
+    "2025-01-16", "2027-2-1",
+    "16-01-2025",
+    "16.01.2025",
+    "2025/01/16",
+    " 31/12/2026 ",
+    "31/02/2025",      # dia inexistente
+    "2025-13-01",      # mês inexistente
+    "16/01/25",        # ano com 2 dígitos
+    "janeiro de 2025",
+    "",
+    None,
+]
+
+# BRL, USD, vírgula decimal, números já tipados e lixo
+VALORES = [
+    "R$ 1.234,56", "R$1.234.567,89", "1.234,56",
+    "$1,234.56", "1,234.56", "US$ 2,500.00",
+    "12,5", "1500", "1500.75", " R$ 980 ",
+    1234.56, 1500, 0,
+    "abc", "", None,
+]
+
+
+@pytest.mark.parametrize("valor", DATAS)
+def test_datas_iguais_ao_escalar(valor):
+    df = normalizar_lote(pd.DataFrame({"data_fim_contrato": [valor]}))
+    esperado = processador.normalizar_data(valor)
+
+    assert bool(df["data_fim_contrato_valida"].iloc[0]) == (esperado is not None)
+    if esperado is not None:
+        assert df["data_fim_contrato_dt"].iloc[0].to_pydatetime() == esperado
+
+
+@pytest.mark.parametrize("valor", VALORES)
+def test_valores_iguais_ao_escalar(valor):
+    df = normalizar_lote(pd.DataFrame({"valor_aluguel_mensal_float": [valor]}, dtype=object))
+    esperado = processador.sanitizar_valor_monetario(valor)
+
+    assert df["valor_aluguel_mensal_float"].iloc[0] == pytest.approx(esperado)
+
+
+def test_lote_misto_igual_ao_escalar_linha_a_linha():
+    # Mesma coluna com todos os formatos juntos: o despacho por máscara não pode vazar entre linhas
+    linhas = max(len(DATAS), len(VALORES))
+    df = pd.DataFrame({
+        "data_inicio_contrato": (DATAS * 2)[:linhas],
+        "custo_registro_cartorio_float": (VALORES * 2)[:linhas],
+    }, dtype=object)
+    normalizado = normalizar_lote(df)
+
+    for i in range(linhas):
+        data = processador.normalizar_data(df["data_inicio_contrato"].iloc[i])
+        obtida = normalizado["data_inicio_contrato_dt"].iloc[i]
+        assert (None if pd.isna(obtida) else obtida.to_pydatetime()) == data
+        assert normalizado["custo_registro_cartorio_float"].iloc[i] == pytest.approx(
+            processador.sanitizar_valor_monetario(df["custo_registro_cartorio_float"].iloc[i]))
+
+
+def test_colunas_ausentes_viram_invalidas():
+    df = normalizar_lote(pd.DataFrame({"status": ["NÃO ASSINADO"]}))
+    assert not df["data_evidencia_valida"].iloc[0]
+    assert df["custo_registro_cartorio_float"].iloc[0] == 0.0
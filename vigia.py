@@ -0,0 +1,186 @@
+import os
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+# --- VIGIA DE PASTA (inotify no Linux, varredura periódica nos demais) ---
+DEBOUNCE_SEGUNDOS = float(os.getenv("VIGIA_DEBOUNCE", "2.0"))
+INTERVALO_POLLING_SEGUNDOS = float(os.getenv("VIGIA_INTERVALO_POLLING", "5.0"))
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+MASCARA = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENTO = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Interface mínima com a inotify do kernel via ctypes (sem dependências externas)."""
+    def __init__(self):
+        nome = ctypes.util.find_library("c")
+        self.libc = ctypes.CDLL(nome, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        self.pastas = {}
+
+    def vigiar(self, pasta):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(pasta), MASCARA)
+        if wd < 0:
+            logging.warning(f"Não foi possível vigiar {pasta} (errno {ctypes.get_errno()})")
+            return
+        self.pastas[wd] = pasta
+
+    def ler(self, timeout):
+        """Retorna [(caminho, mascara)] ou [] se nada chegou no timeout."""
+        prontos, _, _ = select.select([self.fd], [], [], timeout)
+        if not prontos:
+            return []
+        try:
+            dados = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        eventos, pos = [], 0
+        while pos + _EVENTO.size <= len(dados):
+            wd, mascara, _, tamanho = _EVENTO.unpack_from(dados, pos)
+            pos += _EVENTO.size
+            nome = dados[pos:pos + tamanho].rstrip(b"\0")
+            pos += tamanho
+            if mascara & IN_Q_OVERFLOW:
+                eventos.append((None, mascara))
+                continue
+            pasta = self.pastas.get(wd)
+            if pasta is not None and nome:
+                eventos.append((os.path.join(pasta, os.fsdecode(nome)), mascara))
+        return eventos
+
+    def fechar(self):
+        os.close(self.fd)
+
+
+class VigiaPasta:
+    """
+    Observa uma pasta (recursivamente) e entrega arquivos novos só depois que
+    tamanho e data de modificação ficam estáveis por DEBOUNCE_SEGUNDOS
+    (cópias ainda em andamento não são processadas pela metade).
+    incluir_existentes=True entrega também o que já estava na pasta ao criar o vigia
+    (quem consome decide o que já foi feito, ex: RAW existente); senão, só o que chegar depois.
+    """
+    def __init__(self, raiz, aceitar=None, debounce=DEBOUNCE_SEGUNDOS, forcar_polling=False,
+                 incluir_existentes=False):
+        self.raiz = raiz
+        self.aceitar = aceitar or (lambda caminho: True)
+        self.debounce = debounce
+        self.pendentes = {}  # caminho -> (assinatura (tamanho, mtime), instante da última mudança)
+        self.entregues = {}  # caminho -> assinatura entregue
+        self.inotify = None
+        if not forcar_polling:
+            try:
+                self.inotify = _Inotify()
+            except (OSError, AttributeError, TypeError) as e:
+                logging.info(f"inotify indisponível ({e}); usando varredura periódica.")
+        if self.inotify:
+            self._vigiar_arvore(raiz)
+        foto = self._fotografar()
+        self._foto = foto if not self.inotify else {}
+        if incluir_existentes:
+            agora = time.monotonic()
+            self.pendentes.update((caminho, (assinatura, agora)) for caminho, assinatura in foto.items())
+        else:
+            self.entregues.update(foto)
+        self._proxima_varredura = time.monotonic() + INTERVALO_POLLING_SEGUNDOS
+
+    @property
+    def modo(self):
+        return "inotify" if self.inotify else "polling"
+
+    def _vigiar_arvore(self, pasta):
+        self.inotify.vigiar(pasta)
+        for raiz, subpastas, _ in os.walk(pasta):
+            for sub in subpastas:
+                self.inotify.vigiar(os.path.join(raiz, sub))
+
+    def _assinatura(self, caminho):
+        try:
+            st = os.stat(caminho)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def _fotografar(self):
+        foto = {}
+        for raiz, _, arquivos in os.walk(self.raiz):
+            for nome in arquivos:
+                caminho = os.path.join(raiz, nome)
+                if self.aceitar(caminho):
+                    assinatura = self._assinatura(caminho)
+                    if assinatura:
+                        foto[caminho] = assinatura
+        return foto
+
+    def _marcar(self, caminho):
+        if self.aceitar(caminho):
+            self.pendentes[caminho] = (self._assinatura(caminho), time.monotonic())
+
+    def _coletar_eventos(self, timeout):
+        if self.inotify:
+            for caminho, mascara in self.inotify.ler(timeout):
+                if caminho is None:
+                    # Fila do kernel estourou: recompõe o estado com uma varredura completa
+                    for c in self._fotografar():
+                        self._marcar(c)
+                elif mascara & IN_ISDIR:
+                    if mascara & (IN_CREATE | IN_MOVED_TO):
+                        self._vigiar_arvore(caminho)
+                        for raiz, _, arquivos in os.walk(caminho):
+                            for nome in arquivos:
+                                self._marcar(os.path.join(raiz, nome))
+                else:
+                    self._marcar(caminho)
+            return
+        time.sleep(timeout)
+        # Com pendentes o laço acorda a cada 0,5 s, mas só para re-checar esses caminhos
+        # (em _prontos); a varredura completa da árvore continua no intervalo de polling
+        if time.monotonic() < self._proxima_varredura:
+            return
+        self._proxima_varredura = time.monotonic() + INTERVALO_POLLING_SEGUNDOS
+        foto = self._fotografar()
+        for caminho, assinatura in foto.items():
+            if self._foto.get(caminho) != assinatura:
+                self._marcar(caminho)
+        self._foto = foto
+
+    def _prontos(self):
+        agora = time.monotonic()
+        prontos = []
+        for caminho, (assinatura, desde) in list(self.pendentes.items()):
+            atual = self._assinatura(caminho)
+            if atual is None:
+                del self.pendentes[caminho]
+            elif atual != assinatura:
+                # Ainda crescendo: reinicia a contagem do debounce
+                self.pendentes[caminho] = (atual, agora)
+            elif agora - desde >= self.debounce:
+                del self.pendentes[caminho]
+                if self.entregues.get(caminho) != atual:
+                    self.entregues[caminho] = atual
+                    prontos.append(caminho)
+        return prontos
+
+    def arquivos_prontos(self):
+        """Gera, indefinidamente, caminhos de arquivos novos e estáveis."""
+        timeout = min(0.5, self.debounce / 2) if self.inotify else INTERVALO_POLLING_SEGUNDOS
+        try:
+            while True:
+                self._coletar_eventos(timeout if not self.pendentes else min(timeout, 0.5))
+                yield from self._prontos()
+        finally:
+            if self.inotify:
+                self.inotify.fechar()